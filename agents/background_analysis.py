@@ -17,7 +17,10 @@ from dotenv import load_dotenv
 load_dotenv(override=True)
 
 from utils.logging_config import setup_logger
+from utils.metrics import instrument_module, timed
+from utils import replay
 logger = setup_logger('market_data_agent')
+ak = instrument_module(ak, "akshare")
 
 # 1. 获取财务数据（最近5期）
 def get_financials(ticker: str) -> pd.DataFrame:
@@ -52,7 +55,7 @@ def get_valuation(ticker: str) -> pd.DataFrame:
 def get_ohlcv_and_tech(ticker: str) -> pd.DataFrame:
     logger.info("正在获取指标数据...")
     # 计算日期范围
-    end_date = datetime.today()
+    end_date = replay.now()
     start_date = end_date - timedelta(days=365)
     sd = start_date.strftime("%Y%m%d")
     ed = end_date.strftime("%Y%m%d")
@@ -89,7 +92,8 @@ def fetch_insights(ticker: str) -> str:
     logger.info("正在获取市场调研数据...")
     from langchain_tavily import TavilySearch
     tav = TavilySearch(max_results=3, topic="general")
-    res = tav.run(tool_input=f"{ticker} 调研报告 业务 业绩 营收")
+    with timed("tavily", "search"):
+        res = replay.call("tavily", "search", tav.run, tool_input=f"{ticker} 调研报告 业务 业绩 营收")
     content = "\n".join(r["content"] for r in res["results"][:5])
     logger.info(f"已获取市场调研数据，长度为{len(content)}")
     return content
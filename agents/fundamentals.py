@@ -1,9 +1,13 @@
 from langchain_core.messages import HumanMessage
 
 from agents.state import AgentState, show_agent_reasoning, show_workflow_status
+from agents.screening import FUNDAMENTAL_SCREENING, METRIC_NAMES, get_screening_engine
+from utils.logging_config import setup_logger
 
 import json
 
+logger = setup_logger('fundamentals_agent')
+
 
 def fundamentals_agent(state: AgentState):
     show_workflow_status("Fundamentals Analyst")
@@ -145,6 +149,20 @@ def fundamentals_agent(state: AgentState):
     total_signals = len(signals)
     confidence = max(bullish_signals, bearish_signals) / total_signals
 
+    # 5. 全市场横截面排名，不参与信号投票，为上述阈值结论提供相对位置
+    if FUNDAMENTAL_SCREENING:
+        try:
+            peers = get_screening_engine(wait=False).peer_context(data["ticker"], metrics)
+            reasoning["横截面排名"] = {
+                "结论": f"全市场{peers['universe_size']}只股票中的相对位置",
+                "论据": "，".join(
+                    f"{METRIC_NAMES[column]}: {peers['labels'][column]}（百分位 {pct:.0%}）"
+                    for column, pct in peers["percentiles"].items()
+                ),
+            }
+        except Exception as e:
+            logger.warning(f"全市场横截面排名失败: {e}")
+
     message_content = {
         "signal": overall_signal,
         "confidence": f"{round(confidence * 100)}%",
@@ -2,6 +2,8 @@ from langchain_core.messages import HumanMessage
 from agents.state import AgentState, show_agent_reasoning, show_workflow_status
 from utils.api import get_financial_metrics, get_financial_statements, get_market_data, get_price_history, get_short_term_data, get_long_term_data
 from utils.logging_config import setup_logger
+from utils.price_store import get_price_store
+from utils import replay
 
 from datetime import datetime, timedelta
 import pandas as pd
@@ -21,7 +23,7 @@ def market_data_agent(state: AgentState):
     data = state["data"]
 
     # Set default dates
-    current_date = datetime.now()
+    current_date = replay.now()
     yesterday = current_date - timedelta(days=1)
     end_date = data["end_date"] or yesterday.strftime('%Y-%m-%d')
 
@@ -48,6 +50,12 @@ def market_data_agent(state: AgentState):
         logger.warning(f"警告：无法获取{ticker}的价格数据，将使用空数据继续")
         prices_df = pd.DataFrame(
             columns=['close', 'open', 'high', 'low', 'volume'])
+    else:
+        # 写入本地价格存储，之后组合风险计算和回测读取该股票时不再重复拉取
+        try:
+            get_price_store().put(ticker, prices_df.set_index("date"), history_start=start_date)
+        except Exception as e:
+            logger.warning(f"写入本地价格存储失败: {e}")
 
     # 获取财务指标
     try:
@@ -4,6 +4,10 @@ from model import get_chat_completion
 import json
 
 from agents.state import AgentState, show_agent_reasoning, show_workflow_status
+from utils.signal_weights import SIGNAL_WEIGHTS
+
+# 提示词中各分析的权重，来自信号权重配置
+AGENT_WEIGHTS = SIGNAL_WEIGHTS["agent_weights"]
 
 
 ##### Portfolio Management Agent #####
@@ -26,30 +30,30 @@ def portfolio_management_agent(state: AgentState):
     valuation_message = next(
         msg for msg in state["messages"] if msg.name == "valuation_agent")
     risk_message = next(
-        msg for msg in state["messages"] if msg.name == "risk_management_agent") if False else "N/A"
+        (msg.content for msg in state["messages"] if msg.name == "risk_management_agent"), "N/A")
 
     # Create the system message
     system_message = {
         "role": "system",
-        "content": """你是一名投资组合经理，负责做出最终的交易决策。
+        "content": f"""你是一名投资组合经理，负责做出最终的交易决策。
         你的工作是基于团队的分析做出短线及长线的交易决策
 
         
 
         在权衡不同方向和时机的信号时：
-        1. 估值分析（权重 35%）
+        1. 估值分析（权重 {AGENT_WEIGHTS['valuation']:.0%}）
            - 公允价值评估的主要驱动因素
            - 判断当前价格是否是良好的买入/卖出时机
        
-        2. 基本面分析（权重 30%）
+        2. 基本面分析（权重 {AGENT_WEIGHTS['fundamentals']:.0%}）
            - 评估业务质量和增长潜力
            - 决定对长期潜力的信心
        
-        3. 技术分析（权重 25%）
+        3. 技术分析（权重 {AGENT_WEIGHTS['technical']:.0%}）
            - 次要确认信号
            - 帮助确定买入/卖出的时机
        
-        4. 市场情绪分析（权重 10%）
+        4. 市场情绪分析（权重 {AGENT_WEIGHTS['sentiment']:.0%}）
            - 最终参考因素
            - 可在风险范围内影响仓位规模
        
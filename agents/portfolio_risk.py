@@ -0,0 +1,373 @@
+import json
+import math
+import os
+from statistics import NormalDist
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 是否在 risk_management_agent 中按组合层面的风险限额计算仓位上限
+PORTFOLIO_RISK = os.getenv("PORTFOLIO_RISK", "1") == "1"
+# 估计协方差使用的交易日数，以及参与估计所需的最少有效收益率个数
+PORTFOLIO_LOOKBACK = int(os.getenv("PORTFOLIO_LOOKBACK", "250"))
+PORTFOLIO_MIN_OBS = int(os.getenv("PORTFOLIO_MIN_OBS", "60"))
+# 从本地价格存储读取其他持仓的历史长度（自然日），与 market_data_agent 默认拉取的一年一致，可直接复用其写入的日线
+PORTFOLIO_HISTORY_DAYS = int(os.getenv("PORTFOLIO_HISTORY_DAYS", "365"))
+# 默认持仓文件（JSON，格式见 holdings_from_portfolio），/analyze 请求未提供持仓时读取
+PORTFOLIO_FILE = os.getenv("PORTFOLIO_FILE", os.path.join("src", "data", "portfolio.json"))
+# 组合层面的限额：VaR 占总资产的上限、单只股票对组合 VaR 的贡献占比上限
+PORTFOLIO_VAR_LIMIT = float(os.getenv("PORTFOLIO_VAR_LIMIT", "0.02"))
+PORTFOLIO_MAX_RISK_CONTRIBUTION = float(os.getenv("PORTFOLIO_MAX_RISK_CONTRIBUTION", "0.35"))
+PORTFOLIO_VAR_LEVEL = float(os.getenv("PORTFOLIO_VAR_LEVEL", "0.95"))
+PORTFOLIO_VAR_HORIZON = int(os.getenv("PORTFOLIO_VAR_HORIZON", "1"))
+
+_normal = NormalDist()
+
+
+def ledoit_wolf(returns: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Ledoit-Wolf 收缩协方差估计，收缩目标为等方差的对角阵
+
+    与 sklearn.covariance.ledoit_wolf 的公式相同，只用 numpy 实现，
+    持仓数接近或超过样本天数时样本协方差不可逆，收缩后仍为正定。
+
+    Args:
+        returns: (T, N) 的收益率矩阵，不能含 NaN
+
+    Returns:
+        (协方差矩阵 (N, N), 收缩强度 0~1)
+    """
+    x = returns - returns.mean(axis=0)
+    n_samples, n_features = x.shape
+    emp_cov = x.T @ x / n_samples
+    if n_features == 1:
+        return emp_cov, 0.0
+
+    x2 = x ** 2
+    emp_cov_trace = x2.sum(axis=0) / n_samples
+    mu = emp_cov_trace.sum() / n_features
+    beta_ = np.sum(x2.T @ x2)
+    delta_ = np.sum(emp_cov ** 2)
+    beta = (beta_ / n_samples - delta_) / (n_features * n_samples)
+    delta = (delta_ - 2.0 * mu * emp_cov_trace.sum() + n_features * mu ** 2) / n_features
+    beta = min(beta, delta)
+    shrinkage = 0.0 if beta == 0 else float(beta / delta)
+
+    cov = (1.0 - shrinkage) * emp_cov
+    cov.flat[::n_features + 1] += shrinkage * mu
+    return cov, shrinkage
+
+
+def returns_matrix(closes: pd.DataFrame, min_obs: int = PORTFOLIO_MIN_OBS) -> Tuple[pd.DataFrame, List[str]]:
+    """把收盘价宽表转换为对齐的日收益率矩阵
+
+    停牌日用前值填充（收益率为0）。各股票从都有价格的第一天开始对齐，
+    对齐后的窗口不足 min_obs 个收益率时，从上市（或有数据）最晚的股票开始剔除，
+    避免一只新股把其余股票的样本截短；收益率出现缺失或无穷值的股票同样剔除。
+
+    Returns:
+        (收益率 DataFrame, 被剔除的股票列表)
+    """
+    closes = closes.sort_index().ffill()
+    excluded = []
+    # 按有效价格的起始位置排序，窗口起点由最晚的那只决定
+    starts = closes.notna().to_numpy().argmax(axis=0)
+    starts = pd.Series(np.where(closes.notna().any().to_numpy(), starts, len(closes)), index=closes.columns)
+    for ticker in starts.sort_values(ascending=False, kind="stable").index:
+        if len(closes) - starts.max() >= min_obs + 1:
+            break
+        excluded.append(ticker)
+        starts = starts.drop(ticker)
+    closes = closes.drop(columns=excluded)
+    if closes.empty:
+        return pd.DataFrame(index=closes.index[:0]), excluded
+
+    complete = closes.notna().all(axis=1)
+    if not complete.any():
+        return pd.DataFrame(index=closes.index[:0]), excluded + list(closes.columns)
+    returns = closes.loc[complete.idxmax():].pct_change().iloc[1:].replace([np.inf, -np.inf], np.nan)
+    invalid = returns.columns[returns.isna().any()].tolist()
+    return returns.drop(columns=invalid), excluded + invalid
+
+
+def covariance_matrix(
+    closes: pd.DataFrame,
+    lookback: int = PORTFOLIO_LOOKBACK,
+    min_obs: int = PORTFOLIO_MIN_OBS,
+) -> Tuple[pd.DataFrame, float, List[str]]:
+    """最近 lookback 个交易日日收益率的收缩协方差矩阵
+
+    Returns:
+        (日收益率协方差 DataFrame, 收缩强度, 被剔除的股票列表)
+    """
+    returns, excluded = returns_matrix(closes.iloc[-(lookback + 1):], min_obs)
+    if returns.shape[1] == 0 or len(returns) < 2:
+        return pd.DataFrame(), 0.0, list(closes.columns)
+    cov, shrinkage = ledoit_wolf(returns.to_numpy(dtype=np.float64))
+    return pd.DataFrame(cov, index=returns.columns, columns=returns.columns), shrinkage, excluded
+
+
+def var_decomposition(
+    values: pd.Series,
+    cov: pd.DataFrame,
+    level: float = PORTFOLIO_VAR_LEVEL,
+    horizon: int = PORTFOLIO_VAR_HORIZON,
+) -> Tuple[float, pd.DataFrame]:
+    """参数法（零均值正态）组合 VaR 及其按持仓的分解
+
+    与 risk_engine 的口径一致，VaR 为负数表示亏损，单位为金额。
+    边际 VaR 为组合 VaR 对持仓金额的偏导 z·(Σw)_i/σ，成分 VaR = 持仓金额 × 边际 VaR，
+    各成分 VaR 之和等于组合 VaR（欧拉分解）。
+
+    Args:
+        values: 持仓市值，索引与 cov 一致
+        cov: 日收益率协方差矩阵
+
+    Returns:
+        (组合 VaR, DataFrame[value, marginal_var, component_var, contribution])
+    """
+    w = values.reindex(cov.index).fillna(0.0).to_numpy(dtype=np.float64)
+    sigma_w = cov.to_numpy() @ w * horizon
+    variance = float(w @ sigma_w)
+    z = _normal.inv_cdf(1 - level)
+    portfolio_sigma = math.sqrt(max(variance, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        marginal = np.where(portfolio_sigma > 0, z * sigma_w / portfolio_sigma, 0.0)
+        component = w * marginal
+        contribution = np.where(variance > 0, w * sigma_w / variance, 0.0)
+    table = pd.DataFrame({
+        "value": w,
+        "marginal_var": marginal,
+        "component_var": component,
+        "contribution": contribution,
+    }, index=cov.index)
+    return z * portfolio_sigma, table
+
+
+def _upper_root(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """a·x² + b·x + c = 0 的较大实根，无实根时为 NaN（a > 0）"""
+    disc = b ** 2 - 4 * a * c
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(disc >= 0, (-b + np.sqrt(np.maximum(disc, 0))) / (2 * a), np.nan)
+
+
+def position_headroom(
+    values: pd.Series,
+    cov: pd.DataFrame,
+    total_value: float,
+    cash: float,
+    max_weight: float = 0.25,
+    var_limit: float = PORTFOLIO_VAR_LIMIT,
+    max_contribution: float = PORTFOLIO_MAX_RISK_CONTRIBUTION,
+    level: float = PORTFOLIO_VAR_LEVEL,
+    horizon: int = PORTFOLIO_VAR_HORIZON,
+) -> pd.DataFrame:
+    """在组合层面的限额下，cov 中每只股票最多还能用现金买入多少
+
+    用现金买入 x 元股票 k 时总资产不变，组合方差 σ²(x) = w'Σw + 2x(Σw)_k + x²Σ_kk 是 x 的二次函数，
+    各限额都可以化为二次不等式，对所有股票一次性求根：
+    - var：|z|·σ(x) ≤ var_limit × 总资产
+    - contribution：股票 k 对组合方差的贡献占比 ≤ max_contribution，
+      只在其余持仓数不少于 1/max_contribution 时生效（持仓太少时无法满足该限额）
+    - weight：持仓市值 ≤ max_weight × 总资产
+    - cash：不超过可用现金
+
+    Returns:
+        pd.DataFrame: 索引为股票，列为 current_value、max_additional_value、max_position_value、
+                      binding（起作用的限额）以及各限额单独对应的可买金额
+    """
+    sigma = cov.to_numpy() * horizon
+    w = values.reindex(cov.index).fillna(0.0).to_numpy(dtype=np.float64)
+    m = sigma @ w
+    c0 = float(w @ m)
+    a = np.diag(sigma).copy()
+    a[a <= 0] = np.nan
+    z = abs(_normal.inv_cdf(1 - level))
+
+    budget = (var_limit * total_value / z) ** 2
+    var_room = np.nan_to_num(_upper_root(a, 2 * m, np.full_like(a, c0 - budget)), nan=0.0)
+
+    s = max_contribution
+    contrib_room = _upper_root(a * (1 - s), w * a + m - 2 * s * m, w * m - s * c0)
+    # 已超过贡献占比上限时不再加仓
+    contrib_room = np.where(w * m - s * c0 > 0, 0.0, np.nan_to_num(contrib_room, nan=0.0))
+    others = (w > 0).sum() - (w > 0)
+    contrib_room = np.where(others >= math.ceil(1 / s), contrib_room, np.inf)
+
+    weight_room = max_weight * total_value - w
+    cash_room = np.full_like(w, max(cash, 0.0))
+
+    rooms = pd.DataFrame({"var": var_room, "contribution": contrib_room,
+                          "weight": weight_room, "cash": cash_room}, index=cov.index).clip(lower=0.0)
+    additional = rooms.min(axis=1)
+    return pd.DataFrame({
+        "current_value": w,
+        "max_additional_value": additional,
+        "max_position_value": w + additional,
+        "binding": rooms.idxmin(axis=1),
+    }, index=cov.index).join(rooms.add_suffix("_room"))
+
+
+def holdings_from_portfolio(portfolio: Mapping[str, Any], ticker: str) -> Tuple[float, Dict[str, float]]:
+    """从 state["data"]["portfolio"] 中读取现金和各股票持股数
+
+    支持两种格式：{"cash", "stock"}（只持有当前分析的股票）和
+    {"cash", "positions": {代码: 股数}}（多只股票）。
+    """
+    positions = dict(portfolio.get("positions") or {})
+    if not positions and portfolio.get("stock"):
+        positions = {ticker: portfolio["stock"]}
+    return float(portfolio.get("cash", 0.0)), {str(k): float(v) for k, v in positions.items() if v}
+
+
+def parse_portfolio(portfolio: Any) -> Dict[str, Any]:
+    """校验并规范化外部传入的持仓
+
+    Args:
+        portfolio: {"cash": 现金, "positions": {代码: 股数}}，或只持有当前股票的 {"cash", "stock"}
+
+    Returns:
+        dict: 规范化后的持仓，股票代码为6位字符串，数值为 float
+
+    Raises:
+        ValueError: 格式不合法
+    """
+    if not isinstance(portfolio, Mapping):
+        raise ValueError("持仓应为对象，如 {\"cash\": 100000, \"positions\": {\"600519\": 100}}")
+    try:
+        cash = float(portfolio.get("cash", 0.0))
+        positions = {str(code).strip(): float(n) for code, n in dict(portfolio.get("positions") or {}).items()}
+        stock = float(portfolio.get("stock", 0.0) or 0.0)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"持仓中的现金和股数必须为数字: {e}") from e
+    invalid = [code for code in positions if not (len(code) == 6 and code.isdigit())]
+    if invalid:
+        raise ValueError(f"持仓中的股票代码必须为6位数字: {invalid}")
+    if cash < 0 or stock < 0 or any(n < 0 for n in positions.values()):
+        raise ValueError("持仓中的现金和股数不能为负数")
+    result: Dict[str, Any] = {"cash": cash}
+    if positions:
+        result["positions"] = positions
+    if stock:
+        result["stock"] = stock
+    return result
+
+
+def load_portfolio(path: str = PORTFOLIO_FILE) -> Optional[Dict[str, Any]]:
+    """读取持仓文件，文件不存在时返回 None
+
+    Raises:
+        ValueError: 文件内容不是合法的持仓
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        try:
+            return parse_portfolio(json.load(f))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"持仓文件 {path} 不是合法的 JSON: {e}") from e
+
+
+def holdings_value(
+    shares: Mapping[str, float],
+    prices: Optional[Mapping[str, float]] = None,
+    store=None,
+) -> Tuple[Dict[str, float], List[str]]:
+    """按最新收盘价计算各持仓的市值
+
+    Args:
+        shares: {代码: 股数}
+        prices: 已知的最新收盘价，其余股票从本地价格存储读取
+        store: 价格存储，默认 get_price_store()
+
+    Returns:
+        ({代码: 市值}, 无法取得价格的股票)
+    """
+    prices = dict(prices or {})
+    values, unpriced = {}, []
+    for t, n in shares.items():
+        price = prices.get(t)
+        if price is None:
+            try:
+                if store is None:
+                    from utils.price_store import get_price_store
+                    store = get_price_store()
+                closes = store.get(t).dropna()
+                price = float(closes.iloc[-1]) if len(closes) else None
+            except Exception:
+                price = None
+        if price is None or not np.isfinite(price):
+            unpriced.append(t)
+        else:
+            values[t] = n * float(price)
+    return values, unpriced
+
+
+def portfolio_risk(
+    portfolio: Mapping[str, Any],
+    ticker: str,
+    prices: Optional[Mapping[str, pd.Series]] = None,
+    max_weight: float = 0.25,
+    store=None,
+) -> Dict[str, Any]:
+    """当前持仓的组合风险，以及在组合限额下 ticker 的仓位上限
+
+    Args:
+        portfolio: 持仓，格式见 holdings_from_portfolio
+        ticker: 准备买入的股票
+        prices: 已获取的收盘价（以日期为索引），其余股票从本地价格存储读取
+        max_weight: 单只股票占总资产的上限
+        store: 价格存储，默认 get_price_store()
+
+    Returns:
+        dict: 可 JSON 序列化的组合 VaR、成分 VaR 排名和 ticker 的仓位上限；
+              有持仓无法取得价格时 available 为 False，unpriced 列出这些股票
+    """
+    cash, shares = holdings_from_portfolio(portfolio, ticker)
+    prices = dict(prices or {})
+    tickers = list(dict.fromkeys([*shares, ticker]))
+    missing = [t for t in tickers if t not in prices]
+    if missing:
+        if store is None:
+            from utils.price_store import get_price_store
+            store = get_price_store()
+        stored = store.closes(missing, history_days=PORTFOLIO_HISTORY_DAYS)
+        prices.update({t: stored[t] for t in missing})
+    closes = pd.DataFrame({t: prices[t] for t in tickers})
+
+    last = closes.ffill().iloc[-1] if len(closes) else pd.Series(np.nan, index=tickers)
+    values = pd.Series(shares, dtype=float) * last.reindex(list(shares))
+    # 有持仓无法估值时总资产未知，VaR 占比和各项仓位上限都无从计算
+    unpriced = values.index[~np.isfinite(values)].tolist()
+    if unpriced:
+        return {"available": False, "unpriced": unpriced, "excluded": [], "total_value": None}
+    total_value = cash + float(values.sum())
+
+    cov, shrinkage, excluded = covariance_matrix(closes)
+    if ticker not in cov.index or total_value <= 0:
+        return {"available": False, "excluded": excluded, "total_value": total_value}
+
+    portfolio_var, table = var_decomposition(values, cov)
+    headroom = position_headroom(values, cov, total_value, cash, max_weight=max_weight)
+    row = headroom.loc[ticker]
+    top = table[table["value"] > 0].sort_values("component_var").head(10)
+    return {
+        "available": True,
+        "holdings": int((table["value"] > 0).sum()),
+        "excluded": excluded,
+        "total_value": round(total_value, 2),
+        "shrinkage": round(shrinkage, 4),
+        "portfolio_var": round(portfolio_var, 2),
+        "portfolio_var_ratio": round(portfolio_var / total_value, 6),
+        "var_limit": PORTFOLIO_VAR_LIMIT,
+        "top_contributors": {t: {"component_var": round(float(r.component_var), 2),
+                                 "contribution": round(float(r.contribution), 4)}
+                             for t, r in top.iterrows()},
+        "ticker": {
+            "current_value": round(float(row["current_value"]), 2),
+            "marginal_var": round(float(table.at[ticker, "marginal_var"]), 6),
+            "max_additional_value": round(float(row["max_additional_value"]), 2),
+            "max_position_value": round(float(row["max_position_value"]), 2),
+            "binding": row["binding"],
+        },
+    }
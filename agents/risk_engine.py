@@ -0,0 +1,174 @@
+import os
+from statistics import NormalDist
+from typing import Any, Dict, Iterable, Mapping, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# 默认的VaR置信水平、持有期（交易日）、回撤窗口（交易日）
+RISK_VAR_LEVELS = tuple(float(x) for x in os.getenv("RISK_VAR_LEVELS", "0.95,0.99").split(","))
+RISK_HORIZONS = tuple(int(x) for x in os.getenv("RISK_HORIZONS", "1,5,10").split(","))
+RISK_DRAWDOWN_WINDOWS = tuple(int(x) for x in os.getenv("RISK_DRAWDOWN_WINDOWS", "60,120,250").split(","))
+# 计算Cornish-Fisher CVaR时在尾部取的分位点个数
+CF_TAIL_POINTS = 64
+TRADING_DAYS = 252
+
+_normal = NormalDist()
+PricesLike = Union[pd.DataFrame, pd.Series, Mapping[str, pd.Series]]
+
+
+def to_close_frame(prices: PricesLike) -> pd.DataFrame:
+    """把单只或多只股票的收盘价统一为 日期 × 股票 的宽表"""
+    if isinstance(prices, pd.Series):
+        return prices.to_frame(prices.name or "close").astype(float)
+    if isinstance(prices, pd.DataFrame):
+        return prices.astype(float)
+    return pd.DataFrame(dict(prices)).astype(float)
+
+
+def horizon_returns(closes: pd.DataFrame, horizon: int) -> pd.DataFrame:
+    """持有期收益率（重叠窗口），horizon=1 即日收益率"""
+    return (closes / closes.shift(horizon) - 1).iloc[horizon:]
+
+
+def _cornish_fisher_z(z: np.ndarray, skew: np.ndarray, kurt: np.ndarray) -> np.ndarray:
+    """按偏度和超额峰度修正正态分位数，z、skew、kurt 可广播"""
+    return (z + (z ** 2 - 1) * skew / 6 + (z ** 3 - 3 * z) * kurt / 24
+            - (2 * z ** 3 - 5 * z) * skew ** 2 / 36)
+
+
+def value_at_risk(
+    prices: PricesLike,
+    levels: Sequence[float] = RISK_VAR_LEVELS,
+    horizons: Sequence[int] = RISK_HORIZONS,
+) -> pd.DataFrame:
+    """同时计算多只股票、多个持有期和置信水平下三种方法的VaR和CVaR
+
+    收益率口径：结果为收益率分位数，负数表示亏损（与 returns.quantile(0.05) 相同）。
+    - historical：持有期收益率的经验分位数，CVaR 为分位数以下收益率的均值
+    - parametric：正态分布，均值和波动率按持有期的 h 和 √h 缩放
+    - cornish_fisher：用日收益率的偏度、超额峰度修正正态分位数（持有期内按 1/√h、1/h 缩放），
+      CVaR 为尾部若干分位点修正后 VaR 的均值
+
+    Returns:
+        pd.DataFrame: 索引为 (ticker, horizon, level)，列为 {方法}_var、{方法}_cvar
+    """
+    closes = to_close_frame(prices)
+    levels = np.asarray(levels, dtype=float)
+    tail = 1 - levels                                               # (L,)
+    daily = horizon_returns(closes, 1)
+    mu = daily.mean().to_numpy()                                    # (N,)
+    sigma = daily.std().to_numpy()
+    skew = daily.skew().to_numpy()
+    kurt = daily.kurt().to_numpy()
+
+    z = np.array([_normal.inv_cdf(p) for p in tail])                # (L,)
+    density = np.array([_normal.pdf(v) for v in z])
+    # Cornish-Fisher CVaR 使用的尾部分位点，形状 (L, M)
+    tail_grid = tail[:, None] * (np.arange(CF_TAIL_POINTS) + 0.5) / CF_TAIL_POINTS
+    z_tail = np.vectorize(_normal.inv_cdf)(tail_grid)
+
+    blocks = []
+    for horizon in horizons:
+        returns = horizon_returns(closes, horizon).to_numpy()      # (T, N)
+        mu_h, sigma_h = mu * horizon, sigma * np.sqrt(horizon)
+        skew_h, kurt_h = skew / np.sqrt(horizon), kurt / horizon
+
+        hist_var = np.nanquantile(returns, tail, axis=0)            # (L, N)
+        in_tail = returns[None, :, :] <= hist_var[:, None, :]        # (L, T, N)
+        with np.errstate(invalid="ignore"):
+            hist_cvar = np.where(in_tail, returns[None], 0).sum(axis=1) / in_tail.sum(axis=1)
+
+        param_var = mu_h + z[:, None] * sigma_h
+        param_cvar = mu_h - sigma_h * (density / tail)[:, None]
+
+        cf_var = mu_h + _cornish_fisher_z(z[:, None], skew_h, kurt_h) * sigma_h
+        cf_tail = _cornish_fisher_z(z_tail[:, :, None], skew_h, kurt_h)  # (L, M, N)
+        cf_cvar = mu_h + cf_tail.mean(axis=1) * sigma_h
+
+        columns = {
+            "historical_var": hist_var, "historical_cvar": hist_cvar,
+            "parametric_var": param_var, "parametric_cvar": param_cvar,
+            "cornish_fisher_var": cf_var, "cornish_fisher_cvar": cf_cvar,
+        }
+        index = pd.MultiIndex.from_product([closes.columns, [horizon], levels], names=["ticker", "horizon", "level"])
+        # 各数组为 (L, N)，转置后按 ticker、level 的顺序展开
+        blocks.append(pd.DataFrame({name: values.T.ravel() for name, values in columns.items()}, index=index))
+    return pd.concat(blocks).sort_index()
+
+
+def rolling_drawdown(prices: PricesLike, window: int) -> pd.DataFrame:
+    """相对过去 window 个交易日最高价的回撤"""
+    closes = to_close_frame(prices)
+    return closes / closes.rolling(window=window, min_periods=1).max() - 1
+
+
+def drawdowns(prices: PricesLike, windows: Iterable[int] = RISK_DRAWDOWN_WINDOWS) -> pd.DataFrame:
+    """每只股票的当前回撤、全历史最大回撤，以及各窗口滚动回撤的最小值
+
+    max_drawdown_{w} 与 risk_management_agent 原有口径一致：(close / close.rolling(w).max() - 1).min()
+    """
+    closes = to_close_frame(prices)
+    underwater = closes / closes.cummax() - 1
+    result = pd.DataFrame({"current_drawdown": underwater.iloc[-1], "max_drawdown": underwater.min()})
+    for window in windows:
+        result[f"max_drawdown_{window}"] = (closes / closes.rolling(window=window).max() - 1).min()
+    result.index.name = "ticker"
+    return result
+
+
+def volatility_regimes(prices: PricesLike, short_window: int = 20, long_window: int = 120) -> pd.DataFrame:
+    """波动率水平和所处区间
+
+    Columns:
+        volatility: 全样本年化波动率
+        volatility_z_score: 全样本波动率相对 long_window 滚动波动率分布的Z分数（risk_management_agent 原有口径）
+        current_volatility: 最近 short_window 日的年化波动率
+        volatility_percentile: 当前短期波动率在其历史中的百分位
+        regime: low（<25%）、normal（<75%）、high（<95%）、extreme
+    """
+    closes = to_close_frame(prices)
+    returns = horizon_returns(closes, 1)
+    annualize = np.sqrt(TRADING_DAYS)
+    volatility = returns.std() * annualize
+    rolling_long = returns.rolling(window=long_window).std() * annualize
+    rolling_short = returns.rolling(window=short_window).std() * annualize
+    current = rolling_short.iloc[-1] if len(rolling_short) else pd.Series(np.nan, index=closes.columns)
+    percentile = (rolling_short <= current).sum() / rolling_short.notna().sum()
+    regime = np.select(
+        [percentile < 0.25, percentile < 0.75, percentile < 0.95, percentile >= 0.95],
+        ["low", "normal", "high", "extreme"], default="unknown")
+    result = pd.DataFrame({
+        "volatility": volatility,
+        "volatility_z_score": (volatility - rolling_long.mean()) / rolling_long.std(),
+        "current_volatility": current,
+        "volatility_percentile": percentile,
+        "regime": regime,
+    })
+    result.index.name = "ticker"
+    return result
+
+
+def risk_report(
+    prices: PricesLike,
+    levels: Sequence[float] = RISK_VAR_LEVELS,
+    horizons: Sequence[int] = RISK_HORIZONS,
+    windows: Iterable[int] = RISK_DRAWDOWN_WINDOWS,
+) -> Dict[str, Dict[str, Any]]:
+    """汇总每只股票的VaR/CVaR、回撤和波动率区间，返回可 JSON 序列化的字典
+
+    Returns:
+        {ticker: {"var": {"1d_95": {"historical_var": ..., ...}, ...}, "drawdown": {...}, "volatility": {...}}}
+    """
+    def clean(value):
+        if isinstance(value, (float, np.floating)):
+            return round(float(value), 6) if np.isfinite(value) else None
+        return value
+
+    dd = drawdowns(prices, windows).to_dict("index")
+    vol = volatility_regimes(prices).to_dict("index")
+    report = {ticker: {"var": {}, "drawdown": {k: clean(v) for k, v in dd[ticker].items()},
+                       "volatility": {k: clean(v) for k, v in vol[ticker].items()}} for ticker in dd}
+    for (ticker, horizon, level), row in value_at_risk(prices, levels, horizons).to_dict("index").items():
+        report[ticker]["var"][f"{horizon}d_{round(level * 100):g}"] = {k: clean(v) for k, v in row.items()}
+    return report
@@ -1,51 +1,74 @@
 import math
 
+import pandas as pd
 from langchain_core.messages import HumanMessage
 
+from agents.portfolio_risk import PORTFOLIO_RISK, holdings_from_portfolio, holdings_value, portfolio_risk
+from agents.risk_engine import risk_report
 from agents.state import AgentState, show_agent_reasoning, show_workflow_status
 from utils.api import prices_to_df
+from utils.logging_config import setup_logger
 
 import json
 import ast
 
 ##### Risk Management Agent #####
 
+logger = setup_logger('risk_manager')
+
 
 def risk_management_agent(state: AgentState):
-    """Responsible for risk management"""
+    """Responsible for risk management
+
+    作为 market_data_agent 之后的并行节点运行：没有辩论结果时只根据市场风险给出建议，
+    没有持仓信息时仓位上限以占总资产的比例表示。
+    """
     show_workflow_status("Risk Manager")
     show_reasoning = state["metadata"]["show_reasoning"]
-    portfolio = state["data"]["portfolio"]
     data = state["data"]
+    portfolio = data.get("portfolio")
+    ticker = data.get("ticker")
 
     prices_df = prices_to_df(data["prices"])
+    closes = pd.to_numeric(prices_df["close"], errors="coerce").dropna()
 
-    # Fetch debate room message instead of individual analyst messages
+    # 辩论室节点未接入工作流时没有该消息
     debate_message = next(
-        msg for msg in state["messages"] if msg.name == "debate_room_agent")
+        (msg for msg in state["messages"] if getattr(msg, "name", None) == "debate_room_agent"), None)
+    debate_results = None
+    if debate_message is not None:
+        try:
+            debate_results = json.loads(debate_message.content)
+        except Exception as e:
+            debate_results = ast.literal_eval(debate_message.content)
 
-    try:
-        debate_results = json.loads(debate_message.content)
-    except Exception as e:
-        debate_results = ast.literal_eval(debate_message.content)
+    if len(closes) < 2:
+        message_content = {
+            "max_position_size": None,
+            "max_position_fraction": 0.0,
+            "risk_score": None,
+            "trading_action": "hold",
+            "risk_metrics": {},
+            "reasoning": "价格数据不足，无法评估市场风险"
+        }
+        message = HumanMessage(content=json.dumps(message_content, ensure_ascii=False), name="risk_management_agent")
+        show_workflow_status("Risk Manager", "completed")
+        return {"messages": [message], "data": {**data, "risk_analysis": message_content}}
 
     # 1. Calculate Risk Metrics
-    returns = prices_df['close'].pct_change().dropna()
-    daily_vol = returns.std()
-    # Annualized volatility approximation
-    volatility = daily_vol * (252 ** 0.5)
-
-    # 计算波动率的历史分布
-    rolling_std = returns.rolling(window=120).std() * (252 ** 0.5)
-    volatility_mean = rolling_std.mean()
-    volatility_std = rolling_std.std()
-    volatility_percentile = (volatility - volatility_mean) / volatility_std
-
-    # Simple historical VaR at 95% confidence
-    var_95 = returns.quantile(0.05)
+    report = risk_report(closes.rename(ticker or "close"))
+    ticker_report = next(iter(report.values()))
+    volatility = ticker_report["volatility"]["volatility"] or 0.0
+    # 全样本波动率相对120日滚动波动率分布的Z分数
+    volatility_percentile = ticker_report["volatility"]["volatility_z_score"] or 0.0
+    # Historical VaR at 95% confidence, 1-day horizon
+    var_95 = ticker_report["var"]["1d_95"]["historical_var"] or 0.0
+    cvar_95 = ticker_report["var"]["1d_95"]["historical_cvar"] or 0.0
+    cf_var_95 = ticker_report["var"]["1d_95"]["cornish_fisher_var"] or 0.0
     # 使用60天窗口计算最大回撤
-    max_drawdown = (
-        prices_df['close'] / prices_df['close'].rolling(window=60).max() - 1).min()
+    max_drawdown = ticker_report["drawdown"].get("max_drawdown_60")
+    if max_drawdown is None:
+        max_drawdown = ticker_report["drawdown"]["max_drawdown"] or 0.0
 
     # 2. Market Risk Assessment
     market_risk_score = 0
@@ -70,22 +93,18 @@ def risk_management_agent(state: AgentState):
         market_risk_score += 1
 
     # 3. Position Size Limits
-    # Consider total portfolio value, not just cash
-    current_stock_value = portfolio['stock'] * prices_df['close'].iloc[-1]
-    total_portfolio_value = portfolio['cash'] + current_stock_value
-
     # Start with 25% max position of total portfolio
-    base_position_size = total_portfolio_value * 0.25
+    base_position_fraction = 0.25
 
     if market_risk_score >= 4:
         # Reduce position for high risk
-        max_position_size = base_position_size * 0.5
+        max_position_fraction = base_position_fraction * 0.5
     elif market_risk_score >= 2:
         # Slightly reduce for moderate risk
-        max_position_size = base_position_size * 0.75
+        max_position_fraction = base_position_fraction * 0.75
     else:
         # Keep base size for low risk
-        max_position_size = base_position_size
+        max_position_fraction = base_position_fraction
 
     # 4. Stress Testing
     stress_test_scenarios = {
@@ -95,74 +114,132 @@ def risk_management_agent(state: AgentState):
     }
 
     stress_test_results = {}
-    current_position_value = current_stock_value
-
-    for scenario, decline in stress_test_scenarios.items():
-        potential_loss = current_position_value * decline
-        portfolio_impact = potential_loss / (portfolio['cash'] + current_position_value) if (
-            portfolio['cash'] + current_position_value) != 0 else math.nan
-        stress_test_results[scenario] = {
-            "potential_loss": potential_loss,
-            "portfolio_impact": portfolio_impact
-        }
+    portfolio_analysis = None
+    position_limit_reason = None
+    if portfolio:
+        cash, shares = holdings_from_portfolio(portfolio, ticker)
+        current_stock_value = shares.get(ticker, 0.0) * float(closes.iloc[-1])
+        total_portfolio_value = None
+        max_position_size = None
+
+        if PORTFOLIO_RISK:
+            # 组合层面：用全部持仓的协方差计算 VaR 分解，并按组合限额收紧仓位上限
+            dated_closes = closes.set_axis(pd.to_datetime(prices_df.loc[closes.index, "date"])) \
+                if "date" in prices_df else None
+            try:
+                portfolio_analysis = portfolio_risk(
+                    portfolio, ticker, {ticker: dated_closes} if dated_closes is not None else None,
+                    max_weight=max_position_fraction)
+            except Exception as e:
+                logger.warning(f"组合风险计算失败，仅使用单只股票的仓位限制: {e}")
+            if portfolio_analysis and portfolio_analysis["available"]:
+                total_portfolio_value = portfolio_analysis["total_value"]
+                max_position_size = portfolio_analysis["ticker"]["max_position_value"]
+
+        if total_portfolio_value is None:
+            # Consider total portfolio value, not just cash (all positions at the latest close)
+            if portfolio_analysis and portfolio_analysis.get("unpriced"):
+                values, unpriced = {}, portfolio_analysis["unpriced"]
+            else:
+                values, unpriced = holdings_value(shares, {ticker: float(closes.iloc[-1])})
+            if unpriced:
+                position_limit_reason = f"无法取得持仓 {', '.join(unpriced)} 的价格，总资产未知"
+                logger.warning(f"{position_limit_reason}，不给出仓位上限")
+            else:
+                total_portfolio_value = cash + sum(values.values())
+                max_position_size = total_portfolio_value * max_position_fraction
+
+        for scenario, decline in stress_test_scenarios.items():
+            potential_loss = current_stock_value * decline
+            portfolio_impact = potential_loss / total_portfolio_value if total_portfolio_value else math.nan
+            stress_test_results[scenario] = {
+                "potential_loss": potential_loss,
+                "portfolio_impact": portfolio_impact
+            }
+    else:
+        # 没有持仓信息时，按满额建仓（max_position_fraction）估算对总资产的影响
+        max_position_size = None
+        for scenario, decline in stress_test_scenarios.items():
+            stress_test_results[scenario] = {
+                "potential_loss": None,
+                "portfolio_impact": decline * max_position_fraction
+            }
 
     # 5. Risk-Adjusted Signal Analysis
     # Consider debate room confidence levels
-    bull_confidence = debate_results["bull_confidence"]
-    bear_confidence = debate_results["bear_confidence"]
-    debate_confidence = debate_results["confidence"]
+    debate_analysis = None
+    if debate_results:
+        bull_confidence = debate_results["bull_confidence"]
+        bear_confidence = debate_results["bear_confidence"]
+        debate_confidence = debate_results["confidence"]
+        debate_signal = debate_results["signal"]
+        debate_analysis = {
+            "bull_confidence": bull_confidence,
+            "bear_confidence": bear_confidence,
+            "debate_confidence": debate_confidence,
+            "debate_signal": debate_signal
+        }
 
-    # Add to risk score if confidence is low or debate was close
-    confidence_diff = abs(bull_confidence - bear_confidence)
-    if confidence_diff < 0.1:  # Close debate
-        market_risk_score += 1
-    if debate_confidence < 0.3:  # Low overall confidence
-        market_risk_score += 1
+        # Add to risk score if confidence is low or debate was close
+        confidence_diff = abs(bull_confidence - bear_confidence)
+        if confidence_diff < 0.1:  # Close debate
+            market_risk_score += 1
+        if debate_confidence < 0.3:  # Low overall confidence
+            market_risk_score += 1
 
     # Cap risk score at 10
     risk_score = min(round(market_risk_score), 10)
 
     # 6. Generate Trading Action
     # Consider debate room signal along with risk assessment
-    debate_signal = debate_results["signal"]
-
     if risk_score >= 9:
         trading_action = "hold"
     elif risk_score >= 7:
         trading_action = "reduce"
+    elif debate_analysis and debate_analysis["debate_signal"] == "bullish" and debate_analysis["debate_confidence"] > 0.5:
+        trading_action = "buy"
+    elif debate_analysis and debate_analysis["debate_signal"] == "bearish" and debate_analysis["debate_confidence"] > 0.5:
+        trading_action = "sell"
     else:
-        if debate_signal == "bullish" and debate_confidence > 0.5:
-            trading_action = "buy"
-        elif debate_signal == "bearish" and debate_confidence > 0.5:
-            trading_action = "sell"
-        else:
-            trading_action = "hold"
+        trading_action = "hold"
+
+    portfolio_text = ""
+    if portfolio_analysis and portfolio_analysis["available"]:
+        portfolio_text = (f"Portfolio VaR={portfolio_analysis['portfolio_var_ratio']:.2%} "
+                          f"(limit {portfolio_analysis['var_limit']:.2%}, "
+                          f"binding={portfolio_analysis['ticker']['binding']}), ")
 
     message_content = {
-        "max_position_size": float(max_position_size),
+        "max_position_size": float(max_position_size) if max_position_size is not None else None,
+        "max_position_fraction": max_position_fraction,
+        "max_position_reason": position_limit_reason,
         "risk_score": risk_score,
         "trading_action": trading_action,
         "risk_metrics": {
             "volatility": float(volatility),
+            "volatility_regime": ticker_report["volatility"]["regime"],
             "value_at_risk_95": float(var_95),
+            "conditional_var_95": float(cvar_95),
+            "cornish_fisher_var_95": float(cf_var_95),
             "max_drawdown": float(max_drawdown),
+            "current_drawdown": ticker_report["drawdown"]["current_drawdown"],
             "market_risk_score": market_risk_score,
-            "stress_test_results": stress_test_results
-        },
-        "debate_analysis": {
-            "bull_confidence": bull_confidence,
-            "bear_confidence": bear_confidence,
-            "debate_confidence": debate_confidence,
-            "debate_signal": debate_signal
+            "stress_test_results": stress_test_results,
+            "var_by_horizon": ticker_report["var"],
         },
+        "portfolio_risk": portfolio_analysis,
+        "debate_analysis": debate_analysis,
         "reasoning": f"Risk Score {risk_score}/10: Market Risk={market_risk_score}, "
-                     f"Volatility={volatility:.2%}, VaR={var_95:.2%}, "
-                     f"Max Drawdown={max_drawdown:.2%}, Debate Signal={debate_signal}"
+                     f"Volatility={volatility:.2%} ({ticker_report['volatility']['regime']}), VaR={var_95:.2%}, "
+                     f"CVaR={cvar_95:.2%}, Cornish-Fisher VaR={cf_var_95:.2%}, "
+                     f"Max Drawdown={max_drawdown:.2%}, "
+                     f"{portfolio_text}"
+                     f"Debate Signal={debate_analysis['debate_signal'] if debate_analysis else 'N/A'}"
     }
 
     # Create the risk management message
     message = HumanMessage(
-        content=json.dumps(message_content),
+        content=json.dumps(message_content, ensure_ascii=False),
         name="risk_management_agent",
     )
 
@@ -171,7 +248,7 @@ def risk_management_agent(state: AgentState):
 
     show_workflow_status("Risk Manager", "completed")
     return {
-        "messages": state["messages"] + [message],
+        "messages": [message],
         "data": {
             **data,
             "risk_analysis": message_content
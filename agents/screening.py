@@ -0,0 +1,207 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.logging_config import setup_logger
+
+logger = setup_logger('screening')
+
+# 是否在 fundamentals_agent 和 valuation_agent 中加入全市场横截面排名
+FUNDAMENTAL_SCREENING = os.getenv("FUNDAMENTAL_SCREENING", "1") == "1"
+
+# fundamentals_agent 的阈值规则：每组 (指标, 比较方向, 阈值)，满足2条及以上看涨，0条看跌
+FUNDAMENTAL_RULES: Dict[str, List[Tuple[str, str, float]]] = {
+    "profitability": [("return_on_equity", ">", 0.15), ("net_margin", ">", 0.20), ("operating_margin", ">", 0.15)],
+    "growth": [("revenue_growth", ">", 0.10), ("earnings_growth", ">", 0.10), ("book_value_growth", ">", 0.10)],
+    "financial_health": [("current_ratio", ">", 1.5), ("debt_to_equity", "<", 0.5), ("fcf_conversion", ">", 0)],
+    "price_ratios": [("pe_ratio", "<", 25), ("price_to_book", "<", 3), ("price_to_sales", "<", 5)],
+}
+
+# 参与横截面排名的指标，True 表示数值越大越好
+RANKED_METRICS: Dict[str, bool] = {
+    "return_on_equity": True,
+    "net_margin": True,
+    "gross_margin": True,
+    "revenue_growth": True,
+    "earnings_growth": True,
+    "pe_ratio": False,
+    "price_to_book": False,
+    "price_to_sales": False,
+    "market_cap": True,
+}
+
+METRIC_NAMES = {
+    "return_on_equity": "净资产收益率",
+    "net_margin": "净利率",
+    "gross_margin": "毛利率",
+    "revenue_growth": "营收增长",
+    "earnings_growth": "净利润增长",
+    "pe_ratio": "市盈率",
+    "price_to_book": "市净率",
+    "price_to_sales": "市销率",
+    "market_cap": "总市值",
+}
+
+
+def _with_derived_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """补充规则中使用的派生列：自由现金流转换 = 每股现金流 - 0.8 × 每股收益
+
+    与 fundamentals_agent 相同，两者任一缺失或为0时视为不满足。
+    """
+    if "fcf_conversion" in frame:
+        return frame
+    fcf = frame.get("free_cash_flow_per_share")
+    eps = frame.get("earnings_per_share")
+    frame = frame.copy()
+    if fcf is None or eps is None:
+        frame["fcf_conversion"] = np.nan
+    else:
+        frame["fcf_conversion"] = (fcf - 0.8 * eps).where((fcf != 0) & (eps != 0))
+    return frame
+
+
+def screen(frame: pd.DataFrame, rules: Dict[str, List[Tuple[str, str, float]]] = FUNDAMENTAL_RULES) -> pd.DataFrame:
+    """对整张表一次性评估规则组
+
+    每条规则是一次列比较，缺失值（NaN）比较结果为 False，即不计分。
+
+    Returns:
+        pd.DataFrame: 与输入同索引，包含每组的得分（{组}_score）和信号（{组}_signal），
+                      以及 signal（综合信号）和 confidence（多数信号所占比例）
+    """
+    frame = _with_derived_columns(frame)
+    result = pd.DataFrame(index=frame.index)
+    signals = []
+    for group, group_rules in rules.items():
+        score = np.zeros(len(frame), dtype=int)
+        for column, op, threshold in group_rules:
+            values = frame[column].to_numpy(dtype=float) if column in frame else np.full(len(frame), np.nan)
+            with np.errstate(invalid="ignore"):
+                score += (values > threshold) if op == ">" else (values < threshold)
+        signal = np.where(score >= 2, "看涨", np.where(score == 0, "看跌", "中立"))
+        result[f"{group}_score"] = score
+        result[f"{group}_signal"] = signal
+        signals.append(signal)
+
+    stacked = np.vstack(signals)
+    bullish = (stacked == "看涨").sum(axis=0)
+    bearish = (stacked == "看跌").sum(axis=0)
+    result["signal"] = np.where(bullish > bearish, "看涨", np.where(bearish > bullish, "看跌", "中立"))
+    result["confidence"] = np.maximum(bullish, bearish) / len(rules)
+    return result
+
+
+def cross_sectional_percentiles(frame: pd.DataFrame, metrics: Dict[str, bool] = RANKED_METRICS) -> pd.DataFrame:
+    """各指标在全市场中的百分位（0~1，越大越好），缺失值不参与排名
+
+    数值越小越好的指标（如市盈率）取反后排名；市盈率等估值指标为负（亏损）时不参与排名。
+    """
+    columns = {}
+    for column, higher_is_better in metrics.items():
+        if column not in frame:
+            continue
+        values = frame[column]
+        if not higher_is_better:
+            values = -values.where(values > 0)
+        columns[column] = values.rank(pct=True)
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def percentile_label(pct: float) -> str:
+    """把百分位转换为描述，如 0.93 -> 前10%"""
+    if pct is None or not np.isfinite(pct):
+        return "无排名"
+    top = 1 - pct
+    for cutoff in (0.01, 0.05, 0.10, 0.25):
+        if top < cutoff:
+            return f"前{cutoff:.0%}"
+    if pct < 0.10:
+        return "后10%"
+    if pct < 0.25:
+        return "后25%"
+    return "中游"
+
+
+class ScreeningEngine:
+    """在全市场快照上预先计算规则筛选和横截面百分位，供各分析节点查询单只股票的相对位置"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = _with_derived_columns(frame)
+        self.screened = screen(self.frame)
+        self.percentiles = cross_sectional_percentiles(self.frame)
+        # 每个指标排序后的有效值，用于计算不在快照中的数值（如单只股票接口返回的指标）的百分位
+        self._sorted = {}
+        for column, higher_is_better in RANKED_METRICS.items():
+            if column in self.frame:
+                values = self.frame[column] if higher_is_better else self.frame[column].where(self.frame[column] > 0)
+                self._sorted[column] = np.sort(values.dropna().to_numpy(dtype=float))
+
+    def percentile_of(self, column: str, value: Optional[float]) -> Optional[float]:
+        """任意数值相对全市场的百分位（越大越好）"""
+        values = self._sorted.get(column)
+        if values is None or values.size == 0 or value is None or not np.isfinite(value):
+            return None
+        if not RANKED_METRICS[column]:
+            if value <= 0:
+                return None
+            return 1 - np.searchsorted(values, value, side="left") / values.size
+        return np.searchsorted(values, value, side="right") / values.size
+
+    def peer_context(self, ticker: str, metrics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """单只股票在全市场中的位置
+
+        Args:
+            ticker: 股票代码
+            metrics: 该股票的指标（如 get_financial_metrics 的结果）；提供时优先用这些数值计算百分位，
+                     保证与分析节点使用的数值一致，缺失或为0的指标再取快照中的排名
+
+        Returns:
+            dict: universe_size、percentiles（指标 -> 百分位）、labels（指标 -> 描述）、
+                  screen（快照中该股票的规则筛选结果）、universe_signal_share（全市场各信号占比）
+        """
+        row = self.frame.loc[ticker] if ticker in self.frame.index else None
+        percentiles = {}
+        for column in RANKED_METRICS:
+            value = (metrics or {}).get(column)
+            # get_financial_metrics 对缺失值返回0，此时优先使用快照中的排名
+            if value and np.isfinite(value):
+                pct = self.percentile_of(column, value)
+            elif row is not None and column in self.percentiles:
+                pct = self.percentiles.at[ticker, column]
+            else:
+                pct = self.percentile_of(column, value)
+            if pct is not None and np.isfinite(pct):
+                percentiles[column] = round(float(pct), 4)
+
+        screened = self.screened.loc[ticker].to_dict() if ticker in self.screened.index else {}
+        return {
+            "universe_size": int(len(self.frame)),
+            "percentiles": percentiles,
+            "labels": {column: percentile_label(pct) for column, pct in percentiles.items()},
+            "screen": {k: (v.item() if hasattr(v, "item") else v) for k, v in screened.items()},
+            "universe_signal_share": self.screened["signal"].value_counts(normalize=True).round(4).to_dict(),
+        }
+
+
+_engine = None
+_engine_frame = None
+_engine_lock = threading.Lock()
+
+
+def get_screening_engine(refresh: bool = False, wait: bool = True) -> ScreeningEngine:
+    """返回基于当前全市场快照的筛选引擎，快照更新后自动重建
+
+    wait 的含义同 UniverseStore.get：为 False 时不在调用线程中拉取快照。
+    """
+    global _engine, _engine_frame
+    from utils.universe import get_universe_store
+
+    frame = get_universe_store().get(refresh=refresh, wait=wait)
+    with _engine_lock:
+        if _engine is None or _engine_frame is not frame:
+            _engine = ScreeningEngine(frame)
+            _engine_frame = frame
+        return _engine
@@ -1,11 +1,18 @@
 from langchain_core.messages import HumanMessage
 from agents.state import AgentState, show_agent_reasoning, show_workflow_status
 from utils.logging_config import setup_logger
+from utils.news_cache import get_news_cache
+from utils.news_ingestion import get_news_ingestion
+from utils.sentiment_prefilter import article_text, get_sentiment_prefilter
+from utils.metrics import count, record_cache, submit_in_context
+from utils import replay
 import json
+import hashlib
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import os
-import akshare as ak
 import sys
 import os
 current = os.path.dirname(os.path.abspath(__file__))
@@ -32,9 +39,7 @@ def sentiment_agent(state: AgentState):
     news_list = get_stock_news(symbol, max_news=num_of_news)  # 确保获取足够的新闻
 
     # 过滤7天内的新闻
-    cutoff_date = datetime.now() - timedelta(days=7)
-    recent_news = [news for news in news_list
-                   if datetime.strptime(news['publish_time'], '%Y-%m-%d %H:%M:%S') > cutoff_date]
+    recent_news = filter_recent_news(news_list, days=7)
 
     sentiment_score = get_news_sentiment(recent_news, num_of_news=num_of_news)
 
@@ -78,6 +83,8 @@ def sentiment_agent(state: AgentState):
 def get_stock_news(symbol: str, max_news: int = 10) -> list:
     """获取并处理个股新闻
 
+    新闻由共享的新闻抓取服务写入本地文章索引，刷新间隔内的重复请求不会再次抓取。
+
     Args:
         symbol (str): 股票代码，如 "300059"
         max_news (int, optional): 获取的新闻条数，默认为10条。最大支持100条。
@@ -85,179 +92,57 @@ def get_stock_news(symbol: str, max_news: int = 10) -> list:
     Returns:
         list: 新闻列表，每条新闻包含标题、内容、发布时间等信息
     """
-
-    # 设置pandas显示选项，确保显示完整内容
-    pd.set_option('display.max_columns', None)
-    pd.set_option('display.max_rows', None)
-    pd.set_option('display.max_colwidth', None)
-    pd.set_option('display.width', None)
-
     # 限制最大新闻条数
     max_news = min(max_news, 100)
 
-    # 获取当前日期
-    today = datetime.now().strftime("%Y-%m-%d")
-
-    # 构建新闻文件路径
-    # project_root = os.path.dirname(os.path.dirname(
-    #     os.path.dirname(os.path.abspath(__file__))))
-    news_dir = os.path.join("src", "data", "stock_news")
-    print(f"新闻保存目录: {news_dir}")
-
-    # 确保目录存在
     try:
-        os.makedirs(news_dir, exist_ok=True)
-        print(f"成功创建或确认目录存在: {news_dir}")
-    except Exception as e:
-        print(f"创建目录失败: {e}")
-        return []
-
-    news_file = os.path.join(news_dir, f"{symbol}_news.json")
-    print(f"新闻文件路径: {news_file}")
-
-    # 检查是否需要更新新闻
-    need_update = True
-    if os.path.exists(news_file):
-        try:
-            with open(news_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if data.get("date") == today:
-                    cached_news = data.get("news", [])
-                    if len(cached_news) >= max_news:
-                        print(f"使用缓存的新闻数据: {news_file}")
-                        return cached_news[:max_news]
-                    else:
-                        print(
-                            f"缓存的新闻数量({len(cached_news)})不足，需要获取更多新闻({max_news}条)")
-        except Exception as e:
-            print(f"读取缓存文件失败: {e}")
-
-    print(f'开始获取{symbol}的新闻数据...')
-
-    try:
-        # 获取新闻列表
-        news_df = ak.stock_news_em(symbol=symbol)
-        if news_df is None or len(news_df) == 0:
-            print(f"未获取到{symbol}的新闻数据")
-            return []
-
-        print(f"成功获取到{len(news_df)}条新闻")
-
-        # 实际可获取的新闻数量
-        available_news_count = len(news_df)
-        if available_news_count < max_news:
-            print(f"警告：实际可获取的新闻数量({available_news_count})少于请求的数量({max_news})")
-            max_news = available_news_count
-
-        # 获取指定条数的新闻（考虑到可能有些新闻内容为空，多获取50%）
-        news_list = []
-        for _, row in news_df.head(int(max_news * 1.5)).iterrows():
-            try:
-                # 获取新闻内容
-                content = row["新闻内容"] if "新闻内容" in row and not pd.isna(
-                    row["新闻内容"]) else ""
-                if not content:
-                    content = row["新闻标题"]
-
-                # 只去除首尾空白字符
-                content = content.strip()
-                if len(content) < 10:  # 内容太短的跳过
-                    continue
-
-                # 获取关键词
-                keyword = row["关键词"] if "关键词" in row and not pd.isna(
-                    row["关键词"]) else ""
-
-                # 添加新闻
-                news_item = {
-                    "title": row["新闻标题"].strip(),
-                    "content": content,
-                    "publish_time": row["发布时间"],
-                    "source": row["文章来源"].strip(),
-                    "url": row["新闻链接"].strip(),
-                    "keyword": keyword.strip()
-                }
-                news_list.append(news_item)
-                print(f"成功添加新闻: {news_item['title']}")
-
-            except Exception as e:
-                print(f"处理单条新闻时出错: {e}")
-                continue
-
-        # 按发布时间排序
-        news_list.sort(key=lambda x: x["publish_time"], reverse=True)
-
-        # 只保留指定条数的有效新闻
-        news_list = news_list[:max_news]
-
-        # 保存到文件
-        try:
-            save_data = {
-                "date": today,
-                "news": news_list
-            }
-            with open(news_file, 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, ensure_ascii=False, indent=2)
-            print(f"成功保存{len(news_list)}条新闻到文件: {news_file}")
-        except Exception as e:
-            print(f"保存新闻数据到文件时出错: {e}")
-
-        return news_list
-
+        news_list = get_news_ingestion().get_news(symbol, max_news=max_news)
     except Exception as e:
         print(f"获取新闻数据时出错: {e}")
         return []
 
+    if len(news_list) < max_news:
+        print(f"警告：实际可获取的新闻数量({len(news_list)})少于请求的数量({max_news})")
+    return news_list
 
-def get_news_sentiment(news_list: list, num_of_news: int = 5) -> float:
-    """分析新闻情感得分
-
-    Args:
-        news_list (list): 新闻列表
-        num_of_news (int): 用于分析的新闻数量，默认为5条
 
-    Returns:
-        float: 情感得分，范围[-1, 1]，-1最消极，1最积极
-    """
+def filter_recent_news(news_list: list, days: int = 7) -> list:
+    """保留最近若干天内发布的新闻，发布时间统一按 datetime 批量解析比较"""
     if not news_list:
-        return 0.0
-
-    # # 获取项目根目录
-    # project_root = os.path.dirname(os.path.dirname(
-    #     os.path.dirname(os.path.abspath(__file__))))
-
-    # 检查是否有缓存的情感分析结果
-    # 检查是否有缓存的情感分析结果
-    cache_file = "src/data/sentiment_cache.json"
-    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-
-    # 生成新闻内容的唯一标识
-    news_key = "|".join([
-        f"{news['title']}|{news['content'][:100]}|{news['publish_time']}"
-        for news in news_list[:num_of_news]
-    ])
-
-    # 检查缓存
-    if os.path.exists(cache_file):
-        print("发现情感分析缓存文件")
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache = json.load(f)
-                if news_key in cache:
-                    print("使用缓存的情感分析结果")
-                    return cache[news_key]
-                print("未找到匹配的情感分析缓存")
-        except Exception as e:
-            print(f"读取情感分析缓存出错: {e}")
-            cache = {}
-    else:
-        print("未找到情感分析缓存文件，将创建新文件")
-        cache = {}
-
-    # 准备系统消息
-    system_message = {
-        "role": "system",
-        "content": """你是一个专业的A股市场分析师，擅长解读新闻对股票走势的影响。你需要分析一组新闻的情感倾向，并给出一个介于-1到1之间的分数：
+        return []
+    publish_times = pd.to_datetime(pd.Series([news.get('publish_time') for news in news_list]), errors="coerce")
+    mask = publish_times > replay.now() - timedelta(days=days)
+    return [news for news, keep in zip(news_list, mask) if keep]
+
+
+def news_article_key(news: dict) -> str:
+    """根据新闻标题、正文和发布时间生成定长的内容哈希，作为单条新闻的情感缓存键"""
+    raw = f"{news['title']}|{news['content']}|{news['publish_time']}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+# 单次LLM调用最多打分的新闻条数及字符数，超出时分块并行处理
+SENTIMENT_CHUNK_SIZE = int(os.getenv("SENTIMENT_CHUNK_SIZE", "20"))
+SENTIMENT_CHUNK_CHARS = int(os.getenv("SENTIMENT_CHUNK_CHARS", "12000"))
+# 单条新闻送入LLM的最大正文长度
+SENTIMENT_ARTICLE_MAX_CHARS = int(os.getenv("SENTIMENT_ARTICLE_MAX_CHARS", "1000"))
+SENTIMENT_MAX_WORKERS = int(os.getenv("SENTIMENT_MAX_WORKERS", "4"))
+# 时间衰减半衰期（小时），以最新一条新闻的发布时间为基准
+SENTIMENT_HALF_LIFE_HOURS = float(os.getenv("SENTIMENT_HALF_LIFE_HOURS", "72"))
+# 来源权重，未列出的来源权重为1，可通过环境变量 SENTIMENT_SOURCE_WEIGHTS（JSON）覆盖
+SOURCE_WEIGHTS = {
+    "证券时报": 1.2,
+    "证券时报网": 1.2,
+    "中国证券报": 1.2,
+    "上海证券报": 1.2,
+    "证券日报": 1.2,
+    **json.loads(os.getenv("SENTIMENT_SOURCE_WEIGHTS", "{}")),
+}
+
+# 准备系统消息
+SENTIMENT_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """你是一个专业的A股市场分析师，擅长解读新闻对股票走势的影响。你需要逐条分析新闻的情感倾向，并为每条新闻给出一个介于-1到1之间的分数：
         - 1表示极其积极（例如：重大利好消息、超预期业绩、行业政策支持）
         - 0.5到0.9表示积极（例如：业绩增长、新项目落地、获得订单）
         - 0.1到0.4表示轻微积极（例如：小额合同签订、日常经营正常）
@@ -280,50 +165,220 @@ def get_news_sentiment(news_list: list, num_of_news: int = 5) -> float:
         2. 新闻的时效性和影响范围
         3. 对公司基本面的实际影响
         4. A股市场的特殊反应规律"""
-    }
+}
+
+
+def parse_article_scores(result: str, ids: List[int]) -> Dict[int, float]:
+    """解析LLM返回的结构化打分结果
 
-    # 准备新闻内容
-    news_content = "\n\n".join([
-        f"标题：{news['title']}\n"
+    期望格式为 [{"id": 1, "score": 0.3}, ...]；也兼容与输入等长的纯数字数组。
+    无法解析或编号不在输入中的条目会被忽略。
+
+    Args:
+        result (str): LLM原始输出
+        ids (List[int]): 本次请求中的新闻编号
+
+    Returns:
+        Dict[int, float]: {新闻编号: 情感分数}
+    """
+    text = result.strip()
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end == -1:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    valid_ids = set(ids)
+    scores = {}
+    for position, item in enumerate(items):
+        try:
+            if isinstance(item, dict):
+                article_id, score = int(item["id"]), float(item["score"])
+            elif len(items) == len(ids):
+                article_id, score = ids[position], float(item)
+            else:
+                continue
+        except (KeyError, TypeError, ValueError):
+            continue
+        if article_id in valid_ids:
+            scores[article_id] = max(-1.0, min(1.0, score))
+    return scores
+
+
+def _format_article(article_id: int, news: dict) -> str:
+    return (
+        f"【{article_id}】标题：{news['title']}\n"
         f"来源：{news['source']}\n"
         f"时间：{news['publish_time']}\n"
-        f"内容：{news['content']}"
-        for news in news_list[:num_of_news]  # 使用指定数量的新闻
-    ])
+        f"内容：{news['content'][:SENTIMENT_ARTICLE_MAX_CHARS]}"
+    )
+
 
+def chunk_news(news_list: list) -> List[List[Tuple[int, dict]]]:
+    """按条数和字符数把新闻切分为若干块，每块可放入一次LLM调用的上下文"""
+    chunks, current, current_chars = [], [], 0
+    for article_id, news in enumerate(news_list, 1):
+        size = len(_format_article(article_id, news))
+        if current and (len(current) >= SENTIMENT_CHUNK_SIZE or current_chars + size > SENTIMENT_CHUNK_CHARS):
+            chunks.append(current)
+            current, current_chars = [], 0
+        current.append((article_id, news))
+        current_chars += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def score_news_chunk(chunk: List[Tuple[int, dict]]) -> Dict[int, float]:
+    """调用一次LLM，为一块新闻逐条打分"""
+    news_content = "\n\n".join(_format_article(article_id, news) for article_id, news in chunk)
+    ids = [article_id for article_id, _ in chunk]
     user_message = {
         "role": "user",
-        "content": f"请分析以下A股上市公司相关新闻的情感倾向：\n\n{news_content}\n\n 除此之外你也可以自行搜索一些该公司相关新闻进行分析，请直接返回一个数字，范围是-1到1，无需解释。"
+        "content": f"请逐条分析以下{len(chunk)}条A股上市公司相关新闻的情感倾向：\n\n{news_content}\n\n"
+                   f"请直接返回一个JSON数组，每条新闻对应一个元素，格式为{{\"id\": 新闻编号, \"score\": 情感分数}}，"
+                   f"分数范围是-1到1，例如[{{\"id\": {ids[0]}, \"score\": 0.3}}]。不要包含任何解释或代码块标记。"
     }
 
+    # 获取LLM分析结果
+    result = get_chat_completion([SENTIMENT_SYSTEM_MESSAGE, user_message])
+    if result is None:
+        print("Error: PI error occurred, LLM returned None")
+        return {}
+
+    scores = parse_article_scores(result, ids)
+    if len(scores) < len(chunk):
+        print(f"Warning: 仅解析到 {len(scores)}/{len(chunk)} 条新闻的情感分数, raw result: {result}")
+    return scores
+
+
+def score_news_articles(news_list: list) -> List[Optional[float]]:
+    """批量为新闻逐条打分
+
+    新闻按上下文容量分块，各块并行调用LLM，每块返回结构化的逐条分数。
+
+    Args:
+        news_list (list): 待打分的新闻列表
+
+    Returns:
+        List[Optional[float]]: 与输入顺序一致的情感分数，未能打分的新闻为None
+    """
+    chunks = chunk_news(news_list)
+    scores: Dict[int, float] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(SENTIMENT_MAX_WORKERS, len(chunks)))) as executor:
+        futures = [submit_in_context(executor, score_news_chunk, chunk) for chunk in chunks]
+        for future in futures:
+            try:
+                scores.update(future.result())
+            except Exception as e:
+                print(f"Error analyzing news sentiment: {e}")
+    return [scores.get(article_id) for article_id in range(1, len(news_list) + 1)]
+
+
+def _parse_publish_time(value) -> Optional[datetime]:
     try:
-        # 获取LLM分析结果
-        result = get_chat_completion([system_message, user_message])
-        if result is None:
-            print("Error: PI error occurred, LLM returned None")
-            return 0.0
+        return datetime.strptime(str(value), '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
 
-        # 提取数字结果
-        try:
-            sentiment_score = float(result.strip())
-        except ValueError as e:
-            print(f"Error parsing sentiment score: {e}")
-            print(f"Raw result: {result}")
-            return 0.0
 
-        # 确保分数在-1到1之间
-        sentiment_score = max(-1.0, min(1.0, sentiment_score))
+def aggregate_sentiment(articles: list, scores: List[Optional[float]]) -> float:
+    """按时间衰减和来源权重在本地汇总逐条情感分数
+
+    Args:
+        articles (list): 新闻列表
+        scores (List[Optional[float]]): 与新闻一一对应的分数，None表示缺失
+
+    Returns:
+        float: 加权平均情感得分，无可用分数时返回0
+    """
+    times = [_parse_publish_time(news.get('publish_time')) for news in articles]
+    known_times = [t for t in times if t is not None]
+    reference_time = max(known_times) if known_times else None
+
+    weighted_sum, total_weight = 0.0, 0.0
+    for news, publish_time, score in zip(articles, times, scores):
+        if score is None:
+            continue
+        weight = SOURCE_WEIGHTS.get(news.get('source', ''), 1.0)
+        if reference_time is not None and publish_time is not None and SENTIMENT_HALF_LIFE_HOURS > 0:
+            age_hours = (reference_time - publish_time).total_seconds() / 3600
+            weight *= 0.5 ** (age_hours / SENTIMENT_HALF_LIFE_HOURS)
+        weighted_sum += weight * score
+        total_weight += weight
+
+    if total_weight == 0:
+        return 0.0
+    return max(-1.0, min(1.0, weighted_sum / total_weight))
+
 
-        # 缓存结果
-        cache[news_key] = sentiment_score
+def get_news_sentiment(news_list: list, num_of_news: int = 5) -> float:
+    """分析新闻情感得分
+
+    每条新闻的情感分数按内容哈希单独缓存；未见过的新闻先经过本地预打分，
+    只有本地无法确定的新闻才会交给LLM批量打分，整体得分按时间衰减和来源权重在本地汇总。
+
+    Args:
+        news_list (list): 新闻列表
+        num_of_news (int): 用于分析的新闻数量，默认为5条
+
+    Returns:
+        float: 情感得分，范围[-1, 1]，-1最消极，1最积极
+    """
+    if not news_list:
+        return 0.0
+
+    articles = news_list[:num_of_news]  # 使用指定数量的新闻
+    keys = [news_article_key(news) for news in articles]
+
+    # 检查缓存
+    news_cache = get_news_cache()
+    try:
+        scores = news_cache.get_sentiments(keys)
+    except Exception as e:
+        print(f"读取情感分析缓存出错: {e}")
+        scores = {}
+
+    unseen = {key: news for key, news in zip(keys, articles) if key not in scores}
+    print(f"情感分析缓存命中 {len(articles) - len(unseen)}/{len(articles)} 条新闻")
+    record_cache("sentiment", True, len(articles) - len(unseen))
+    record_cache("sentiment", False, len(unseen))
+
+    # 本地预打分：明确的新闻直接在本地给分，只有模糊的新闻交给LLM
+    if unseen:
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, ensure_ascii=False, indent=2)
+            local_scores = dict(zip(unseen.keys(), get_sentiment_prefilter(news_cache).score(list(unseen.values()))))
         except Exception as e:
-            print(f"Error writing cache: {e}")
+            print(f"本地情感预打分出错: {e}")
+            local_scores = {}
+        local_scores = {key: score for key, score in local_scores.items() if score is not None}
+        if local_scores:
+            print(f"本地预打分 {len(local_scores)} 条新闻，{len(unseen) - len(local_scores)} 条交给LLM")
+            count("sentiment_prefilter_scored", len(local_scores))
+            scores.update(local_scores)
+            unseen = {key: news for key, news in unseen.items() if key not in local_scores}
+            try:
+                news_cache.put_sentiments(local_scores, source="local")
+            except Exception as e:
+                print(f"Error writing cache: {e}")
 
-        return sentiment_score
+    if unseen:
+        new_scores = {
+            key: score
+            for key, score in zip(unseen.keys(), score_news_articles(list(unseen.values())))
+            if score is not None
+        }
+        scores.update(new_scores)
+        # 缓存结果，同时保存新闻文本作为本地预打分模型的训练数据
+        if new_scores:
+            try:
+                news_cache.put_sentiments(
+                    new_scores, texts={key: article_text(unseen[key]) for key in new_scores})
+            except Exception as e:
+                print(f"Error writing cache: {e}")
 
-    except Exception as e:
-        print(f"Error analyzing news sentiment: {e}")
-        return 0.0  # 出错时返回中性分数
\ No newline at end of file
+    return aggregate_sentiment(articles, [scores.get(key) for key in keys])
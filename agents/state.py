@@ -3,11 +3,18 @@ from typing import Annotated, Any, Dict, Sequence, TypedDict
 import operator
 from langchain_core.messages import BaseMessage
 import json
+import logging
+import os
 from utils.logging_config import setup_logger
 
 # 设置日志记录
 logger = setup_logger('agent_state')
 
+# 推理过程的日志级别，以及单条推理日志的最大字符数和每个列表/字典保留的最大条目数
+REASONING_LOG_LEVEL = getattr(logging, os.getenv("REASONING_LOG_LEVEL", "INFO").upper(), logging.INFO)
+REASONING_MAX_CHARS = int(os.getenv("REASONING_MAX_CHARS", "4000"))
+REASONING_MAX_ITEMS = int(os.getenv("REASONING_MAX_ITEMS", "50"))
+
 
 def merge_dicts(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
     return {**a, **b}
@@ -34,33 +41,55 @@ def show_workflow_status(agent_name: str, status: str = "processing"):
         logger.info(f"✅ {agent_name} analysis completed")
 
 
-def show_agent_reasoning(output, agent_name):
-    """Display agent's analysis results."""
-    def convert_to_serializable(obj):
-        if hasattr(obj, 'to_dict'):  # Handle Pandas Series/DataFrame
-            return obj.to_dict()
-        elif hasattr(obj, '__dict__'):  # Handle custom objects
-            return obj.__dict__
-        elif isinstance(obj, (int, float, bool, str)):
-            return obj
-        elif isinstance(obj, (list, tuple)):
-            return [convert_to_serializable(item) for item in obj]
-        elif isinstance(obj, dict):
-            return {key: convert_to_serializable(value) for key, value in obj.items()}
-        else:
-            return str(obj)  # Fallback to string representation
-
-    # logger.info(f"{'='*20} {agent_name} Analysis Details {'='*20}")
+def _to_serializable(obj, max_items: int = REASONING_MAX_ITEMS):
+    """转换为可 JSON 序列化的结构，列表、字典、表格和长字符串都按上限截断"""
+    if isinstance(obj, str):
+        return obj if len(obj) <= REASONING_MAX_CHARS else obj[:REASONING_MAX_CHARS] + "..."
+    if isinstance(obj, (int, float, bool)) or obj is None:
+        return obj
+    if hasattr(obj, 'to_dict'):  # Handle Pandas Series/DataFrame
+        if hasattr(obj, 'head') and len(obj) > max_items:
+            obj = obj.head(max_items)
+        return _to_serializable(obj.to_dict(), max_items)
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        result = {str(key): _to_serializable(value, max_items) for key, value in items[:max_items]}
+        if len(items) > max_items:
+            result["..."] = f"共{len(items)}项，已省略{len(items) - max_items}项"
+        return result
+    if isinstance(obj, (list, tuple)):
+        result = [_to_serializable(item, max_items) for item in obj[:max_items]]
+        if len(obj) > max_items:
+            result.append(f"...共{len(obj)}项，已省略{len(obj) - max_items}项")
+        return result
+    if hasattr(obj, '__dict__'):  # Handle custom objects
+        return _to_serializable(vars(obj), max_items)
+    return str(obj)  # Fallback to string representation
 
+
+def format_reasoning(output, max_chars: int = REASONING_MAX_CHARS) -> str:
+    """把 Agent 输出格式化为缩进的 JSON 文本，超过 max_chars 的部分截断"""
     if isinstance(output, (dict, list)):
-        # Convert the output to JSON-serializable format
-        serializable_output = convert_to_serializable(output)
-        logger.info(json.dumps(serializable_output, indent=2, ensure_ascii=False))
+        text = json.dumps(_to_serializable(output), indent=2, ensure_ascii=False)
     else:
         try:
             # Parse the string as JSON and pretty print it
-            parsed_output = json.loads(output)
-            logger.info(json.dumps(parsed_output, indent=2, ensure_ascii=False))
-        except json.JSONDecodeError:
+            text = json.dumps(_to_serializable(json.loads(output)), indent=2, ensure_ascii=False)
+        except (json.JSONDecodeError, TypeError):
             # Fallback to original string if not valid JSON
-            logger.info(output)
+            text = str(output)
+    if len(text) > max_chars:
+        text = text[:max_chars] + f"\n...（共{len(text)}字符，已截断）"
+    return text
+
+
+def show_agent_reasoning(output, agent_name):
+    """Display agent's analysis results.
+
+    日志级别低于 REASONING_LOG_LEVEL 时直接返回，不做任何序列化；否则在调用线程中
+    立即生成截断后的文本快照再写日志。output 通常是之后仍会被修改的状态字典，
+    不能交给日志队列的后台线程延后序列化；截断限制了快照的开销。
+    """
+    if not logger.isEnabledFor(REASONING_LOG_LEVEL):
+        return
+    logger.log(REASONING_LOG_LEVEL, "%s", format_reasoning(output))
@@ -0,0 +1,151 @@
+import math
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.signal_weights import SIGNAL_WEIGHTS
+
+# technical_analyst_agent 组合五个策略信号的权重，来自信号权重配置（python -m backtest.optimizer 生成）
+STRATEGY_WEIGHTS: Dict[str, float] = SIGNAL_WEIGHTS["strategy_weights"]
+
+# weighted_signal_combination 中判定看涨/看跌的阈值
+SIGNAL_THRESHOLD = 0.2
+
+
+def _frame(signal_up, signal_down, confidence_up, confidence_down, index) -> pd.DataFrame:
+    """把看涨/看跌条件和对应置信度组合为 signal（1/0/-1）和 confidence 两列，中立时置信度为0.5"""
+    signal = np.where(signal_up, 1, np.where(signal_down, -1, 0))
+    confidence = np.where(signal_up, confidence_up, np.where(signal_down, confidence_down, 0.5))
+    return pd.DataFrame({"signal": signal, "confidence": confidence}, index=index)
+
+
+def trend_signal_series(prices_df: pd.DataFrame) -> pd.DataFrame:
+    """calculate_trend_signals 在每个交易日的结果"""
+    from agents.technicals import calculate_adx, calculate_ema
+
+    ema_8 = calculate_ema(prices_df, 8)
+    ema_21 = calculate_ema(prices_df, 21)
+    ema_55 = calculate_ema(prices_df, 55)
+    strength = calculate_adx(prices_df[['high', 'low', 'close']].copy(), 14)['adx'] / 100.0
+
+    short_trend = ema_8 > ema_21
+    medium_trend = ema_21 > ema_55
+    return _frame(short_trend & medium_trend, ~short_trend & ~medium_trend, strength, strength, prices_df.index)
+
+
+def mean_reversion_signal_series(prices_df: pd.DataFrame) -> pd.DataFrame:
+    """calculate_mean_reversion_signals 在每个交易日的结果"""
+    from agents.technicals import calculate_bollinger_bands
+
+    close = prices_df['close']
+    z_score = (close - close.rolling(window=50).mean()) / close.rolling(window=50).std()
+    bb_upper, bb_lower = calculate_bollinger_bands(prices_df)
+    price_vs_bb = (close - bb_lower) / (bb_upper - bb_lower)
+
+    confidence = np.minimum(z_score.abs() / 4, 1.0)
+    return _frame((z_score < -2) & (price_vs_bb < 0.2), (z_score > 2) & (price_vs_bb > 0.8),
+                  confidence, confidence, prices_df.index)
+
+
+def momentum_signal_series(prices_df: pd.DataFrame) -> pd.DataFrame:
+    """calculate_momentum_signals 在每个交易日的结果"""
+    returns = prices_df['close'].pct_change()
+    mom_1m = returns.rolling(21, min_periods=5).sum().fillna(0)
+    mom_3m = returns.rolling(63, min_periods=42).sum().fillna(mom_1m)
+    mom_6m = returns.rolling(126, min_periods=63).sum().fillna(mom_3m)
+    volume_momentum = prices_df['volume'] / prices_df['volume'].rolling(21, min_periods=10).mean()
+
+    score = 0.2 * mom_1m + 0.3 * mom_3m + 0.5 * mom_6m
+    volume_confirmation = volume_momentum > 1.0
+    confidence = np.minimum(score.abs() * 5, 1.0)
+    return _frame((score > 0.05) & volume_confirmation, (score < -0.05) & volume_confirmation,
+                  confidence, confidence, prices_df.index)
+
+
+def volatility_signal_series(prices_df: pd.DataFrame) -> pd.DataFrame:
+    """calculate_volatility_signals 在每个交易日的结果"""
+    returns = prices_df['close'].pct_change()
+    hist_vol = returns.rolling(21, min_periods=10).std() * math.sqrt(252)
+    vol_ma = hist_vol.rolling(42, min_periods=21).mean()
+    vol_std = hist_vol.rolling(42, min_periods=21).std()
+    # 与原函数相同，缺失时视为正常区间、位于均值
+    vol_regime = (hist_vol / vol_ma).fillna(1.0)
+    vol_z = ((hist_vol - vol_ma) / vol_std.replace(0, np.nan)).fillna(0.0)
+
+    confidence = np.minimum(vol_z.abs() / 3, 1.0)
+    return _frame((vol_regime < 0.8) & (vol_z < -1), (vol_regime > 1.2) & (vol_z > 1),
+                  confidence, confidence, prices_df.index)
+
+
+def expanding_hurst(close: pd.Series, max_lag: int = 10) -> pd.Series:
+    """calculate_hurst_exponent 在每个交易日（使用截至当日的全部价格）的结果
+
+    原函数中 returns[lag:] 与 returns[:-lag] 是两个 Series，相减时按索引对齐，
+    重叠部分差值恒为0，拟合斜率为0，因此有效收益率达到 2 × max_lag 个后结果恒为0，之前为0.5。
+    这里直接复现该结果，保证回测与 technical_analyst_agent 的实际输出一致。
+    """
+    valid = np.log(close / close.shift(1)).notna().cumsum()
+    return pd.Series(np.where(valid >= max_lag * 2, 0.0, 0.5), index=close.index)
+
+
+def stat_arb_signal_series(prices_df: pd.DataFrame) -> pd.DataFrame:
+    """calculate_stat_arb_signals 在每个交易日的结果"""
+    returns = prices_df['close'].pct_change()
+    skew = returns.rolling(42, min_periods=21).skew().fillna(0.0)
+    hurst = expanding_hurst(prices_df['close'], max_lag=10)
+
+    confidence = (0.5 - hurst) * 2
+    return _frame((hurst < 0.4) & (skew > 1), (hurst < 0.4) & (skew < -1), confidence, confidence, prices_df.index)
+
+
+STRATEGY_SERIES = {
+    'trend': trend_signal_series,
+    'mean_reversion': mean_reversion_signal_series,
+    'momentum': momentum_signal_series,
+    'volatility': volatility_signal_series,
+    'stat_arb': stat_arb_signal_series,
+}
+
+
+def strategy_signal_series(prices_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """一次性计算五个策略在全部交易日的信号
+
+    每个策略只做一遍滚动/指数加权运算，第 t 行等于把截至第 t 天的价格传给对应
+    calculate_*_signals 函数得到的 signal 和 confidence（signal 用 1/0/-1 表示看涨/中立/看跌）。
+
+    Args:
+        prices_df: 包含 open/high/low/close/volume 列、按日期升序的日线
+
+    Returns:
+        {策略名: DataFrame[signal, confidence]}
+    """
+    return {name: func(prices_df) for name, func in STRATEGY_SERIES.items()}
+
+
+def combine_signal_series(
+    series: Mapping[str, pd.DataFrame],
+    weights: Optional[Mapping[str, float]] = None,
+) -> pd.DataFrame:
+    """weighted_signal_combination 的向量化版本，对全部交易日一次性组合
+
+    Returns:
+        DataFrame[score, signal, confidence]：score 为置信度加权后的得分（-1~1），
+        signal 为 1/0/-1，confidence 为 |score|
+    """
+    weights = weights or STRATEGY_WEIGHTS
+    names = [name for name in series if weights.get(name, 0)]
+    signal = np.column_stack([series[name]["signal"].to_numpy(dtype=float) for name in names])
+    confidence = np.column_stack([series[name]["confidence"].to_numpy(dtype=float) for name in names])
+    w = np.array([weights[name] for name in names], dtype=float)
+
+    weighted_sum = (signal * confidence) @ w
+    total_confidence = confidence @ w
+    with np.errstate(invalid="ignore", divide="ignore"):
+        score = np.where(total_confidence > 0, weighted_sum / total_confidence, 0.0)
+    index = next(iter(series.values())).index
+    return pd.DataFrame({
+        "score": score,
+        "signal": np.where(score > SIGNAL_THRESHOLD, 1, np.where(score < -SIGNAL_THRESHOLD, -1, 0)),
+        "confidence": np.abs(score),
+    }, index=index)
@@ -4,6 +4,7 @@ from typing import Dict
 from langchain_core.messages import HumanMessage
 
 from agents.state import AgentState, show_agent_reasoning, show_workflow_status
+from agents.technical_signals import STRATEGY_WEIGHTS
 
 import json
 import pandas as pd
@@ -156,13 +157,7 @@ def technical_analyst_agent(state: AgentState):
     stat_arb_signals = calculate_stat_arb_signals(prices_df)
 
     # Combine all signals using a weighted ensemble approach
-    strategy_weights = {
-        'trend': 0.30,
-        'mean_reversion': 0.25,  # Increased weight for mean reversion
-        'momentum': 0.25,
-        'volatility': 0.15,
-        'stat_arb': 0.05
-    }
+    strategy_weights = STRATEGY_WEIGHTS
 
     combined_signal = weighted_signal_combination({
         'trend': trend_signals,
@@ -1,7 +1,15 @@
 from langchain_core.messages import HumanMessage
+from agents.screening import FUNDAMENTAL_SCREENING, METRIC_NAMES, get_screening_engine
 from agents.state import AgentState, show_agent_reasoning, show_workflow_status
+from agents.valuation_engine import VALUATION_MONTE_CARLO, monte_carlo_valuation, owner_earnings, sensitivity_analysis
+from utils.logging_config import setup_logger
 import json
 
+logger = setup_logger('valuation_agent')
+
+# 与全市场比较的估值比率
+PEER_VALUATION_RATIOS = ("pe_ratio", "price_to_book", "price_to_sales")
+
 
 def valuation_agent(state: AgentState):
     """Responsible for valuation analysis"""
@@ -45,6 +53,19 @@ def valuation_agent(state: AgentState):
     owner_earnings_gap = (owner_earnings_value - market_cap) / market_cap
     valuation_gap = (dcf_gap + owner_earnings_gap) / 2
 
+    # 在增长率 × 折现率 × 永续增长率网格上做情景分析，给出估值差距的分位数区间
+    sensitivity = sensitivity_analysis(
+        free_cash_flow=current_financial_line_item.get('free_cash_flow'),
+        owner_earnings=owner_earnings(
+            current_financial_line_item.get('net_income'),
+            current_financial_line_item.get('depreciation_and_amortization'),
+            current_financial_line_item.get('capital_expenditure'),
+            working_capital_change,
+        ),
+        market_cap=market_cap,
+        growth_rate=metrics["earnings_growth"],
+    )
+
     if valuation_gap > 0.10:  # Changed from 0.15 to 0.10 (10% undervalued)
         signal = '看涨'
     elif valuation_gap < -0.20:  # Changed from -0.15 to -0.20 (20% overvalued)
@@ -62,6 +83,45 @@ def valuation_agent(state: AgentState):
         "reasoning": f"Owner Earnings Value: ${owner_earnings_value:,.2f}, 市值: ${market_cap:,.2f}, Gap: {owner_earnings_gap:.1%}"
     }
 
+    bands = sensitivity["gap_percentiles"]
+    if bands:
+        reasoning["sensitivity_analysis"] = {
+            "signal": "看涨" if bands["p25"] > 0.10 else "看跌" if bands["p75"] < -0.20 else "中立",
+            "reasoning": f"{sensitivity['points']}个情景的估值差距: P5 {bands['p5']:.1%}, P25 {bands['p25']:.1%}, "
+                         f"中位数 {bands['p50']:.1%}, P75 {bands['p75']:.1%}, P95 {bands['p95']:.1%}; "
+                         f"低估超过10%的情景占比 {sensitivity['share_undervalued']:.0%}"
+        }
+
+    monte_carlo = None
+    if VALUATION_MONTE_CARLO and market_cap:
+        # 按历史财务数据推导的分布抽样，估计内在价值高于市值的概率
+        monte_carlo = monte_carlo_valuation(data["financial_metrics"], data["financial_line_items"], market_cap)
+        probability = monte_carlo["probability_undervalued"]
+        reasoning["monte_carlo_analysis"] = {
+            "signal": "看涨" if probability > 0.6 else "看跌" if probability < 0.3 else "中立",
+            "reasoning": f"{monte_carlo['paths']}条路径中内在价值高于市值的概率: {probability:.1%}, "
+                         f"估值差距中位数 {monte_carlo['gap_percentiles']['p50']:.1%} "
+                         f"(P5 {monte_carlo['gap_percentiles']['p5']:.1%}, P95 {monte_carlo['gap_percentiles']['p95']:.1%})"
+        }
+
+    # 估值比率在全市场中的相对位置，不参与信号判断，为绝对估值结论提供参照
+    if FUNDAMENTAL_SCREENING:
+        try:
+            peers = get_screening_engine(wait=False).peer_context(data["ticker"], metrics)
+            ratios = {column: peers["percentiles"][column]
+                      for column in PEER_VALUATION_RATIOS if column in peers["percentiles"]}
+            if ratios:
+                average = sum(ratios.values()) / len(ratios)
+                reasoning["peer_valuation"] = {
+                    "signal": "看涨" if average >= 0.75 else "看跌" if average <= 0.25 else "中立",
+                    "reasoning": f"全市场{peers['universe_size']}只股票中（百分位越高估值越便宜）: " + "，".join(
+                        f"{METRIC_NAMES[column]}: {peers['labels'][column]}（百分位 {pct:.0%}）"
+                        for column, pct in ratios.items()
+                    )
+                }
+        except Exception as e:
+            logger.warning(f"估值比率的全市场比较失败: {e}")
+
     message_content = {
         "signal": signal,
         "confidence": f"{abs(valuation_gap):.0%}",
@@ -81,7 +141,9 @@ def valuation_agent(state: AgentState):
         "messages": [message],
         "data": {
             **data,
-            "valuation_analysis": message_content
+            "valuation_analysis": message_content,
+            "valuation_sensitivity": sensitivity,
+            "valuation_monte_carlo": monte_carlo
         }
     }
 
@@ -0,0 +1,369 @@
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# 敏感性分析网格：增长率围绕基准值上下浮动的范围，以及各轴的取值个数
+VALUATION_GRID_STEPS = int(os.getenv("VALUATION_GRID_STEPS", "21"))
+VALUATION_GROWTH_SPREAD = float(os.getenv("VALUATION_GROWTH_SPREAD", "0.10"))
+VALUATION_DISCOUNT_RANGE = (float(os.getenv("VALUATION_DISCOUNT_MIN", "0.06")),
+                            float(os.getenv("VALUATION_DISCOUNT_MAX", "0.16")))
+VALUATION_TERMINAL_RANGE = (float(os.getenv("VALUATION_TERMINAL_MIN", "0.01")),
+                            float(os.getenv("VALUATION_TERMINAL_MAX", "0.04")))
+VALUATION_TERMINAL_STEPS = int(os.getenv("VALUATION_TERMINAL_STEPS", "7"))
+# 所有者收益法的要求回报率相对DCF折现率的溢价（与 valuation_agent 中 15% 对 10% 一致）
+REQUIRED_RETURN_SPREAD = 0.05
+GAP_PERCENTILES = (5, 25, 50, 75, 95)
+
+# 蒙特卡洛估值：是否在 valuation_agent 中启用、路径数、每批路径数、CPU时间预算（秒）和进程数
+VALUATION_MONTE_CARLO = os.getenv("VALUATION_MONTE_CARLO", "1") == "1"
+VALUATION_MC_PATHS = int(os.getenv("VALUATION_MC_PATHS", "100000"))
+VALUATION_MC_BATCH = int(os.getenv("VALUATION_MC_BATCH", "25000"))
+VALUATION_MC_CPU_BUDGET = float(os.getenv("VALUATION_MC_CPU_BUDGET", "0.5"))
+VALUATION_MC_WORKERS = int(os.getenv("VALUATION_MC_WORKERS", "1"))
+
+
+def owner_earnings(net_income, depreciation, capex, working_capital_change) -> float:
+    """所有者收益 = 净利润 + 折旧摊销 - 资本支出 - 营运资金变化，数据缺失时返回0"""
+    items = [net_income, depreciation, capex, working_capital_change]
+    if not all(isinstance(x, (int, float)) for x in items):
+        return 0
+    return net_income + depreciation - capex - working_capital_change
+
+
+def _grid(growth_rates, discount_rates, terminal_growth_rates):
+    """把三个轴展开为可广播的 (G, D, T) 数组
+
+    terminal_growth_rates 为 None 时沿用标量函数的规则：取增长率的40%与3%的较小值。
+    """
+    g = np.clip(np.asarray(growth_rates, dtype=float), 0, 0.25)[:, None, None]
+    r = np.asarray(discount_rates, dtype=float)[None, :, None]
+    if terminal_growth_rates is None:
+        tg = np.minimum(g * 0.4, 0.03)
+    else:
+        tg = np.asarray(terminal_growth_rates, dtype=float)[None, None, :]
+    return np.broadcast_arrays(g, r, tg)
+
+
+def dcf_grid(
+    free_cash_flow: float,
+    growth_rates: Sequence[float],
+    discount_rates: Sequence[float],
+    terminal_growth_rates: Optional[Sequence[float]] = None,
+    num_years: int = 5,
+) -> np.ndarray:
+    """在增长率 × 折现率 × 永续增长率网格上一次性计算DCF内在价值
+
+    与 calculate_intrinsic_value 的计算方式相同，网格上每个点的结果等于用该点参数调用标量函数的结果。
+
+    Returns:
+        np.ndarray: 形状为 (增长率数, 折现率数, 永续增长率数) 的估值；折现率不高于永续增长率的点为 nan
+    """
+    g, r, tg = _grid(growth_rates, discount_rates, terminal_growth_rates)
+    if not isinstance(free_cash_flow, (int, float)) or free_cash_flow <= 0:
+        return np.zeros(g.shape)
+
+    years = np.arange(1, num_years + 1)
+    growth = (1 + g[..., None]) ** years
+    present_values = (free_cash_flow * growth / (1 + r[..., None]) ** years).sum(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terminal_value = free_cash_flow * growth[..., -1] * (1 + tg) / (r - tg)
+        terminal_present_value = terminal_value / (1 + r) ** num_years
+        values = np.where(r > tg, np.maximum(present_values + terminal_present_value, 0), np.nan)
+    return values
+
+
+def owner_earnings_grid(
+    owner_earnings: float,
+    growth_rates: Sequence[float],
+    required_returns: Sequence[float],
+    terminal_growth_rates: Optional[Sequence[float]] = None,
+    margin_of_safety: float = 0.25,
+    num_years: int = 5,
+) -> np.ndarray:
+    """在增长率 × 要求回报率 × 永续增长率网格上一次性计算所有者收益法估值
+
+    与 calculate_owner_earnings_value 的计算方式相同（逐年递减的增长率、安全边际）。
+
+    Args:
+        owner_earnings: 净利润 + 折旧摊销 - 资本支出 - 营运资金变化
+
+    Returns:
+        np.ndarray: 形状为 (增长率数, 回报率数, 永续增长率数) 的估值；回报率不高于永续增长率的点为 nan
+    """
+    g, r, tg = _grid(growth_rates, required_returns, terminal_growth_rates)
+    if not isinstance(owner_earnings, (int, float)) or owner_earnings <= 0:
+        return np.zeros(g.shape)
+
+    years = np.arange(1, num_years + 1)
+    year_growth = g[..., None] * (1 - years / (2 * num_years))
+    discounted = owner_earnings * (1 + year_growth) ** years / (1 + r[..., None]) ** years
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terminal_value = discounted[..., -1] * (1 + tg) / (r - tg)
+        terminal_value_discounted = terminal_value / (1 + r) ** num_years
+        intrinsic_value = (discounted.sum(axis=-1) + terminal_value_discounted) * (1 - margin_of_safety)
+        values = np.where(r > tg, np.maximum(intrinsic_value, 0), np.nan)
+    return values
+
+
+def default_axes(growth_rate: float) -> Dict[str, np.ndarray]:
+    """以当前增长率为中心生成默认的敏感性分析网格"""
+    center = min(max(growth_rate or 0, 0), 0.25)
+    return {
+        "growth_rates": np.linspace(max(center - VALUATION_GROWTH_SPREAD, 0),
+                                    min(center + VALUATION_GROWTH_SPREAD, 0.25), VALUATION_GRID_STEPS),
+        "discount_rates": np.linspace(*VALUATION_DISCOUNT_RANGE, VALUATION_GRID_STEPS),
+        "terminal_growth_rates": np.linspace(*VALUATION_TERMINAL_RANGE, VALUATION_TERMINAL_STEPS),
+    }
+
+
+def gap_percentiles(gaps: np.ndarray, percentiles: Iterable[float] = GAP_PERCENTILES) -> Dict[str, float]:
+    """估值差距的分位数，忽略无效的网格点"""
+    valid = gaps[np.isfinite(gaps)]
+    if valid.size == 0:
+        return {}
+    return {f"p{int(p)}": round(float(v), 4) for p, v in zip(percentiles, np.percentile(valid, list(percentiles)))}
+
+
+def valuation_surface(
+    free_cash_flow: float,
+    owner_earnings: float,
+    market_cap: float,
+    growth_rates: Sequence[float],
+    discount_rates: Sequence[float],
+    terminal_growth_rates: Optional[Sequence[float]] = None,
+    required_return_spread: float = REQUIRED_RETURN_SPREAD,
+    margin_of_safety: float = 0.25,
+    num_years: int = 5,
+) -> Dict[str, np.ndarray]:
+    """计算两种方法在整个网格上的估值和相对市值的综合估值差距
+
+    所有者收益法的要求回报率取 折现率 + required_return_spread，
+    综合差距与 valuation_agent 相同，为两种方法差距的平均值。
+
+    Returns:
+        dict: dcf_value、owner_earnings_value、dcf_gap、owner_earnings_gap、gap，形状均为 (G, D, T)
+    """
+    discount_rates = np.asarray(discount_rates, dtype=float)
+    dcf_value = dcf_grid(free_cash_flow, growth_rates, discount_rates, terminal_growth_rates, num_years)
+    owner_value = owner_earnings_grid(owner_earnings, growth_rates, discount_rates + required_return_spread,
+                                      terminal_growth_rates, margin_of_safety, num_years)
+    if not market_cap:
+        nan = np.full(dcf_value.shape, np.nan)
+        return {"dcf_value": dcf_value, "owner_earnings_value": owner_value,
+                "dcf_gap": nan, "owner_earnings_gap": nan, "gap": nan}
+    dcf_gap = (dcf_value - market_cap) / market_cap
+    owner_gap = (owner_value - market_cap) / market_cap
+    return {
+        "dcf_value": dcf_value,
+        "owner_earnings_value": owner_value,
+        "dcf_gap": dcf_gap,
+        "owner_earnings_gap": owner_gap,
+        "gap": (dcf_gap + owner_gap) / 2,
+    }
+
+
+def sensitivity_analysis(
+    free_cash_flow: float,
+    owner_earnings: float,
+    market_cap: float,
+    growth_rate: float,
+    axes: Optional[Dict[str, Sequence[float]]] = None,
+    undervalued_threshold: float = 0.10,
+) -> Dict[str, object]:
+    """对当前公司做估值情景分析
+
+    Returns:
+        dict:
+            axes: 各轴取值
+            gap_percentiles: 全部网格点上综合估值差距的分位数
+            dcf_gap_percentiles / owner_earnings_gap_percentiles: 两种方法各自的分位数
+            share_undervalued: 综合差距超过 undervalued_threshold 的网格点占比
+            surface: 增长率 × 折现率 的综合差距（永续增长率取中位数），便于绘制热力图
+    """
+    axes = axes or default_axes(growth_rate)
+    surface = valuation_surface(free_cash_flow, owner_earnings, market_cap, **axes)
+    gap = surface["gap"]
+    valid = np.isfinite(gap)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # 整行无效时 nanmedian 会告警，结果为 nan
+        gap_2d = np.nanmedian(gap, axis=2)
+    return {
+        "axes": {name: np.round(np.asarray(values, dtype=float), 4).tolist() for name, values in axes.items()},
+        "points": int(gap.size),
+        "gap_percentiles": gap_percentiles(gap),
+        "dcf_gap_percentiles": gap_percentiles(surface["dcf_gap"]),
+        "owner_earnings_gap_percentiles": gap_percentiles(surface["owner_earnings_gap"]),
+        "share_undervalued": round(float((gap[valid] > undervalued_threshold).mean()), 4) if valid.any() else 0.0,
+        "surface": [[round(float(v), 4) if np.isfinite(v) else None for v in row] for row in gap_2d],
+    }
+
+
+def _number(value) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and np.isfinite(value) else None
+
+
+def monte_carlo_inputs(financial_metrics: List[Dict[str, Any]],
+                       financial_line_items: List[Dict[str, Any]]) -> Dict[str, float]:
+    """根据历史财务数据推导蒙特卡洛抽样分布的参数
+
+    - 增长率：以净利润增长率、营收增长率和两期营收实际增长的均值为中心，三者的离散程度作为标准差
+    - 自由现金流率：两期 自由现金流/营收 的均值为中心，两期差异作为标准差
+    - 折现率、永续增长率：以 valuation_agent 使用的 10%、3% 为中心
+    两期数据缺失时退化为以当期自由现金流为基数、利润率因子为1。
+    """
+    metrics = (financial_metrics or [{}])[0] or {}
+    current = (financial_line_items or [{}])[0] or {}
+    previous = financial_line_items[1] if financial_line_items and len(financial_line_items) > 1 else {}
+
+    revenue = _number(current.get("operating_revenue"))
+    previous_revenue = _number(previous.get("operating_revenue"))
+    growth_estimates = [g for g in (_number(metrics.get("earnings_growth")), _number(metrics.get("revenue_growth")))
+                        if g is not None]
+    if revenue and previous_revenue and previous_revenue > 0:
+        growth_estimates.append(revenue / previous_revenue - 1)
+    growth_estimates = [min(max(g, -0.5), 0.5) for g in growth_estimates] or [0.05]
+
+    margins = []
+    for item in (current, previous):
+        fcf, item_revenue = _number(item.get("free_cash_flow")), _number(item.get("operating_revenue"))
+        if fcf is not None and item_revenue and item_revenue > 0:
+            margins.append(fcf / item_revenue)
+
+    if revenue and revenue > 0 and margins:
+        base, margin_mean = revenue, float(np.mean(margins))
+        margin_std = max(float(np.std(margins)), abs(margin_mean) * 0.1, 0.01)
+    else:
+        base, margin_mean = _number(current.get("free_cash_flow")) or 0.0, 1.0
+        margin_std = 0.1
+
+    return {
+        "base": base,
+        "growth_mean": float(np.mean(growth_estimates)),
+        "growth_std": max(float(np.std(growth_estimates)), 0.03),
+        "margin_mean": margin_mean,
+        "margin_std": margin_std,
+        "discount_mean": 0.10,
+        "discount_std": 0.015,
+        "terminal_low": 0.01,
+        "terminal_high": 0.03,
+    }
+
+
+def _simulate_batch(inputs: Dict[str, float], paths: int, seed, num_years: int = 5):
+    """模拟一批路径，返回 (内在价值数组, 本批消耗的CPU秒数)；在子进程中执行时也使用此函数"""
+    started = time.process_time()
+    rng = np.random.default_rng(seed)
+    growth = np.clip(rng.normal(inputs["growth_mean"], inputs["growth_std"], paths), -0.5, 0.5)
+    margin = rng.normal(inputs["margin_mean"], inputs["margin_std"], paths)
+    terminal = rng.uniform(inputs["terminal_low"], inputs["terminal_high"], paths)
+    # 折现率至少比永续增长率高1个百分点，避免永续价值发散
+    discount = np.maximum(rng.normal(inputs["discount_mean"], inputs["discount_std"], paths), terminal + 0.01)
+
+    years = np.arange(1, num_years + 1)
+    cash_flows = inputs["base"] * margin[:, None] * (1 + growth[:, None]) ** years
+    present_value = (cash_flows / (1 + discount[:, None]) ** years).sum(axis=1)
+    terminal_value = cash_flows[:, -1] * (1 + terminal) / (discount - terminal) / (1 + discount) ** num_years
+    values = np.maximum(present_value + terminal_value, 0).astype(np.float32)
+    return values, time.process_time() - started
+
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """返回进程内共享的进程池；使用 spawn 启动，避免在多线程的服务进程中 fork"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+
+def monte_carlo_valuation(
+    financial_metrics: List[Dict[str, Any]],
+    financial_line_items: List[Dict[str, Any]],
+    market_cap: float,
+    paths: int = VALUATION_MC_PATHS,
+    batch_size: int = VALUATION_MC_BATCH,
+    cpu_budget: float = VALUATION_MC_CPU_BUDGET,
+    workers: int = VALUATION_MC_WORKERS,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """蒙特卡洛估值：对增长率、自由现金流率、折现率和永续增长率抽样，分批计算DCF内在价值
+
+    每批路径是一次数组运算。累计消耗的CPU时间（含子进程）超过 cpu_budget 后不再启动新批次，
+    已完成的路径仍参与统计，结果中 truncated 标记是否因预算提前结束。
+
+    Args:
+        paths: 目标路径数
+        batch_size: 每批路径数
+        cpu_budget: CPU时间预算（秒），至少会完成一批
+        workers: 大于1时在进程池中并行计算各批
+        seed: 随机种子，相同的种子和批次划分得到相同的结果
+
+    Returns:
+        dict: probability_undervalued（内在价值高于市值的概率）、value_percentiles、gap_percentiles、
+              paths、truncated、cpu_seconds、wall_seconds、inputs
+    """
+    inputs = monte_carlo_inputs(financial_metrics, financial_line_items)
+    num_batches = max(1, -(-paths // batch_size))
+    seeds = np.random.SeedSequence(seed).spawn(num_batches)
+    sizes = [min(batch_size, paths - i * batch_size) for i in range(num_batches)]
+
+    started = time.perf_counter()
+    batches, cpu_seconds = [], 0.0
+    if workers <= 1:
+        for size, batch_seed in zip(sizes, seeds):
+            values, cpu = _simulate_batch(inputs, size, batch_seed)
+            batches.append(values)
+            cpu_seconds += cpu
+            if cpu_seconds >= cpu_budget:
+                break
+    else:
+        executor = _get_executor(workers)
+        pending, next_batch = set(), 0
+        while next_batch < num_batches or pending:
+            # 同时在途的批次不超过进程数，预算用完后只等待已提交的批次
+            while next_batch < num_batches and len(pending) < workers and cpu_seconds < cpu_budget:
+                pending.add(executor.submit(_simulate_batch, inputs, sizes[next_batch], seeds[next_batch]))
+                next_batch += 1
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                values, cpu = future.result()
+                batches.append(values)
+                cpu_seconds += cpu
+
+    values = np.concatenate(batches)
+    result = {
+        "paths": int(values.size),
+        "requested_paths": paths,
+        "truncated": int(values.size) < paths,
+        "cpu_seconds": round(cpu_seconds, 4),
+        "wall_seconds": round(time.perf_counter() - started, 4),
+        "workers": max(workers, 1),
+        "inputs": {k: round(v, 4) for k, v in inputs.items()},
+        "value_percentiles": {k: round(v, 2) for k, v in gap_percentiles(values.astype(float)).items()},
+    }
+    if market_cap:
+        gaps = (values.astype(float) - market_cap) / market_cap
+        result.update({
+            "probability_undervalued": round(float((values > market_cap).mean()), 4),
+            "mean_gap": round(float(gaps.mean()), 4),
+            "gap_percentiles": gap_percentiles(gaps),
+        })
+    return result
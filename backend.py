@@ -1,20 +1,36 @@
 from langchain_core.messages import HumanMessage
 
+from agents.portfolio_risk import load_portfolio, parse_portfolio
 from workflow import app
-from flask import Flask, request, jsonify
+from utils.metrics import metrics, track_run
+from utils import replay
+from utils.tracing import memory_exporter, start_trace, trace_summary
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import re
-import datetime
 
 # Create Flask app
 flask_app = Flask(__name__)
 CORS(flask_app)  # Enable CORS for all routes
 
+
+def infer_market(ticker: str) -> str:
+    """Exchange prefix used by akshare for a 6-digit A-share ticker"""
+    if ticker.startswith(("6", "9")):
+        return "sh"
+    if ticker.startswith(("4", "8")):
+        return "bj"
+    return "sz"
+
 @flask_app.route('/analyze', methods=['POST'])
 def analyze_stock():
     """
     Analyze a stock using the 6-digit ticker symbol
     Expected JSON payload: {"ticker": "000001"}
+
+    Optional "portfolio": {"cash": 100000, "positions": {"600519": 100, ...}} enables
+    portfolio-level risk (shrinkage covariance, component VaR, VaR-budgeted position limits).
+    Without it the book in PORTFOLIO_FILE is used if that file exists.
     """
     try:
         # Get JSON data from request
@@ -34,6 +50,15 @@ def analyze_stock():
                 'error': 'Invalid ticker format',
                 'message': 'Ticker must be exactly 6 digits (e.g., "000001")'
             }), 400
+        market = data.get('market') or infer_market(ticker)
+
+        try:
+            portfolio = parse_portfolio(data['portfolio']) if data.get('portfolio') else load_portfolio()
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid portfolio',
+                'message': str(e)
+            }), 400
         
         # Prepare initial state for the workflow
         initial_state = {
@@ -41,9 +66,11 @@ def analyze_stock():
                 HumanMessage(content=f"Please analyze stock with ticker {ticker}")
             ],
             "data": {
+                "market": market,
                 "ticker": ticker,
                 "start_date": None,  # Will be calculated in market_data_agent
                 "end_date": None,    # Will be calculated in market_data_agent
+                "portfolio": portfolio,
             },
             "metadata": {
                 "show_reasoning": True
@@ -52,7 +79,8 @@ def analyze_stock():
         
         # Run the workflow
         print(f"Starting analysis for ticker: {ticker}")
-        result = app.invoke(initial_state)
+        with track_run() as run_report, start_trace("workflow.run", ticker=ticker) as trace_root:
+            result = app.invoke(initial_state)
         
         # Extract the final result from the workflow
         final_data = result.get("data", {})
@@ -70,7 +98,9 @@ def analyze_stock():
                 "start_date": final_data.get("start_date"),
                 "end_date": final_data.get("end_date"),
             },
-            "messages": [msg.content for msg in final_messages if hasattr(msg, 'content')]
+            "messages": [msg.content for msg in final_messages if hasattr(msg, 'content')],
+            "timing": run_report.summary(),
+            "trace": trace_summary(trace_root.trace_id),
         }
         
         return jsonify(response_data), 200
@@ -87,12 +117,13 @@ def get_analyze_stock():
     """
     Analyze a stock using the 6-digit ticker symbol passed as a URL parameter,
     e.g. /analyze?ticker=000001
+
+    The book in PORTFOLIO_FILE, if present, is used for portfolio-level risk.
     """
     try:
-        market = request.args.get('ticker', None)
         ticker = request.args.get('ticker', None)
         start_date = None
-        end_date = datetime.now().strftime("%Y%m%d")
+        end_date = replay.now().strftime("%Y-%m-%d")
         if not ticker:
             return jsonify({
                 'error': 'Missing ticker parameter',
@@ -104,6 +135,15 @@ def get_analyze_stock():
                 'error': 'Invalid ticker format',
                 'message': 'Ticker must be exactly 6 digits (e.g., "000001")'
             }), 400
+        market = request.args.get('market') or infer_market(ticker)
+
+        try:
+            portfolio = load_portfolio()
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid portfolio',
+                'message': str(e)
+            }), 400
         
         # Prepare initial state for the workflow
         initial_state = {
@@ -115,6 +155,7 @@ def get_analyze_stock():
                 "ticker": ticker,
                 "start_date": start_date,  # Will be set later
                 "end_date": end_date,    # Will be set later
+                "portfolio": portfolio,
             },
             "metadata": {
                 "show_reasoning": True
@@ -122,7 +163,8 @@ def get_analyze_stock():
         }
         
         print(f"Starting analysis for ticker: {ticker}")
-        result = app.invoke(initial_state)
+        with track_run() as run_report, start_trace("workflow.run", ticker=ticker) as trace_root:
+            result = app.invoke(initial_state)
         
         final_data = result.get("data", {})
         final_messages = result.get("messages", [])
@@ -138,7 +180,9 @@ def get_analyze_stock():
                 "start_date": final_data.get("start_date"),
                 "end_date": final_data.get("end_date"),
             },
-            "messages": [msg.content for msg in final_messages if hasattr(msg, 'content')]
+            "messages": [msg.content for msg in final_messages if hasattr(msg, 'content')],
+            "timing": run_report.summary(),
+            "trace": trace_summary(trace_root.trace_id),
         }
         
         return jsonify(response_data), 200
@@ -158,6 +202,30 @@ def health_check():
         'message': 'Stock analysis API is running'
     }), 200
 
+@flask_app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Process-wide metrics: node/upstream latency, LLM usage, retries and cache hit rates
+
+    Returns JSON by default, or Prometheus text format with ?format=prometheus
+    """
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics.snapshot()), 200
+
+@flask_app.route('/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """Spans of a recent run in OTLP/JSON format, with its critical path"""
+    spans = memory_exporter.get_trace(trace_id)
+    if not spans:
+        return jsonify({
+            'error': 'Trace not found',
+            'message': f'No spans recorded for trace {trace_id}'
+        }), 404
+    return jsonify({
+        'summary': trace_summary(trace_id, spans),
+        'spans': [span.to_otlp() for span in spans],
+    }), 200
+
 @flask_app.route('/', methods=['GET'])
 def root():
     """Root endpoint with API information"""
@@ -166,6 +234,8 @@ def root():
         'endpoints': {
             'POST /analyze': 'Analyze a stock using 6-digit ticker',
             'GET /health': 'Health check',
+            'GET /metrics': 'Process metrics (JSON, or ?format=prometheus)',
+            'GET /traces/<trace_id>': 'Spans and critical path of a recent run',
             'GET /': 'This information'
         },
         'usage': {
@@ -0,0 +1,7 @@
+"""technical_analyst_agent 策略信号的回测与权重优化
+
+用法见 backtest/run.py 和 backtest/optimizer.py：
+    python -m backtest.run --tickers 000001,600310 --years 5
+    python -m backtest.run --universe 300 --years 5 --workers 8 --output backtest.csv
+    python -m backtest.optimizer --universe 300 --years 6 --workers 8
+"""
@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from agents.technical_signals import STRATEGY_WEIGHTS, combine_signal_series, strategy_signal_series
+from utils.logging_config import setup_logger
+
+logger = setup_logger('backtest')
+
+# 计算命中率的持有期（交易日）
+BACKTEST_HORIZONS = tuple(int(x) for x in os.getenv("BACKTEST_HORIZONS", "1,5,20").split(","))
+# 单边交易成本（按换手的仓位比例计）
+BACKTEST_COST = float(os.getenv("BACKTEST_COST", "0.001"))
+# 指标预热期：前若干个交易日的信号不参与统计
+BACKTEST_WARMUP = int(os.getenv("BACKTEST_WARMUP", "126"))
+# 只做多（A股融券受限，看跌信号视为空仓）
+BACKTEST_LONG_ONLY = os.getenv("BACKTEST_LONG_ONLY", "1") == "1"
+# 进程数和每个任务包含的股票数
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+BACKTEST_CHUNK = int(os.getenv("BACKTEST_CHUNK", "16"))
+TRADING_DAYS = 252
+
+
+def evaluate_signals(
+    signals: np.ndarray,
+    close: np.ndarray,
+    horizons: Sequence[int] = BACKTEST_HORIZONS,
+    cost: float = BACKTEST_COST,
+    long_only: bool = BACKTEST_LONG_ONLY,
+    warmup: int = BACKTEST_WARMUP,
+) -> Dict[str, np.ndarray]:
+    """同时评估多列信号（每列一个策略）
+
+    第 t 天收盘产生信号、按收盘价调仓，持有到 t+1 天收盘。
+    命中率：非中立信号中，之后 h 个交易日收益率方向与信号一致的比例（看跌信号也参与统计）。
+    收益：仓位 × 次日收益率 - 成本 × |仓位变化|；long_only 时看跌信号的仓位为0。
+
+    Args:
+        signals: (T, S) 的信号矩阵，取值 1/0/-1
+        close: (T,) 的收盘价
+
+    Returns:
+        {指标名: (S,) 数组}
+    """
+    signals = np.asarray(signals, dtype=float)[warmup:]
+    close = np.asarray(close, dtype=float)[warmup:]
+    n_days, n_strategies = signals.shape
+    result: Dict[str, np.ndarray] = {
+        "days": np.full(n_strategies, n_days),
+        "signals": (signals != 0).sum(axis=0),
+        "bullish": (signals > 0).sum(axis=0),
+        "bearish": (signals < 0).sum(axis=0),
+    }
+
+    for horizon in horizons:
+        forward = np.full(n_days, np.nan)
+        if n_days > horizon:
+            forward[:-horizon] = close[horizon:] / close[:-horizon] - 1
+        evaluated = (signals != 0) & ~np.isnan(forward)[:, None]
+        hits = evaluated & (np.sign(forward)[:, None] == signals)
+        result[f"evaluated_{horizon}d"] = evaluated.sum(axis=0)
+        result[f"hits_{horizon}d"] = hits.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[f"hit_rate_{horizon}d"] = result[f"hits_{horizon}d"] / result[f"evaluated_{horizon}d"]
+
+    position = np.clip(signals, 0, 1) if long_only else signals
+    daily = close[1:] / close[:-1] - 1                                        # (T-1,)
+    trades = np.abs(np.diff(position, axis=0, prepend=0))                     # (T, S)
+    returns = position[:-1] * daily[:, None] - cost * trades[:-1]
+    equity = np.cumprod(1 + returns, axis=0)
+    years = max(len(returns), 1) / TRADING_DAYS
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = equity[-1] - 1 if len(returns) else np.zeros(n_strategies)
+        volatility = returns.std(axis=0) * np.sqrt(TRADING_DAYS)
+        result.update({
+            "total_return": total,
+            "annual_return": np.maximum(1 + total, 0) ** (1 / years) - 1,
+            "annual_volatility": volatility,
+            "sharpe": returns.mean(axis=0) * TRADING_DAYS / volatility,
+            "max_drawdown": (equity / np.maximum.accumulate(equity, axis=0) - 1).min(axis=0)
+            if len(returns) else np.zeros(n_strategies),
+            "turnover": trades.sum(axis=0) / years,
+            "exposure": np.abs(position).mean(axis=0),
+        })
+    return result
+
+
+def backtest_ticker(
+    bars: pd.DataFrame,
+    weights: Optional[Mapping[str, float]] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """对一只股票回测五个策略、加权组合信号和买入持有
+
+    Args:
+        bars: 按日期升序、包含 open/high/low/close/volume 的日线
+        weights: 组合权重，默认与 technical_analyst_agent 相同
+        **kwargs: 传给 evaluate_signals 的参数
+
+    Returns:
+        pd.DataFrame: 索引为策略名（含 combined、buy_and_hold），列为各项指标
+    """
+    bars = bars.reset_index(drop=True)
+    series = strategy_signal_series(bars)
+    combined = combine_signal_series(series, weights or STRATEGY_WEIGHTS)
+    names = [*series, "combined", "buy_and_hold"]
+    matrix = np.column_stack([*(s["signal"].to_numpy() for s in series.values()),
+                              combined["signal"].to_numpy(), np.ones(len(bars))])
+    metrics = evaluate_signals(matrix, bars["close"].to_numpy(), **kwargs)
+    frame = pd.DataFrame(metrics, index=pd.Index(names, name="strategy"))
+    # 买入持有只用于比较收益，不计算命中率
+    signal_columns = [c for c in frame.columns if c.startswith(("hit", "evaluated", "signals", "bearish"))]
+    frame.loc["buy_and_hold", signal_columns] = np.nan
+    return frame
+
+
+def _backtest_chunk(items: List[Tuple[str, pd.DataFrame]], weights, kwargs) -> List[Tuple[str, Any]]:
+    """进程池任务：回测一组股票，单只失败时返回错误信息而不中断整组"""
+    results = []
+    for ticker, bars in items:
+        try:
+            results.append((ticker, backtest_ticker(bars, weights, **kwargs)))
+        except Exception as e:
+            results.append((ticker, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def run_backtest(
+    bars: Mapping[str, pd.DataFrame],
+    weights: Optional[Mapping[str, float]] = None,
+    workers: int = BACKTEST_WORKERS,
+    chunk_size: int = BACKTEST_CHUNK,
+    **kwargs,
+) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """并行回测多只股票
+
+    每只股票的指标计算相互独立，按 chunk_size 分组提交到进程池（spawn 启动）。
+
+    Returns:
+        (索引为 (ticker, strategy) 的指标表, {股票: 错误信息})
+    """
+    min_days = kwargs.get("warmup", BACKTEST_WARMUP) + max(kwargs.get("horizons", BACKTEST_HORIZONS)) + 2
+    items = [(t, b) for t, b in bars.items() if b is not None and len(b) >= min_days]
+    errors = {t: "历史数据不足" for t, b in bars.items() if b is None or len(b) < min_days}
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    results = []
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            results.extend(_backtest_chunk(chunk, weights, kwargs))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context) as pool:
+            futures = [pool.submit(_backtest_chunk, chunk, weights, kwargs) for chunk in chunks]
+            for future in as_completed(futures):
+                results.extend(future.result())
+
+    frames = {}
+    for ticker, result in results:
+        if isinstance(result, str):
+            errors[ticker] = result
+        else:
+            frames[ticker] = result
+    if errors:
+        logger.warning(f"{len(errors)} 只股票未参与回测")
+    if not frames:
+        return pd.DataFrame(), errors
+    return pd.concat(frames, names=["ticker"]).sort_index(), errors
+
+
+def summarize(results: pd.DataFrame, horizons: Sequence[int] = BACKTEST_HORIZONS) -> pd.DataFrame:
+    """按策略汇总全部股票：命中率按信号数合并计算，收益类指标取各股票的均值和中位数"""
+    grouped = results.groupby(level="strategy", sort=False)
+    summary = pd.DataFrame({"tickers": grouped.size(), "signals": grouped["signals"].sum()})
+    for horizon in horizons:
+        summary[f"hit_rate_{horizon}d"] = grouped[f"hits_{horizon}d"].sum() / grouped[f"evaluated_{horizon}d"].sum()
+    for column in ("annual_return", "sharpe", "max_drawdown", "turnover", "exposure"):
+        summary[f"mean_{column}"] = grouped[column].mean()
+    summary["median_sharpe"] = grouped["sharpe"].median()
+    return summary
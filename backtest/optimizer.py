@@ -0,0 +1,328 @@
+"""technical_analyst_agent 策略权重的滚动前推（walk-forward）优化
+
+    python -m backtest.optimizer --universe 300 --years 6 --workers 8
+    python -m backtest.optimizer --tickers 000001,600310 --step 0.05 --objective hit_rate --dry-run
+
+先在进程池中对每只股票计算一次五个策略的信号，再对权重网格中的全部候选向量一次性组合、
+按季度（--freq）汇总收益和命中率的充分统计量。滚动前推时，每一期用之前 --train-periods 期
+合并后的目标值选出最优权重，在下一期样本外检验。样本外表现优于当前权重时，用最近的训练窗口
+重新选出权重写入信号权重配置（SIGNAL_WEIGHTS_PATH），各分析节点在下次启动时加载，无需改代码。
+"""
+import argparse
+import itertools
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from agents.technical_signals import SIGNAL_THRESHOLD, STRATEGY_SERIES, STRATEGY_WEIGHTS, strategy_signal_series
+from backtest.engine import BACKTEST_CHUNK, BACKTEST_COST, BACKTEST_LONG_ONLY, BACKTEST_WARMUP, BACKTEST_WORKERS
+from utils.logging_config import setup_logger
+
+logger = setup_logger('optimizer')
+
+STRATEGIES = list(STRATEGY_SERIES)
+# 汇总到每期的充分统计量
+STAT_FIELDS = ("days", "ret_sum", "ret_sq", "evaluated", "hits")
+OBJECTIVES = ("sharpe", "hit_rate")
+TRADING_DAYS = 252
+# 每次组合的候选权重个数，限制 (交易日 × 候选数) 中间数组的内存
+CANDIDATE_BLOCK = 1000
+
+
+def candidate_weights(step: float = 0.1, current: Optional[Mapping[str, float]] = None) -> np.ndarray:
+    """单纯形上步长为 step 的全部权重向量（各分量非负、和为1），第0行为当前权重
+
+    Returns:
+        (K, 5) 的权重矩阵，列顺序与 STRATEGIES 一致
+    """
+    units = int(round(1 / step))
+    grid = [combo for combo in itertools.product(range(units + 1), repeat=len(STRATEGIES) - 1)
+            if sum(combo) <= units]
+    grid = np.array([[*combo, units - sum(combo)] for combo in grid], dtype=float) / units
+    current = current or STRATEGY_WEIGHTS
+    first = np.array([[current[name] for name in STRATEGIES]], dtype=float)
+    return np.vstack([first / first.sum(), grid])
+
+
+def ticker_period_stats(
+    bars: pd.DataFrame,
+    candidates: np.ndarray,
+    freq: str = "Q",
+    horizon: int = 5,
+    cost: float = BACKTEST_COST,
+    long_only: bool = BACKTEST_LONG_ONLY,
+    warmup: int = BACKTEST_WARMUP,
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """一只股票在每个候选权重下、按期汇总的收益和命中率统计量
+
+    信号、调仓和成本的口径与 backtest.engine.evaluate_signals 相同（预热期结束前已有的仓位不计建仓成本）；
+    收益计入次日所在的期，命中率按信号日所在的期统计。
+
+    Args:
+        bars: 以日期为索引、按日期升序的日线
+        candidates: (K, 5) 的候选权重
+
+    Returns:
+        {期: {统计量: (K,) 数组}}
+    """
+    frame = bars.reset_index()
+    dates = pd.to_datetime(bars.index)
+    series = strategy_signal_series(frame)
+    signal = np.column_stack([series[name]["signal"].to_numpy(dtype=float) for name in STRATEGIES])
+    confidence = np.column_stack([series[name]["confidence"].to_numpy(dtype=float) for name in STRATEGIES])
+
+    close = frame["close"].to_numpy(dtype=float)
+    forward = np.full(len(close), np.nan)
+    forward[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    # 预热期内的信号不计入；收益从预热期结束的次日开始计
+    keep = np.arange(len(close)) >= warmup
+    earning = (np.arange(len(close)) > warmup)[keep].astype(float)
+    periods = dates.to_period(freq).astype(str).to_numpy()[keep]
+    labels, starts = np.unique(periods, return_index=True)
+    order = np.argsort(starts)
+    bounds = np.append(starts[order], len(periods))
+    days = np.add.reduceat(earning, bounds[:-1])
+
+    blocks = []
+    for begin in range(0, len(candidates), CANDIDATE_BLOCK):
+        block = candidates[begin:begin + CANDIDATE_BLOCK]
+        # 一批候选权重一次性组合：(T, 5) @ (5, K) -> (T, K)
+        weighted_sum = (signal * confidence) @ block.T
+        total_confidence = confidence @ block.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            score = np.where(total_confidence > 0, weighted_sum / total_confidence, 0.0)
+        combined = np.where(score > SIGNAL_THRESHOLD, 1.0, np.where(score < -SIGNAL_THRESHOLD, -1.0, 0.0))
+
+        position = np.clip(combined, 0, 1) if long_only else combined
+        trades = np.abs(np.diff(position, axis=0, prepend=0))
+        # 第 t+1 天的收益来自第 t 天收盘时的仓位
+        returns = np.zeros_like(position)
+        returns[1:] = position[:-1] * (close[1:] / close[:-1] - 1)[:, None] - cost * trades[:-1]
+        evaluated = (combined != 0) & ~np.isnan(forward)[:, None]
+        hits = evaluated & (np.sign(forward)[:, None] == combined)
+
+        returns = returns[keep] * earning[:, None]
+        stats = {"ret_sum": returns, "ret_sq": returns ** 2,
+                 "evaluated": evaluated[keep].astype(float), "hits": hits[keep].astype(float)}
+        # 按期求和：(T, K) -> (P, K)
+        blocks.append({name: np.add.reduceat(values, bounds[:-1], axis=0) for name, values in stats.items()})
+
+    result = {}
+    for i, label in enumerate(labels[order]):
+        result[label] = {name: np.concatenate([block[name][i] for block in blocks]) for name in blocks[0]}
+        result[label]["days"] = np.full(len(candidates), days[i])
+    return result
+
+
+def _stats_chunk(items: List[Tuple[str, pd.DataFrame]], candidates: np.ndarray, kwargs) -> Tuple[Dict, Dict]:
+    """进程池任务：计算一组股票的统计量并按期合并，减少回传的数据量"""
+    merged: Dict[str, Dict[str, np.ndarray]] = {}
+    errors = {}
+    for ticker, bars in items:
+        try:
+            for period, stats in ticker_period_stats(bars, candidates, **kwargs).items():
+                if period in merged:
+                    for name in STAT_FIELDS:
+                        merged[period][name] += stats[name]
+                else:
+                    merged[period] = stats
+        except Exception as e:
+            errors[ticker] = f"{type(e).__name__}: {e}"
+    return merged, errors
+
+
+def collect_period_stats(
+    bars: Mapping[str, pd.DataFrame],
+    candidates: np.ndarray,
+    workers: int = BACKTEST_WORKERS,
+    chunk_size: int = BACKTEST_CHUNK,
+    **kwargs,
+) -> Tuple[Dict[str, Dict[str, np.ndarray]], Dict[str, str]]:
+    """并行计算全部股票的统计量，按期合并为 {期: {统计量: (K,) 数组}}"""
+    min_days = kwargs.get("warmup", BACKTEST_WARMUP) + kwargs.get("horizon", 5) + 2
+    items = [(t, b) for t, b in bars.items() if b is not None and len(b) >= min_days]
+    errors = {t: "历史数据不足" for t, b in bars.items() if b is None or len(b) < min_days}
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    if workers <= 1 or len(chunks) <= 1:
+        parts = [_stats_chunk(chunk, candidates, kwargs) for chunk in chunks]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context) as pool:
+            futures = [pool.submit(_stats_chunk, chunk, candidates, kwargs) for chunk in chunks]
+            parts = [future.result() for future in as_completed(futures)]
+
+    merged: Dict[str, Dict[str, np.ndarray]] = {}
+    for part, part_errors in parts:
+        errors.update(part_errors)
+        for period, stats in part.items():
+            if period in merged:
+                for name in STAT_FIELDS:
+                    merged[period][name] = merged[period][name] + stats[name]
+            else:
+                merged[period] = stats
+    return dict(sorted(merged.items())), errors
+
+
+def objective(stats: Mapping[str, np.ndarray], name: str = "sharpe", min_evaluated: int = 30) -> np.ndarray:
+    """由合并后的统计量计算每个候选权重的目标值
+
+    sharpe：按股票-交易日合并的日收益率年化夏普；hit_rate：信号命中率，信号数不足 min_evaluated 时为 NaN。
+    """
+    if name == "hit_rate":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(stats["evaluated"] >= min_evaluated, stats["hits"] / stats["evaluated"], np.nan)
+    days = np.maximum(stats["days"], 1)
+    mean = stats["ret_sum"] / days
+    std = np.sqrt(np.maximum(stats["ret_sq"] / days - mean ** 2, 0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), np.nan)
+
+
+def _merge(stats: Sequence[Mapping[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    return {name: np.sum([s[name] for s in stats], axis=0) for name in STAT_FIELDS}
+
+
+def _best(values: np.ndarray) -> int:
+    """目标值最高的候选；并列或全为 NaN 时优先当前权重（第0行）"""
+    if np.all(np.isnan(values)):
+        return 0
+    best = int(np.nanargmax(values))
+    return 0 if values[0] >= values[best] else best
+
+
+def walk_forward(
+    period_stats: Mapping[str, Mapping[str, np.ndarray]],
+    candidates: np.ndarray,
+    objective_name: str = "sharpe",
+    train_periods: int = 8,
+) -> Dict[str, Any]:
+    """滚动前推验证并选出最终权重
+
+    第 i 期用前 train_periods 期合并的目标值选出权重，再以第 i 期的样本外目标值评估；
+    最终权重用最近 train_periods 期（含最后一期）重新选出。
+
+    Returns:
+        dict: folds（每期的选择和样本外结果）、样本外汇总（合并全部检验期）、最终权重
+    """
+    periods = list(period_stats)
+    if len(periods) <= train_periods:
+        raise ValueError(f"共 {len(periods)} 期，至少需要 {train_periods + 1} 期才能做滚动前推验证")
+
+    folds, chosen_test, current_test = [], [], []
+    for i in range(train_periods, len(periods)):
+        train = _merge([period_stats[p] for p in periods[i - train_periods:i]])
+        test = period_stats[periods[i]]
+        best = _best(objective(train, objective_name))
+        test_values = objective(test, objective_name)
+        folds.append({
+            "period": periods[i],
+            "weights": dict(zip(STRATEGIES, candidates[best].round(4).tolist())),
+            "train_objective": float(objective(train, objective_name)[best]),
+            "test_objective": float(test_values[best]),
+            "current_test_objective": float(test_values[0]),
+        })
+        # 把每期被选中的候选的统计量拼起来，得到整个检验区间的样本外表现
+        chosen_test.append({name: test[name][[best]] for name in STAT_FIELDS})
+        current_test.append({name: test[name][[0]] for name in STAT_FIELDS})
+
+    final_train = _merge([period_stats[p] for p in periods[-train_periods:]])
+    final_values = objective(final_train, objective_name)
+    final = _best(final_values)
+    return {
+        "objective": objective_name,
+        "folds": folds,
+        "out_of_sample": float(objective(_merge(chosen_test), objective_name)[0]),
+        "current_out_of_sample": float(objective(_merge(current_test), objective_name)[0]),
+        "weights": dict(zip(STRATEGIES, candidates[final].round(4).tolist())),
+        "final_train_objective": float(final_values[final]),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="technical_analyst_agent 策略权重的滚动前推优化")
+    parser.add_argument("--tickers", help="逗号分隔的股票代码")
+    parser.add_argument("--universe", type=int, help="使用全市场总市值最大的 N 只股票")
+    parser.add_argument("--years", type=float, default=6, help="使用的历史年数（不含预热期）")
+    parser.add_argument("--step", type=float, default=0.1, help="权重网格的步长")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="sharpe")
+    parser.add_argument("--horizon", type=int, default=5, help="命中率的持有期（交易日）")
+    parser.add_argument("--freq", default="Q", help="滚动前推的分期频率（pandas Period 频率，如 Q、M）")
+    parser.add_argument("--train-periods", type=int, default=8, help="每次训练使用的期数")
+    parser.add_argument("--cost", type=float, default=BACKTEST_COST, help="单边交易成本")
+    parser.add_argument("--long-short", action="store_true", default=not BACKTEST_LONG_ONLY)
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS, help="进程数")
+    parser.add_argument("--output", help="写入的权重配置路径，默认 SIGNAL_WEIGHTS_PATH")
+    parser.add_argument("--dry-run", action="store_true", help="只输出结果，不写配置")
+    parser.add_argument("--force", action="store_true", help="样本外表现不优于当前权重时也写入")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    load_dotenv(override=True)
+    from backtest.run import select_tickers
+    from utils.price_store import get_price_store
+    from utils.signal_weights import SIGNAL_WEIGHTS_PATH, save_signal_weights
+
+    tickers = select_tickers(args)
+    history_days = int(args.years * 365 + BACKTEST_WARMUP * 1.6)
+    candidates = candidate_weights(args.step)
+
+    started = time.perf_counter()
+    bars = get_price_store().load(tickers, history_days=history_days)
+    loaded = time.perf_counter()
+    period_stats, errors = collect_period_stats(
+        bars, candidates, workers=args.workers, freq=args.freq, horizon=args.horizon,
+        cost=args.cost, long_only=not args.long_short)
+    computed = time.perf_counter()
+    for ticker, error in errors.items():
+        print(f"  跳过 {ticker}: {error}")
+    print(f"加载 {len(bars)} 只股票 {loaded - started:.1f}s，"
+          f"{len(candidates)} 组候选权重 × {len(period_stats)} 期统计 {computed - loaded:.1f}s")
+
+    try:
+        result = walk_forward(period_stats, candidates, args.objective, args.train_periods)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    for fold in result["folds"]:
+        weights = " ".join(f"{k}={v:.2f}" for k, v in fold["weights"].items())
+        print(f"{fold['period']}  {weights}  样本外 {fold['test_objective']:.4f}"
+              f"（当前权重 {fold['current_test_objective']:.4f}）")
+    print(f"样本外 {args.objective}: 滚动选择 {result['out_of_sample']:.4f}，"
+          f"当前权重 {result['current_out_of_sample']:.4f}")
+    print("最终权重: " + " ".join(f"{k}={v:.2f}" for k, v in result["weights"].items()))
+
+    improved = result["out_of_sample"] > result["current_out_of_sample"]
+    if args.dry_run:
+        return 0
+    if not improved and not args.force:
+        print("样本外表现未优于当前权重，不写入配置（可用 --force 强制写入）")
+        return 0
+
+    path = args.output or SIGNAL_WEIGHTS_PATH
+    meta = {
+        "objective": args.objective,
+        "out_of_sample": result["out_of_sample"],
+        "current_out_of_sample": result["current_out_of_sample"],
+        "tickers": len(bars) - len(errors),
+        "periods": list(period_stats)[0] + "~" + list(period_stats)[-1],
+        "freq": args.freq,
+        "train_periods": args.train_periods,
+        "step": args.step,
+    }
+    save_signal_weights(strategy_weights=result["weights"], meta=meta, path=path)
+    print(f"已写入 {path}，重启服务后生效")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
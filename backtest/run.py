@@ -0,0 +1,81 @@
+"""回测入口
+
+    python -m backtest.run --tickers 000001,600310 --years 5
+    python -m backtest.run --universe 300 --years 5 --workers 8 --output backtest.csv
+
+--universe N 取全市场快照中总市值最大的 N 只股票。日线从本地价格存储读取（src/data/prices），
+本地没有或不够长时按需补拉，之后的回测不再访问网络。
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from backtest.engine import (BACKTEST_COST, BACKTEST_HORIZONS, BACKTEST_LONG_ONLY, BACKTEST_WARMUP,
+                             BACKTEST_WORKERS, run_backtest, summarize)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="technical_analyst_agent 策略信号回测")
+    parser.add_argument("--tickers", help="逗号分隔的股票代码")
+    parser.add_argument("--universe", type=int, help="回测全市场总市值最大的 N 只股票")
+    parser.add_argument("--years", type=float, default=5, help="回测的历史年数（不含预热期）")
+    parser.add_argument("--horizons", default=",".join(str(h) for h in BACKTEST_HORIZONS),
+                        help="逗号分隔的命中率持有期（交易日）")
+    parser.add_argument("--cost", type=float, default=BACKTEST_COST, help="单边交易成本")
+    parser.add_argument("--long-short", action="store_true", default=not BACKTEST_LONG_ONLY,
+                        help="看跌信号做空（默认只做多）")
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS, help="回测进程数")
+    parser.add_argument("--output", help="逐只股票结果的保存路径（.csv 或 .json）")
+    return parser.parse_args(argv)
+
+
+def select_tickers(args) -> list:
+    if args.tickers:
+        return [t.strip() for t in args.tickers.split(",") if t.strip()]
+    if args.universe:
+        from utils.universe import get_universe_store
+        frame = get_universe_store().get()
+        return frame["market_cap"].dropna().sort_values(ascending=False).index[:args.universe].tolist()
+    raise SystemExit("需要指定 --tickers 或 --universe")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    load_dotenv(override=True)
+    from utils.price_store import get_price_store
+
+    tickers = select_tickers(args)
+    horizons = tuple(int(h) for h in args.horizons.split(",") if h.strip())
+    # 预热期按交易日计，换算为自然日后多取一些
+    history_days = int(args.years * 365 + BACKTEST_WARMUP * 1.6)
+
+    started = time.perf_counter()
+    bars = get_price_store().load(tickers, history_days=history_days)
+    loaded = time.perf_counter()
+    results, errors = run_backtest(bars, workers=args.workers, horizons=horizons, cost=args.cost,
+                                   long_only=not args.long_short)
+    finished = time.perf_counter()
+
+    print(f"加载 {len(bars)} 只股票日线 {loaded - started:.1f}s，回测 {finished - loaded:.1f}s")
+    for ticker, error in errors.items():
+        print(f"  跳过 {ticker}: {error}")
+    if results.empty:
+        return 1
+
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.4f}".format):
+        print(summarize(results, horizons))
+
+    if args.output:
+        if args.output.endswith(".json"):
+            results.reset_index().to_json(args.output, orient="records", force_ascii=False, indent=2)
+        else:
+            results.to_csv(args.output)
+        print(f"结果已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
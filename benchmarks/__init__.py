@@ -0,0 +1,6 @@
+"""性能基准测试
+
+用法见 benchmarks/run.py：
+    python -m benchmarks.run --suite micro --output bench.json
+    python -m benchmarks.run --suite workflow --tickers 000001,600310 --concurrency 1,4 --compare baseline.json
+"""
@@ -0,0 +1,124 @@
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 对比基准结果时，主指标变差超过该比例即视为回退
+BENCH_REGRESSION_THRESHOLD = float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.10"))
+
+
+def summarize(samples: List[float], unit: str = "ms") -> Dict[str, Any]:
+    """把一组耗时样本汇总为结果条目，主指标 value 取中位数"""
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        "value": round(median, 4),
+        "unit": unit,
+        "better": "lower",
+        "runs": len(ordered),
+        "min": round(ordered[0], 4),
+        "mean": round(statistics.fmean(ordered), 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+        "max": round(ordered[-1], 4),
+        "stdev": round(statistics.stdev(ordered), 4) if len(ordered) > 1 else 0.0,
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int = 20, warmup: int = 2, number: int = 1) -> Dict[str, Any]:
+    """多次执行 func 并返回单次调用耗时（毫秒）的统计
+
+    Args:
+        func: 无参数的被测函数
+        repeat: 采样次数
+        warmup: 正式采样前的预热次数
+        number: 每次采样内连续调用的次数，用于测量很快的函数
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) * 1000 / number)
+    return summarize(samples)
+
+
+def synthetic_prices(days: int = 500, seed: int = 42) -> pd.DataFrame:
+    """生成与 get_price_history 重命名后列名一致的模拟日线数据
+
+    使用固定随机种子的几何随机游走，保证每次运行的输入相同。
+    """
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, days)))
+    open_ = close * (1 + rng.normal(0, 0.005, days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, days)))
+    volume = rng.integers(50_000, 500_000, days).astype(float)
+    df = pd.DataFrame({
+        "date": pd.bdate_range("2022-01-03", periods=days),
+        "open": open_,
+        "high": high,
+        "low": low,
+        "close": close,
+        "volume": volume,
+    })
+    df["amount"] = df["close"] * df["volume"] * 100
+    df["pct_change"] = df["close"].pct_change().fillna(0) * 100
+    df["change_amount"] = df["close"].diff().fillna(0)
+    df["amplitude"] = (df["high"] - df["low"]) / df["close"].shift(1).fillna(df["close"]) * 100
+    df["turnover"] = rng.uniform(0.5, 5, days)
+    return df
+
+
+def environment_info() -> Dict[str, Any]:
+    """记录运行环境，便于判断两次结果是否可比"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                                capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    threshold: float = BENCH_REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+    """逐项对比两次运行的主指标
+
+    Returns:
+        每个共同基准项的对比结果，change 为正表示变差的比例
+    """
+    rows = []
+    for name, entry in current.get("benchmarks", {}).items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or not base.get("value"):
+            continue
+        ratio = entry["value"] / base["value"]
+        change = ratio - 1 if entry.get("better", "lower") == "lower" else 1 - ratio
+        rows.append({
+            "name": name,
+            "baseline": base["value"],
+            "current": entry["value"],
+            "unit": entry.get("unit", ""),
+            "change": round(change, 4),
+            "regression": change > threshold,
+        })
+    return rows
@@ -0,0 +1,352 @@
+"""/analyze 接口压测
+
+在进程内按不同的 worker/线程配置启动 backend.flask_app，用开环或闭环方式
+施加逐级增加的负载，报告延迟分位数、错误率，并找出每种配置的饱和点。
+
+    # 用桩工作流（固定服务时间）比较几种服务器配置
+    python -m benchmarks.load_test --workflow stub --servers threads:1,threads:4,threads:16,threaded \\
+        --mode closed --levels 1,2,4,8,16,32 --output load.json
+
+    # 用录制数据回放真实工作流，开环按每秒请求数递增
+    python -m benchmarks.load_test --workflow replay --mode open --levels 0.5,1,2,4 --duration 60
+
+    # 压测已经在运行的服务
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --mode closed --levels 1,4,16
+
+开环模式按固定到达率发送请求，不等待前一个请求返回，延迟从计划发送时刻算起，
+因此排队时间会计入延迟（避免协同遗漏）；闭环模式模拟固定数量的并发用户，
+每个用户收到响应后再发下一个请求。
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.common import environment_info
+
+
+class StubWorkflow:
+    """替代 workflow.app 的桩，只模拟服务时间，用于单独测量 HTTP 层和并发模型的容量
+
+    Args:
+        latency_ms: 每次运行的等待时间（模拟网络和 LLM 调用，不占用 GIL）
+        cpu_ms: 每次运行的纯 Python 计算时间（模拟指标计算等占用 GIL 的工作）
+        jitter: 等待时间的随机浮动比例
+    """
+
+    def __init__(self, latency_ms: float = 200, cpu_ms: float = 0, jitter: float = 0.1):
+        self.latency_ms = latency_ms
+        self.cpu_ms = cpu_ms
+        self.jitter = jitter
+
+    def invoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        from langchain_core.messages import HumanMessage
+
+        deadline = time.perf_counter() + self.cpu_ms / 1000
+        while time.perf_counter() < deadline:
+            pass
+        time.sleep(max(0.0, self.latency_ms * (1 + random.uniform(-self.jitter, self.jitter))) / 1000)
+        data = state["data"]
+        return {
+            "data": {**data, "prices": [], "market_data": {"market_cap": 0}},
+            "messages": [*state["messages"], HumanMessage(content=json.dumps({"action": "hold"}))],
+        }
+
+
+def _make_server(app, config: str):
+    """按配置创建 WSGI 服务器
+
+    config 取值：
+        threads:N    固定 N 个线程的线程池处理请求
+        processes:N  每个请求 fork 一个子进程，最多 N 个同时运行
+        threaded     每个请求一个新线程（flask run 的默认方式）
+        single       单线程串行处理
+    """
+    from werkzeug.serving import BaseWSGIServer, make_server
+
+    kind, _, size = config.partition(":")
+    if kind == "threads":
+        class PooledWSGIServer(BaseWSGIServer):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.pool = ThreadPoolExecutor(max_workers=int(size), thread_name_prefix="wsgi")
+
+            def process_request(self, request, client_address):
+                self.pool.submit(self._process, request, client_address)
+
+            def _process(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+            def server_close(self):
+                super().server_close()
+                self.pool.shutdown(wait=False, cancel_futures=True)
+
+        return PooledWSGIServer("127.0.0.1", 0, app)
+    if kind == "processes":
+        return make_server("127.0.0.1", 0, app, processes=int(size))
+    if kind == "threaded":
+        return make_server("127.0.0.1", 0, app, threaded=True)
+    if kind == "single":
+        return make_server("127.0.0.1", 0, app)
+    raise ValueError(f"未知的服务器配置: {config}")
+
+
+class InProcessServer:
+    """在后台线程中运行 backend.flask_app"""
+
+    def __init__(self, config: str):
+        from backend import flask_app
+
+        self.config = config
+        self.server = _make_server(flask_app, config)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name=f"server-{config}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join(timeout=10)
+
+
+def send_request(url: str, method: str, ticker: str, timeout: float) -> Dict[str, Any]:
+    """发送一次 /analyze 请求，返回状态码或错误类型"""
+    if method == "GET":
+        request = urllib.request.Request(f"{url}/analyze?ticker={ticker}")
+    else:
+        request = urllib.request.Request(f"{url}/analyze", data=json.dumps({"ticker": ticker}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return {"status": response.status, "ok": 200 <= response.status < 300}
+    except urllib.error.HTTPError as e:
+        return {"status": e.code, "ok": False}
+    except Exception as e:
+        return {"status": type(e).__name__, "ok": False}
+
+
+def _request_mix(methods: List[str], tickers: List[str]):
+    """按顺序轮换请求方法和股票代码"""
+    i = 0
+    lock = threading.Lock()
+
+    def next_request():
+        nonlocal i
+        with lock:
+            n = i
+            i += 1
+        return methods[n % len(methods)], tickers[(n // len(methods)) % len(tickers)]
+    return next_request
+
+
+def run_closed_loop(url: str, users: int, duration: float, methods: List[str], tickers: List[str],
+                    timeout: float, think_ms: float = 0) -> List[Dict[str, Any]]:
+    """固定数量的并发用户，每个用户收到响应后（加思考时间）再发下一个请求"""
+    next_request = _request_mix(methods, tickers)
+    deadline = time.perf_counter() + duration
+    samples, lock = [], threading.Lock()
+
+    def user():
+        while time.perf_counter() < deadline:
+            method, ticker = next_request()
+            start = time.perf_counter()
+            result = send_request(url, method, ticker, timeout)
+            result.update(method=method, latency_ms=(time.perf_counter() - start) * 1000)
+            with lock:
+                samples.append(result)
+            if think_ms:
+                time.sleep(think_ms / 1000)
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def run_open_loop(url: str, rate: float, duration: float, methods: List[str], tickers: List[str],
+                  timeout: float, max_inflight: int = 512, poisson: bool = True,
+                  seed: int = 0) -> List[Dict[str, Any]]:
+    """按固定到达率发送请求，不等待响应；延迟从计划发送时刻计算"""
+    next_request = _request_mix(methods, tickers)
+    rng = random.Random(seed)
+    samples, lock = [], threading.Lock()
+
+    def fire(scheduled: float):
+        method, ticker = next_request()
+        result = send_request(url, method, ticker, timeout)
+        result.update(method=method, latency_ms=(time.perf_counter() - scheduled) * 1000)
+        with lock:
+            samples.append(result)
+
+    start = time.perf_counter()
+    scheduled = start
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="loadgen") as executor:
+        while True:
+            scheduled += rng.expovariate(rate) if poisson else 1 / rate
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(fire, scheduled)
+    return samples
+
+
+def summarize_samples(samples: List[Dict[str, Any]], duration: float, elapsed: float) -> Dict[str, Any]:
+    """汇总一个负载级别的延迟分位数、错误率和吞吐
+
+    Args:
+        samples: 每个请求的结果
+        duration: 发送请求的时长，用于计算实际到达率
+        elapsed: 从开始发送到最后一个响应返回的时长，用于计算吞吐
+    """
+    latencies = np.array([s["latency_ms"] for s in samples if s["ok"]])
+    errors = sum(1 for s in samples if not s["ok"])
+    percentiles = (dict(zip(("p50", "p90", "p95", "p99"), np.percentile(latencies, [50, 90, 95, 99]).round(2)))
+                   if len(latencies) else {})
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "offered_rps": round(len(samples) / duration, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {**{k: float(v) for k, v in percentiles.items()},
+                       "max": round(float(latencies.max()), 2) if len(latencies) else None},
+        "status": {str(k): v for k, v in Counter(s["status"] for s in samples).items()},
+        "by_method": {method: sum(1 for s in samples if s["method"] == method)
+                      for method in sorted({s["method"] for s in samples})},
+    }
+
+
+def saturation_reason(level: float, stats: Dict[str, Any], previous: Optional[Dict[str, Any]], mode: str,
+                      slo_ms: float, max_error_rate: float) -> Optional[str]:
+    """判断该负载级别是否已经饱和，返回原因；未饱和时返回 None"""
+    if stats["error_rate"] > max_error_rate:
+        return f"错误率 {stats['error_rate']:.1%} 超过 {max_error_rate:.1%}"
+    p95 = stats["latency_ms"].get("p95")
+    if p95 is None or p95 > slo_ms:
+        return f"p95 延迟 {p95}ms 超过 {slo_ms}ms"
+    if mode == "open" and stats["throughput_rps"] < 0.9 * stats["offered_rps"]:
+        return f"吞吐 {stats['throughput_rps']} rps 低于到达率 {stats['offered_rps']} rps"
+    if mode == "closed" and previous and stats["throughput_rps"] < 1.05 * previous["throughput_rps"]:
+        return f"增加并发后吞吐不再增长（{previous['throughput_rps']} -> {stats['throughput_rps']} rps）"
+    return None
+
+
+def sweep(url: str, args) -> Dict[str, Any]:
+    """对一个服务逐级加压，直到饱和或跑完所有级别"""
+    runs, previous = [], None
+    result = {"max_sustainable": None, "saturated_at": None, "reason": None}
+    for level in args.levels:
+        start = time.perf_counter()
+        if args.mode == "open":
+            samples = run_open_loop(url, level, args.duration, args.methods, args.tickers, args.timeout,
+                                    max_inflight=args.max_inflight, poisson=not args.constant_rate)
+        else:
+            samples = run_closed_loop(url, int(level), args.duration, args.methods, args.tickers,
+                                      args.timeout, think_ms=args.think_ms)
+        stats = {"level": level, **summarize_samples(samples, args.duration, time.perf_counter() - start)}
+        runs.append(stats)
+        print(f"  {args.mode}={level:<8} rps={stats['throughput_rps']:<9} p50={stats['latency_ms'].get('p50')}"
+              f" p95={stats['latency_ms'].get('p95')} p99={stats['latency_ms'].get('p99')}"
+              f" errors={stats['error_rate']:.1%}")
+
+        reason = saturation_reason(level, stats, previous, args.mode, args.slo_ms, args.max_error_rate)
+        if reason:
+            result.update(saturated_at=level, reason=reason)
+            if not args.full_sweep:
+                break
+        elif result["saturated_at"] is None:
+            result["max_sustainable"] = level
+        previous = stats
+    return {**result, "runs": runs}
+
+
+def parse_args(argv=None):
+    def numbers(text):
+        return [float(x) for x in text.split(",") if x.strip()]
+
+    def names(text):
+        return [x.strip() for x in text.split(",") if x.strip()]
+
+    parser = argparse.ArgumentParser(description="/analyze 接口压测")
+    parser.add_argument("--url", help="压测已经运行的服务；不指定时在进程内启动 backend.flask_app")
+    parser.add_argument("--servers", type=names, default=["threads:1", "threads:4", "threads:16", "threaded"],
+                        help="进程内服务器配置：threads:N、processes:N、threaded、single")
+    parser.add_argument("--workflow", choices=["stub", "replay"], default="stub",
+                        help="stub：用桩替换工作流；replay：以回放模式运行真实工作流")
+    parser.add_argument("--stub-latency-ms", type=float, default=200)
+    parser.add_argument("--stub-cpu-ms", type=float, default=0)
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed")
+    parser.add_argument("--levels", type=numbers, default=[1, 2, 4, 8, 16, 32],
+                        help="开环为每秒请求数，闭环为并发用户数")
+    parser.add_argument("--duration", type=float, default=10, help="每个级别持续的秒数")
+    parser.add_argument("--methods", type=names, default=["GET", "POST"])
+    parser.add_argument("--tickers", type=names, default=["000001", "600310"])
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--think-ms", type=float, default=0, help="闭环模式下用户的思考时间")
+    parser.add_argument("--max-inflight", type=int, default=512, help="开环模式下同时在途的最大请求数")
+    parser.add_argument("--constant-rate", action="store_true", help="开环模式使用固定间隔而非泊松到达")
+    parser.add_argument("--slo-ms", type=float, default=5000, help="p95 延迟上限")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--full-sweep", action="store_true", help="饱和后继续跑完剩余级别")
+    parser.add_argument("--output", help="结果 JSON 的保存路径")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # 关闭开发服务器的逐请求访问日志，避免日志输出影响测量
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    result = {"meta": {**environment_info(), "args": vars(args)}, "servers": {}}
+
+    if args.url:
+        print(f"压测 {args.url}")
+        result["servers"][args.url] = sweep(args.url.rstrip("/"), args)
+    else:
+        if args.workflow == "replay":
+            from utils import replay
+            replay.set_mode("replay")
+        import backend
+        if args.workflow == "stub":
+            backend.app = StubWorkflow(args.stub_latency_ms, args.stub_cpu_ms)
+        for config in args.servers:
+            print(f"服务器配置 {config}")
+            with InProcessServer(config) as server:
+                result["servers"][config] = sweep(server.url, args)
+
+    print("\n饱和点：")
+    for name, entry in result["servers"].items():
+        print(f"  {name:<14} 可承受 {entry['max_sustainable']}，饱和于 {entry['saturated_at']}"
+              f"{'（' + entry['reason'] + '）' if entry['reason'] else ''}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+from functools import reduce
+from typing import Any, Dict
+
+from benchmarks.common import measure, synthetic_prices
+
+
+def _analysis_state(prices_df, show_reasoning: bool = False) -> Dict[str, Any]:
+    """构造与 market_data_agent 输出结构一致的状态"""
+    return {
+        "messages": [],
+        "data": {
+            "ticker": "000001",
+            "market": "sz",
+            "prices": prices_df.to_dict("records"),
+            "market_cap": 2.0e11,
+            "financial_metrics": [{"earnings_growth": 0.12}],
+            "financial_line_items": [
+                {"net_income": 1.5e10, "depreciation_and_amortization": 3.0e9,
+                 "capital_expenditure": 4.0e9, "working_capital": 2.2e10, "free_cash_flow": 1.2e10},
+                {"net_income": 1.3e10, "depreciation_and_amortization": 2.8e9,
+                 "capital_expenditure": 3.6e9, "working_capital": 2.0e10, "free_cash_flow": 1.0e10},
+            ],
+        },
+        "metadata": {"show_reasoning": show_reasoning},
+    }
+
+
+def bench_price_indicators(days: int, repeat: int) -> Dict[str, Any]:
+    from utils.api import add_price_indicators
+
+    raw = synthetic_prices(days)
+    return measure(lambda: add_price_indicators(raw.copy()), repeat=repeat)
+
+
+def bench_technical_analyst(days: int, repeat: int) -> Dict[str, Any]:
+    from agents.technicals import technical_analyst_agent
+
+    state = _analysis_state(synthetic_prices(days))
+    return measure(lambda: technical_analyst_agent(state), repeat=repeat)
+
+
+def bench_valuation_functions(repeat: int) -> Dict[str, Dict[str, Any]]:
+    from agents.valuation import calculate_intrinsic_value, calculate_owner_earnings_value, valuation_agent
+    from agents.valuation_engine import default_axes, monte_carlo_valuation, valuation_surface
+
+    state = _analysis_state(synthetic_prices(30))
+    return {
+        "valuation.owner_earnings": measure(
+            lambda: calculate_owner_earnings_value(1.5e10, 3.0e9, 4.0e9, 2.0e9, growth_rate=0.12),
+            repeat=repeat, number=1000),
+        "valuation.dcf": measure(
+            lambda: calculate_intrinsic_value(1.2e10, growth_rate=0.12), repeat=repeat, number=1000),
+        "valuation.grid": measure(
+            lambda: valuation_surface(1.2e10, 1.2e10, 2.0e11, **default_axes(0.12)), repeat=repeat, number=10),
+        "valuation.monte_carlo": measure(
+            lambda: monte_carlo_valuation(state["data"]["financial_metrics"], state["data"]["financial_line_items"],
+                                          state["data"]["market_cap"], seed=0, cpu_budget=float("inf"), workers=1),
+            repeat=repeat, warmup=1),
+        "valuation.agent": measure(lambda: valuation_agent(state), repeat=repeat),
+    }
+
+
+def bench_risk(days: int, repeat: int, tickers: int = 50, holdings: int = 300) -> Dict[str, Dict[str, Any]]:
+    """单只股票的风险节点、多只股票多个持有期的风险报告，以及多只持仓的组合风险"""
+    import pandas as pd
+
+    from agents.portfolio_risk import portfolio_risk
+    from agents.risk_engine import risk_report
+    from agents.risk_manager import risk_management_agent
+
+    state = _analysis_state(synthetic_prices(days))
+    closes = pd.DataFrame({f"{i:06d}": synthetic_prices(days, seed=i)["close"].to_numpy() for i in range(tickers)})
+    book = {f"{i:06d}": synthetic_prices(days, seed=i).set_index("date")["close"] for i in range(holdings)}
+    portfolio = {"cash": 1.0e7, "positions": {ticker: 1000 for ticker in book}}
+    return {
+        "risk.agent": measure(lambda: risk_management_agent(state), repeat=repeat),
+        "risk.report": measure(lambda: risk_report(closes), repeat=repeat),
+        "risk.portfolio": measure(lambda: portfolio_risk(portfolio, "000000", book), repeat=repeat),
+    }
+
+
+def bench_backtest(days: int, repeat: int) -> Dict[str, Any]:
+    """单只股票全部交易日的五个策略信号、组合信号和回测指标"""
+    from backtest.engine import backtest_ticker
+
+    bars = synthetic_prices(days).set_index("date")
+    return measure(lambda: backtest_ticker(bars), repeat=repeat)
+
+
+def bench_state_merge(days: int, repeat: int) -> Dict[str, Any]:
+    """模拟七个分析节点汇合到 portfolio_management_agent 时对 data 的合并"""
+    from agents.state import merge_dicts
+
+    data = _analysis_state(synthetic_prices(days))["data"]
+    updates = [{**data, f"{name}_analysis": {"signal": "中立", "confidence": "50%", "reasoning": {}}}
+               for name in ("short_term", "long_term", "technical", "fundamental", "sentiment", "valuation", "risk")]
+    return measure(lambda: reduce(merge_dicts, updates, data), repeat=repeat, number=100)
+
+
+def bench_screening(repeat: int, stocks: int = 5000) -> Dict[str, Any]:
+    """在模拟的全市场快照上评估阈值规则并计算横截面百分位"""
+    import numpy as np
+    import pandas as pd
+
+    from agents.screening import ScreeningEngine
+
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "return_on_equity": rng.normal(0.08, 0.08, stocks),
+        "net_margin": rng.normal(0.08, 0.10, stocks),
+        "gross_margin": rng.uniform(0, 0.6, stocks),
+        "revenue_growth": rng.normal(0.08, 0.2, stocks),
+        "earnings_growth": rng.normal(0.05, 0.5, stocks),
+        "pe_ratio": rng.normal(30, 40, stocks),
+        "price_to_book": rng.lognormal(0.8, 0.6, stocks),
+        "price_to_sales": rng.lognormal(1, 1, stocks),
+        "market_cap": rng.lognormal(23, 1, stocks),
+        "earnings_per_share": rng.normal(0.5, 0.5, stocks),
+        "free_cash_flow_per_share": rng.normal(0.6, 0.8, stocks),
+    }, index=[f"{i:06d}" for i in range(stocks)])
+    return measure(lambda: ScreeningEngine(frame), repeat=repeat)
+
+
+def run_micro(days: int = 500, repeat: int = 20) -> Dict[str, Dict[str, Any]]:
+    """运行所有微基准，返回 {基准名: 结果条目}"""
+    results = {
+        "micro.price_indicators": bench_price_indicators(days, repeat),
+        "micro.technical_analyst_agent": bench_technical_analyst(days, repeat),
+        "micro.state_merge": bench_state_merge(days, repeat),
+        "micro.screening": bench_screening(repeat),
+        "micro.backtest_ticker": bench_backtest(days, repeat),
+    }
+    for name, entry in bench_valuation_functions(repeat).items():
+        results[f"micro.{name}"] = entry
+    for name, entry in bench_risk(days, repeat).items():
+        results[f"micro.{name}"] = entry
+    return results
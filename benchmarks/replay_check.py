@@ -0,0 +1,78 @@
+"""录制—回放一致性检查
+
+    python -m benchmarks.replay_check --days 3
+
+在临时目录中录制一组调用（参数包含由 replay.now() 推导的日期和显式的绝对日期），
+然后把系统时钟向后平移 --days 天，以 replay 模式重新执行同样的调用，
+确认全部命中录制数据且结果一致。任一调用未命中时以状态码 1 退出。
+"""
+import argparse
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from utils import replay
+
+
+def _calls():
+    """与 market_data_agent / get_price_history 相同的方式由“今天”推导日期，并混入固定日期的调用"""
+    today = replay.now()
+    yesterday = today - timedelta(days=1)
+    start = yesterday - timedelta(days=365)
+    fetch = lambda **kwargs: dict(kwargs)
+    return [
+        replay.call("akshare", "stock_zh_a_hist", fetch, symbol="000001", period="daily",
+                    start_date=start.strftime("%Y%m%d"), end_date=yesterday.strftime("%Y%m%d"), adjust="qfq"),
+        replay.call("akshare", "stock_zh_a_hist", fetch, symbol="000001", period="weekly",
+                    start_date="20220101", end_date=today.strftime("%Y%m%d"), adjust="qfq"),
+        replay.call("akshare", "stock_zh_a_hist", fetch, symbol="000001", period="daily",
+                    start_date="20240310", end_date="20250310", adjust="qfq"),
+        replay.call("llm", "get_chat_completion", fetch,
+                    messages=[{"role": "user", "content": f"{(today - timedelta(days=7)):%Y-%m-%d} 之后的新闻"}]),
+    ]
+
+
+def _shifted_datetime(days: int):
+    """now() 比真实时间晚 days 天的 datetime，用于模拟在之后的某一天回放"""
+    class ShiftedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(days=days)
+    return ShiftedDatetime
+
+
+def check(days: int = 3) -> bool:
+    fixtures = replay.DATA_AGENT_FIXTURES
+    real_datetime = replay.datetime
+    mode = replay.get_mode()
+    replay.DATA_AGENT_FIXTURES = tempfile.mkdtemp(prefix="replay_check_")
+    try:
+        replay.set_mode("record")
+        recorded = _calls()
+        replay.datetime = _shifted_datetime(days)
+        replay.set_mode("replay")
+        misses_before = len(replay.misses())
+        try:
+            replayed = _calls()
+        except replay.ReplayMissError as e:
+            print(f"回放未命中: {e}")
+            return False
+        missed = replay.misses()[misses_before:]
+        ok = not missed and replayed == recorded
+        print(f"{days} 天后回放 {len(recorded)} 次调用: {'全部命中且结果一致' if ok else '失败'}")
+        return ok
+    finally:
+        replay.datetime = real_datetime
+        replay.DATA_AGENT_FIXTURES = fixtures
+        replay.set_mode(mode)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="检查录制数据能否在之后的日期回放")
+    parser.add_argument("--days", type=int, default=3, help="回放时时钟向后平移的天数")
+    args = parser.parse_args(argv)
+    return 0 if check(args.days) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""基准测试入口
+
+    python -m benchmarks.run --suite micro --output bench.json
+    python -m benchmarks.run --suite all --tickers 000001,600310 --concurrency 1,4,8 \\
+        --output bench.json --compare baseline.json
+
+workflow 套件默认以回放模式运行（DATA_AGENT_REPLAY=replay），需要先用
+--replay record 在联网环境下录制一次 fixtures，之后的结果才与网络和 LLM 延迟无关。
+录制开始的时间保存在 fixtures 的 clock.json 中，回放时由“今天”推导的日期都取这个时间，
+因此录制结果在之后任何一天都能回放；回放缺少录制数据时直接报错，不会测到错误分支的耗时。
+--compare 指定的基准文件中有指标变差超过阈值时，进程以状态码 1 退出。
+"""
+import argparse
+import json
+import sys
+
+from dotenv import load_dotenv
+
+from benchmarks.common import BENCH_REGRESSION_THRESHOLD, compare_results, environment_info
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="DataAgent 性能基准测试")
+    parser.add_argument("--suite", choices=["micro", "workflow", "all"], default="micro")
+    parser.add_argument("--tickers", default="000001", help="逗号分隔的股票代码")
+    parser.add_argument("--concurrency", default="1,4", help="逗号分隔的并发数，用于测量吞吐")
+    parser.add_argument("--repeat", type=int, default=None,
+                        help="采样次数，默认微基准 20 次、工作流每个代码 3 次")
+    parser.add_argument("--days", type=int, default=500, help="微基准使用的模拟行情天数")
+    parser.add_argument("--replay", choices=["off", "record", "replay", "auto"], default="replay",
+                        help="workflow 套件的录制/回放模式")
+    parser.add_argument("--output", help="结果 JSON 的保存路径")
+    parser.add_argument("--compare", help="作为基准的历史结果 JSON")
+    parser.add_argument("--threshold", type=float, default=BENCH_REGRESSION_THRESHOLD,
+                        help="判定回退的变差比例")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    load_dotenv(override=True)
+
+    result = {"meta": {**environment_info(), "suite": args.suite, "args": vars(args)}, "benchmarks": {}}
+
+    if args.suite in ("micro", "all"):
+        from benchmarks.micro import run_micro
+        result["benchmarks"].update(run_micro(days=args.days, repeat=args.repeat or 20))
+
+    if args.suite in ("workflow", "all"):
+        from utils import replay
+        from benchmarks.workflow_bench import run_workflow
+        replay.set_mode(args.replay)
+        result["benchmarks"].update(run_workflow(
+            tickers=[t.strip() for t in args.tickers.split(",") if t.strip()],
+            repeat=args.repeat or 3,
+            concurrency=[int(c) for c in args.concurrency.split(",") if c.strip()],
+        ))
+
+    for name, entry in result["benchmarks"].items():
+        print(f"{name:<45} {entry['value']:>12.4f} {entry['unit']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare_results(result, baseline, args.threshold)
+        print(f"\n对比基准 {args.compare}（提交 {baseline.get('meta', {}).get('git_commit', '?')}）：")
+        for row in rows:
+            flag = "回退" if row["regression"] else ""
+            print(f"{row['name']:<45} {row['baseline']:>12.4f} -> {row['current']:>12.4f} {row['unit']:<7}"
+                  f" {row['change']:+.1%} {flag}")
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.common import summarize
+from utils import replay
+from utils.metrics import track_run
+
+
+def initial_state(ticker: str, start_date: str = "2024-03-10", end_date: str = "2025-03-10") -> Dict[str, Any]:
+    """构造一次工作流运行的初始状态
+
+    日期显式固定，原样参与录制键；其余由“今天”推导的参数（新闻筛选等）在录制和回放时都取自
+    replay.now() 固定的录制时间，因此之后任何一天回放都能命中录制数据。
+    """
+    from langchain_core.messages import HumanMessage
+
+    return {
+        "messages": [HumanMessage(content=f"请为以下股票提供详细分析，该股票代码为： {ticker}")],
+        "data": {
+            "market": "sh" if ticker.startswith("6") else "sz",
+            "ticker": ticker,
+            "start_date": start_date,
+            "end_date": end_date,
+            "num_of_news": 10,
+        },
+        "metadata": {"show_reasoning": False},
+    }
+
+
+def _invoke(app, ticker: str) -> Dict[str, Any]:
+    """运行一次完整工作流，返回墙钟耗时和各节点耗时（毫秒）
+
+    Raises:
+        ReplayMissError: 回放模式下有调用没有录制数据。各节点会吞掉外部调用的异常并继续，
+            不检查时测到的是走错误分支的耗时
+    """
+    misses_before = len(replay.misses())
+    with track_run() as report:
+        start = time.perf_counter()
+        app.invoke(initial_state(ticker))
+        elapsed = (time.perf_counter() - start) * 1000
+    missed = replay.misses()[misses_before:]
+    if missed:
+        raise replay.ReplayMissError(
+            f"回放缺少 {len(missed)} 条录制数据，请先用 --replay record 录制: " + "; ".join(missed[:5]))
+    nodes = report.summary()["calls"].get("node", {})
+    return {"ms": elapsed, "nodes": {name: entry["seconds"] * 1000 for name, entry in nodes.items()}}
+
+
+def run_workflow(tickers: List[str], repeat: int = 3, concurrency: List[int] = (1,),
+                 warmup: int = 1) -> Dict[str, Dict[str, Any]]:
+    """测量 workflow.app.invoke 的端到端耗时、节点耗时、峰值内存和并发吞吐
+
+    Args:
+        tickers: 参与测试的股票代码，轮流使用
+        repeat: 串行测量的次数（每个代码）
+        concurrency: 需要测量吞吐的并发数列表
+        warmup: 预热运行次数，用于完成模块导入和缓存初始化
+    """
+    from workflow import app
+
+    for i in range(warmup):
+        _invoke(app, tickers[i % len(tickers)])
+
+    results: Dict[str, Dict[str, Any]] = {}
+    latencies = []
+    node_samples = defaultdict(list)
+    for _ in range(repeat):
+        for ticker in tickers:
+            run = _invoke(app, ticker)
+            latencies.append(run["ms"])
+            for name, ms in run["nodes"].items():
+                node_samples[name].append(ms)
+    results["workflow.invoke"] = summarize(latencies)
+    for name, samples in sorted(node_samples.items()):
+        results[f"workflow.node.{name}"] = summarize(samples)
+
+    # 单独运行一次测量内存，tracemalloc 会拖慢执行，不与耗时测量混在一起
+    tracemalloc.start()
+    try:
+        _invoke(app, tickers[0])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    results["workflow.peak_memory"] = {"value": round(peak / 1024 / 1024, 3), "unit": "MB", "better": "lower"}
+
+    for workers in concurrency:
+        total = max(workers, len(tickers)) * repeat
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            runs = list(executor.map(lambda i: _invoke(app, tickers[i % len(tickers)]), range(total)))
+        elapsed = time.perf_counter() - start
+        entry = {"value": round(total / elapsed, 4), "unit": "runs/s", "better": "higher",
+                 "runs": total, "workers": workers}
+        latency = summarize([run["ms"] for run in runs])
+        entry.update({"latency_p50_ms": latency["value"], "latency_p95_ms": latency["p95"],
+                      "latency_max_ms": latency["max"]})
+        results[f"workflow.throughput.c{workers}"] = entry
+    return results
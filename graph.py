@@ -1,17 +1,21 @@
-import os
 from dotenv import load_dotenv 
 from langchain_deepseek import ChatDeepSeek
 from langgraph.prebuilt import create_react_agent
 from langchain_core.tools import tool
+from langchain_core.messages import SystemMessage
 from pydantic import BaseModel, Field
-import matplotlib
 import json
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
-import pymysql
 from langchain_tavily import TavilySearch
 from model import doubao_llm
+from utils.python_runner import run_python_code, summarize_value
+from utils.figure_renderer import render_figure
+from utils.db import get_connection
+from utils.schema_catalog import schema_catalog
+from utils.local_engine import get_local_engine
+from utils.query_cache import cached_query
 
 # 加载环境变量
 load_dotenv(override=True)
@@ -44,34 +48,41 @@ def sql_inter(sql_query: str) -> str:
     """
     # print("正在调用 sql_inter 工具运行 SQL 查询...")
     
-    # 加载环境变量
-    load_dotenv(override=True)
-    host = os.getenv('HOST')
-    user = os.getenv('USER')
-    mysql_pw = os.getenv('MYSQL_PW')
-    db = os.getenv('DB_NAME')
-    port = os.getenv('PORT')
-    
     # 创建连接
-    connection = pymysql.connect(
-        host=host,
-        user=user,
-        passwd=mysql_pw,
-        db=db,
-        port=int(port),
-        charset='utf8'
-    )
+    connection = get_connection()
     
-    try:
+    def run_query():
         with connection.cursor() as cursor:
             cursor.execute(sql_query)
             results = cursor.fetchall()
             # print("SQL 查询已成功执行，正在整理结果...")
+        # 将结果以 JSON 字符串形式返回
+        return json.dumps(results, ensure_ascii=False)
+
+    try:
+        # 只读查询优先读取结果缓存，表版本变化时自动失效
+        return cached_query(connection, sql_query, run_query)
     finally:
         connection.close()
 
-    # 将结果以 JSON 字符串形式返回
-    return json.dumps(results, ensure_ascii=False)
+# ✅ 创建表结构查询工具
+class SchemaQuerySchema(BaseModel):
+    table_name: str = Field(default="", description="要查看结构的表名，为空时返回全部表的结构。")
+    refresh: bool = Field(default=False, description="是否强制从数据库重新加载表结构，仅在表结构发生变化时使用。")
+
+@tool(args_schema=SchemaQuerySchema)
+def get_schema(table_name: str = "", refresh: bool = False) -> str:
+    """
+    查询MySQL数据库中各张表的结构，包括列名、字段类型、行数和样例值。
+    表结构已缓存在本地，调用开销很小，编写SQL前请使用本函数，而不是通过sql_inter执行SHOW TABLES或DESCRIBE。
+    :param table_name: 要查看的表名，为空时返回全部表
+    :param refresh: 是否强制重新加载表结构
+    :return：表结构描述
+    """
+    try:
+        return schema_catalog.describe(table_name or None, refresh=refresh)
+    except Exception as e:
+        return f"❌ 表结构查询失败：{e}"
 
 # ✅ 创建数据提取工具
 # 定义结构化参数
@@ -92,22 +103,8 @@ def extract_data(sql_query: str, df_name: str) -> str:
     """
     print("正在调用 extract_data 工具运行 SQL 查询...")
     
-    load_dotenv(override=True)
-    host = os.getenv('HOST')
-    user = os.getenv('USER')
-    mysql_pw = os.getenv('MYSQL_PW')
-    db = os.getenv('DB_NAME')
-    port = os.getenv('PORT')
-
     # 创建数据库连接
-    connection = pymysql.connect(
-        host=host,
-        user=user,
-        passwd=mysql_pw,
-        db=db,
-        port=int(port),
-        charset='utf8'
-    )
+    connection = get_connection()
 
     try:
         # 执行 SQL 并保存为全局变量
@@ -120,6 +117,35 @@ def extract_data(sql_query: str, df_name: str) -> str:
     finally:
         connection.close()
 
+# ✅ 创建本地分析查询工具
+class LocalSQLSchema(BaseModel):
+    sql_query: str = Field(description="在本地DuckDB引擎中执行的SQL语句，可直接查询已提取的pandas变量及本地CSV文件。")
+    df_name: str = Field(default="", description="可选，将查询结果保存为的pandas变量名，为空时只返回结果摘要。")
+
+@tool(args_schema=LocalSQLSchema)
+def local_sql(sql_query: str, df_name: str = "") -> str:
+    """
+    当需要对已通过extract_data提取到本地的数据表或本地CSV文件（如telco_data）进行聚合、分组、筛选等分析时，请调用该函数。
+    该函数使用本地DuckDB列式引擎执行SQL，当前Python环境中的每个pandas DataFrame都可以按变量名作为表名直接查询，
+    本地CSV文件以文件名（不含扩展名）作为表名，无需再次访问MySQL。
+    :param sql_query: DuckDB SQL查询语句，例如 SELECT Contract, AVG(MonthlyCharges) FROM telco_data GROUP BY Contract
+    :param df_name: 可选，保存查询结果的pandas变量名
+    :return：查询结果摘要
+    """
+    g = globals()
+    engine = get_local_engine()
+    try:
+        df = engine.query(sql_query, g)
+    except Exception as e:
+        return f"❌ 执行失败：{e}"
+    conflicts = engine.conflicts()
+    note = f"⚠️ pandas 对象 {', '.join(f'`{n}`' for n in conflicts)} 与本地CSV同名，同名查询读取的是pandas对象而非CSV。\n" \
+        if conflicts else ""
+    if df_name:
+        g[df_name] = df
+        return f"{note}✅ 查询结果已保存为 pandas 对象 `{df_name}`：\n{summarize_value(df)}"
+    return note + summarize_value(df)
+
 # ✅创建Python代码执行工具
 # Python代码执行工具结构化参数说明
 class PythonCodeInput(BaseModel):
@@ -131,27 +157,7 @@ def python_inter(py_code):
     当用户需要编写Python程序并执行时，请调用该函数。
     该函数可以执行一段Python代码并返回最终结果，需要注意，本函数只能执行非绘图类的代码，若是绘图相关代码，则需要调用fig_inter函数运行。
     """    
-    g = globals()
-    try:
-        # 尝试如果是表达式，则返回表达式运行结果
-        return str(eval(py_code, g))
-    # 若报错，则先测试是否是对相同变量重复赋值
-    except Exception as e:
-        global_vars_before = set(g.keys())
-        try:            
-            exec(py_code, g)
-        except Exception as e:
-            return f"代码执行时报错{e}"
-        global_vars_after = set(g.keys())
-        new_vars = global_vars_after - global_vars_before
-        # 若存在新变量
-        if new_vars:
-            result = {var: g[var] for var in new_vars}
-            # print("代码已顺利执行，正在进行结果梳理...")
-            return str(result)
-        else:
-            # print("代码已顺利执行，正在进行结果梳理...")
-            return "已经顺利执行代码"
+    return run_python_code(py_code, globals())
 
 # ✅ 创建绘图工具
 # 绘图工具结构化参数说明
@@ -170,6 +176,7 @@ def fig_inter(py_code: str, fname: str) -> str:
     3. 不要使用 `plt.show()`。
     4. 请确保代码最后调用 `fig.tight_layout()`。
     5. 所有绘图代码中，坐标轴标签（xlabel、ylabel）、标题（title）、图例（legend）等文本内容，必须使用英文描述。
+    6. 数据量很大时，可先调用 `downsample(df)` 对数据降采样后再绘图。
 
     示例代码：
     fig = plt.figure(figsize=(10,6))
@@ -178,35 +185,15 @@ def fig_inter(py_code: str, fname: str) -> str:
     """
     # print("正在调用fig_inter工具运行Python代码...")
 
-    current_backend = matplotlib.get_backend()
-    matplotlib.use('Agg')
-
     local_vars = {"plt": plt, "pd": pd, "sns": sns}
-    
-    # ✅ 设置图像保存路径（你自己的绝对路径）
-    base_dir = r"C:\Users\wh-Du\Desktop"
-    images_dir = os.path.join(base_dir, "images")
-    os.makedirs(images_dir, exist_ok=True)  # ✅ 自动创建 images 文件夹（如不存在）
     try:
-        g = globals()
-        exec(py_code, g, local_vars)
-        g.update(local_vars)
-
-        fig = local_vars.get(fname, None)
-        if fig:
-            image_filename = f"{fname}.png"
-            abs_path = os.path.join(images_dir, image_filename)  # ✅ 绝对路径
-            rel_path = os.path.join("images", image_filename)    # ✅ 返回相对路径（给前端用）
-
-            fig.savefig(abs_path, bbox_inches='tight')
+        rel_path = render_figure(py_code, fname, globals(), local_vars)
+        if rel_path:
             return f"✅ 图片已保存，路径为: {rel_path}"
         else:
             return "⚠️ 图像对象未找到，请确认变量名正确并为 matplotlib 图对象。"
     except Exception as e:
         return f"❌ 执行失败：{e}"
-    finally:
-        plt.close('all')
-        matplotlib.use(current_backend)
 
 # ✅ 创建提示词模板
 prompt = """
@@ -215,27 +202,33 @@ prompt = """
 1. **数据库查询：**
    - 当用户需要获取数据库中某些数据或进行SQL查询时，请调用`sql_inter`工具，该工具已经内置了pymysql连接MySQL数据库的全部参数，包括数据库名称、用户名、密码、端口等，你只需要根据用户需求生成SQL语句即可。
    - 你需要准确根据用户请求生成SQL语句，例如 `SELECT * FROM 表名` 或包含条件的查询。
+   - 数据库表结构已附在本提示词末尾，如需查看更多细节请调用`get_schema`工具，不要通过`sql_inter`执行SHOW TABLES、DESCRIBE等元数据查询。
 
 2. **数据表提取：**
    - 当用户希望将数据库中的表格导入Python环境进行后续分析时，请调用`extract_data`工具。
    - 你需要根据用户提供的表名或查询条件生成SQL查询语句，并将数据保存到指定的pandas变量中。
 
-3. **非绘图累任务的Python代码执行：**
+3. **本地数据分析查询：**
+   - 当数据已通过`extract_data`提取到Python环境，或需要分析本地CSV文件（如`telco_data`）时，请优先调用`local_sql`工具，用SQL完成聚合、分组、筛选等计算。
+   - pandas变量名和CSV文件名（不含扩展名）可直接作为表名使用，无需再次查询MySQL。
+
+4. **非绘图累任务的Python代码执行：**
    - 当用户需要执行Python脚本或进行数据处理、统计计算时，请调用`python_inter`工具。
    - 仅限执行非绘图类代码，例如变量定义、数据分析等。
 
-4. **绘图类Python代码执行：**
+5. **绘图类Python代码执行：**
    - 当用户需要进行可视化展示（如生成图表、绘制分布等）时，请调用`fig_inter`工具。
    - 你可以直接读取数据并进行绘图，不需要借助`python_inter`工具读取图片。
    - 你应根据用户需求编写绘图代码，并正确指定绘图对象变量名（如 `fig`）。
    - 当你生成Python绘图代码时必须指明图像的名称，如fig = plt.figure()或fig = plt.subplots()创建图像对象，并赋值为fig。
    - 不要调用plt.show()，否则图像将无法保存。
 
-5. **网络搜索：**
+6. **网络搜索：**
    - 当用户提出与数据分析无关的问题（如最新新闻、实时信息），请调用`search_tool`工具。
 
 **工具使用优先级：**
 - 如需数据库数据，请先使用`sql_inter`或`extract_data`获取，再执行Python分析或绘图。
+- 对已提取数据的聚合统计，优先使用`local_sql`，再使用`python_inter`。
 - 如需绘图，请先确保数据已加载为pandas对象。
 
 **回答要求：**
@@ -253,11 +246,19 @@ prompt = """
 """
 
 # ✅ 创建工具列表
-tools = [search_tool, python_inter, fig_inter, sql_inter, extract_data]
+tools = [search_tool, python_inter, fig_inter, sql_inter, extract_data, get_schema, local_sql]
 
 # ✅ 创建模型
 # model = ChatDeepSeek(model="deepseek-chat")
 model = doubao_llm
 
+# ✅ 将缓存的表结构注入系统提示词
+def build_prompt(state):
+    schema_text = schema_catalog.prompt_text()
+    content = prompt
+    if schema_text:
+        content += f"\n**数据库表结构：**\n{schema_text}\n"
+    return [SystemMessage(content=content)] + list(state["messages"])
+
 # ✅ 创建图 （Agent）
-graph = create_react_agent(model=model, tools=tools, prompt=prompt)
\ No newline at end of file
+graph = create_react_agent(model=model, tools=tools, prompt=build_prompt)
\ No newline at end of file
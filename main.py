@@ -1,11 +1,12 @@
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-from utils.output_logger import OutputLogger
+from utils.output_logger import OutputLogger, OUTPUT_LOG_MIRROR
 import sys
 
 # Initialize output logging
-sys.stdout = OutputLogger()
+if OUTPUT_LOG_MIRROR:
+    sys.stdout = OutputLogger()
 
 
 from backend import flask_app
@@ -1,14 +1,21 @@
 import os
 from dotenv import load_dotenv
 from utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
+from utils.metrics import count, timed
+from utils.tracing import set_span_attributes
+from utils.replay import replayable
 from langchain_openai import ChatOpenAI
 from langchain_deepseek import ChatDeepSeek
 from langchain.schema import HumanMessage, SystemMessage
 import time
+import logging
 
 load_dotenv(override=True)
 logger = setup_logger(',LLM_calls')
 
+# 调试日志中记录的LLM原始响应最大长度
+LLM_LOG_MAX_CHARS = int(os.getenv("LLM_LOG_MAX_CHARS", "2000"))
+
 api_key = os.getenv("DOUBAO_API_KEY")
 model = os.getenv("DOUBAO_MODEL", "doubao-1-5-pro-32k-250115")
 
@@ -26,6 +33,7 @@ doubao_llm = ChatOpenAI(
 )
 ds_llm = model = ChatDeepSeek(model="deepseek-chat")
 
+@replayable("llm", "get_chat_completion")
 def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay=1):
     model_name = model or os.getenv("DOUBAO_MODEL", "doubao-1-5-pro-256k-250115")
     logger.info(f"{WAIT_ICON} 使用模型: {model_name}")
@@ -55,10 +63,19 @@ def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay
             lc_msgs.append(HumanMessage(content=content))
 
     for attempt in range(max_retries):
+        if attempt > 0:
+            count("llm_retries", model=model_name)
         try:
-            resp = llm.invoke(lc_msgs)
+            with timed("llm", model_name):
+                resp = llm.invoke(lc_msgs)
+                usage = getattr(resp, "usage_metadata", None) or {}
+                set_span_attributes(attempt=attempt, input_tokens=usage.get("input_tokens", 0),
+                                    output_tokens=usage.get("output_tokens", 0))
+            count("llm_input_tokens", usage.get("input_tokens", 0), model=model_name)
+            count("llm_output_tokens", usage.get("output_tokens", 0), model=model_name)
             text = resp.content
-            logger.debug(f"API 原始响应: {text}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("API 原始响应: %s", text[:LLM_LOG_MAX_CHARS])
             logger.info(f"{SUCCESS_ICON} 成功获取响应")
             return text
         except Exception as e:
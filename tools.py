@@ -1,11 +1,12 @@
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 from langchain_tavily import TavilySearch
-import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
-import os
+
+from utils.python_runner import run_python_code
+from utils.figure_renderer import render_figure
 
 search_tool = TavilySearch(max_results=3, topic="general")
 
@@ -19,27 +20,7 @@ def python_inter(py_code):
     当用户需要编写Python程序并执行时，请调用该函数。
     该函数可以执行一段Python代码并返回最终结果，需要注意，本函数只能执行非绘图类的代码，若是绘图相关代码，则需要调用fig_inter函数运行。
     """    
-    g = globals()
-    try:
-        # 尝试如果是表达式，则返回表达式运行结果
-        return str(eval(py_code, g))
-    # 若报错，则先测试是否是对相同变量重复赋值
-    except Exception as e:
-        global_vars_before = set(g.keys())
-        try:            
-            exec(py_code, g)
-        except Exception as e:
-            return f"代码执行时报错{e}"
-        global_vars_after = set(g.keys())
-        new_vars = global_vars_after - global_vars_before
-        # 若存在新变量
-        if new_vars:
-            result = {var: g[var] for var in new_vars}
-            # print("代码已顺利执行，正在进行结果梳理...")
-            return str(result)
-        else:
-            # print("代码已顺利执行，正在进行结果梳理...")
-            return "已经顺利执行代码"
+    return run_python_code(py_code, globals())
 
 class FigCodeInput(BaseModel):
     py_code: str = Field(description="要执行的 Python 绘图代码，必须使用 matplotlib/seaborn 创建图像并赋值给变量")
@@ -57,6 +38,7 @@ def fig_inter(py_code: str, fname: str) -> str:
     3. 不要使用 `plt.show()`。
     4. 请确保代码最后调用 `fig.tight_layout()`。
     5. 所有绘图代码中，坐标轴标签（xlabel、ylabel）、标题（title）、图例（legend）等文本内容，必须使用英文描述。
+    6. 数据量很大时，可先调用 `downsample(df)` 对数据降采样后再绘图。
 
     示例代码：
     fig = plt.figure(figsize=(10,6))
@@ -65,34 +47,14 @@ def fig_inter(py_code: str, fname: str) -> str:
     """
     # print("正在调用fig_inter工具运行Python代码...")
 
-    current_backend = matplotlib.get_backend()
-    matplotlib.use('Agg')
-
     local_vars = {"plt": plt, "pd": pd, "sns": sns}
-    
-    # ✅ 设置图像保存路径（你自己的绝对路径）
-    base_dir = r"C:\Users\wh-Du\Desktop"
-    images_dir = os.path.join(base_dir, "images")
-    os.makedirs(images_dir, exist_ok=True)  # ✅ 自动创建 images 文件夹（如不存在）
     try:
-        g = globals()
-        exec(py_code, g, local_vars)
-        g.update(local_vars)
-
-        fig = local_vars.get(fname, None)
-        if fig:
-            image_filename = f"{fname}.png"
-            abs_path = os.path.join(images_dir, image_filename)  # ✅ 绝对路径
-            rel_path = os.path.join("images", image_filename)    # ✅ 返回相对路径（给前端用）
-
-            fig.savefig(abs_path, bbox_inches='tight')
+        rel_path = render_figure(py_code, fname, globals(), local_vars)
+        if rel_path:
             return f"✅ 图片已保存，路径为: {rel_path}"
         else:
             return "⚠️ 图像对象未找到，请确认变量名正确并为 matplotlib 图对象。"
     except Exception as e:
         return f"❌ 执行失败：{e}"
-    finally:
-        plt.close('all')
-        matplotlib.use(current_backend)
 
 tools = [search_tool, python_inter, fig_inter]
\ No newline at end of file
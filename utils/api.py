@@ -3,7 +3,10 @@ import pandas as pd
 import akshare as ak
 from datetime import datetime, timedelta
 import numpy as np
+import logging
 from utils.logging_config import setup_logger
+from utils.metrics import instrument_module, timed
+from utils import replay
 import ta
 from langchain_tavily import TavilySearch, TavilyExtract
 from model import get_chat_completion
@@ -14,6 +17,9 @@ load_dotenv(override=True)
 # 设置日志记录
 logger = setup_logger('api')
 
+# akshare 调用统一经过统计代理，记录每个接口的调用次数和耗时
+ak = instrument_module(ak, "akshare")
+
 
 # def get_financial_metrics(symbol: str) -> Dict[str, Any]:
 #     """获取财务指标数据"""
@@ -36,7 +42,7 @@ logger = setup_logger('api')
 
 #         # 获取新浪财务指标
 #         logger.info("Fetching Sina financial indicators...")
-#         current_year = datetime.now().year
+#         current_year = replay.now().year
 #         financial_data = ak.stock_financial_analysis_indicator(
 #             symbol=symbol, start_year=str(current_year-1))
 #         if financial_data is None or financial_data.empty:
@@ -185,7 +191,7 @@ def get_financial_metrics(symbol: str) -> Dict[str, Any]:
 
         # 获取新浪财务指标
         logger.info("Fetching Sina financial indicators...")
-        current_year = datetime.now().year
+        current_year = replay.now().year
         financial_data = ak.stock_financial_analysis_indicator(
             symbol=symbol, start_year=str(current_year - 1)
         )
@@ -275,13 +281,11 @@ def get_financial_metrics(symbol: str) -> Dict[str, Any]:
 
             logger.info("✓ Indicators built successfully")
 
-            logger.debug("\n获取到的完整指标数据：")
-            for key, value in all_metrics.items():
-                logger.debug(f"{key}: {value}")
-
-            logger.debug("\n传递给 agent 的指标数据：")
-            for key, value in agent_metrics.items():
-                logger.debug(f"{key}: {value}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("\n获取到的完整指标数据：\n%s", "\n".join(
+                    f"{key}: {value}" for key, value in all_metrics.items()))
+                logger.debug("\n传递给 agent 的指标数据：\n%s", "\n".join(
+                    f"{key}: {value}" for key, value in agent_metrics.items()))
 
             return [agent_metrics]
 
@@ -446,7 +450,7 @@ def get_market_data(symbol: str, market:str = "sh") -> Dict[str, Any]:
         market_cap = df.iloc[0].get("总市值")
         # 获取最近交易日数据（防止周末或节假日无数据）
         # 今天日期
-        today = datetime.today()
+        today = replay.now()
         # 去年今日
         last_year_today = today.replace(year=today.year - 1)
         # 转换为 YYMMDD 格式
@@ -474,6 +478,129 @@ def get_market_data(symbol: str, market:str = "sh") -> Dict[str, Any]:
         return {}
 
 
+def calculate_hurst(series):
+    """
+    计算Hurst指数。
+
+    Args:
+        series: 价格序列
+
+    Returns:
+        float: Hurst指数，或在计算失败时返回np.nan
+    """
+    try:
+        series = series.dropna()
+        if len(series) < 30:  # 降低最小数据点要求
+            return np.nan
+
+        # 使用对数收益率
+        log_returns = np.log(series / series.shift(1)).dropna()
+        if len(log_returns) < 30:  # 降低最小数据点要求
+            return np.nan
+
+        # 使用更小的lag范围
+        # 减少lag范围到2-10天
+        lags = range(2, min(11, len(log_returns) // 4))
+
+        # 计算每个lag的标准差
+        tau = []
+        for lag in lags:
+            # 计算滚动标准差
+            std = log_returns.rolling(window=lag).std().dropna()
+            if len(std) > 0:
+                tau.append(np.mean(std))
+
+        # 基本的数值检查
+        if len(tau) < 3:  # 进一步降低最小要求
+            return np.nan
+
+        # 使用对数回归
+        lags_log = np.log(list(lags))
+        tau_log = np.log(tau)
+
+        # 计算回归系数
+        reg = np.polyfit(lags_log, tau_log, 1)
+        hurst = reg[0] / 2.0
+
+        # 只保留基本的数值检查
+        if np.isnan(hurst) or np.isinf(hurst):
+            return np.nan
+
+        return hurst
+
+    except Exception as e:
+        return np.nan
+
+
+def add_price_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    """在重命名后的日线数据上计算动量、波动率和统计套利指标
+
+    Args:
+        df: 包含 date/open/high/low/close/volume 列的日线数据
+
+    Returns:
+        添加了技术指标列的同一个DataFrame
+    """
+    # 计算动量指标
+    df["momentum_1m"] = df["close"].pct_change(periods=20)  # 20个交易日约等于1个月
+    df["momentum_3m"] = df["close"].pct_change(periods=60)  # 60个交易日约等于3个月
+    df["momentum_6m"] = df["close"].pct_change(
+        periods=120)  # 120个交易日约等于6个月
+
+    # 计算成交量动量（相对于20日平均成交量的变化）
+    df["volume_ma20"] = df["volume"].rolling(window=20).mean()
+    df["volume_momentum"] = df["volume"] / df["volume_ma20"]
+
+    # 计算波动率指标
+    # 1. 历史波动率 (20日)
+    returns = df["close"].pct_change()
+    df["historical_volatility"] = returns.rolling(
+        window=20).std() * np.sqrt(252)  # 年化
+
+    # 2. 波动率区间 (相对于过去120天的波动率的位置)
+    volatility_120d = returns.rolling(window=120).std() * np.sqrt(252)
+    vol_min = volatility_120d.rolling(window=120).min()
+    vol_max = volatility_120d.rolling(window=120).max()
+    vol_range = vol_max - vol_min
+    df["volatility_regime"] = np.where(
+        vol_range > 0,
+        (df["historical_volatility"] - vol_min) / vol_range,
+        0  # 当范围为0时返回0
+    )
+
+    # 3. 波动率Z分数
+    vol_mean = df["historical_volatility"].rolling(window=120).mean()
+    vol_std = df["historical_volatility"].rolling(window=120).std()
+    df["volatility_z_score"] = (
+        df["historical_volatility"] - vol_mean) / vol_std
+
+    # 4. ATR比率
+    tr = pd.DataFrame()
+    tr["h-l"] = df["high"] - df["low"]
+    tr["h-pc"] = abs(df["high"] - df["close"].shift(1))
+    tr["l-pc"] = abs(df["low"] - df["close"].shift(1))
+    tr["tr"] = tr[["h-l", "h-pc", "l-pc"]].max(axis=1)
+    df["atr"] = tr["tr"].rolling(window=14).mean()
+    df["atr_ratio"] = df["atr"] / df["close"]
+
+    # 计算统计套利指标
+    # 1. 赫斯特指数 (使用过去120天的数据)
+    # 使用对数收益率计算Hurst指数
+    log_returns = np.log(df["close"] / df["close"].shift(1))
+    df["hurst_exponent"] = log_returns.rolling(
+        window=120,
+        min_periods=60  # 要求至少60个数据点
+    ).apply(calculate_hurst)
+
+    # 2. 偏度 (20日)
+    df["skewness"] = returns.rolling(window=20).skew()
+
+    # 3. 峰度 (20日)
+    df["kurtosis"] = returns.rolling(window=20).kurt()
+
+    return df
+
+
 def get_price_history(symbol: str, start_date: str = None, end_date: str = None, adjust: str = "qfq") -> pd.DataFrame:
     """获取历史价格数据
 
@@ -515,7 +642,7 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
     """
     try:
         # 获取当前日期和昨天的日期
-        current_date = datetime.now()
+        current_date = replay.now()
         yesterday = current_date - timedelta(days=1)
 
         # 如果没有提供日期，默认使用昨天作为结束日期
@@ -538,7 +665,7 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
 
         def get_and_process_data(start_date, end_date):
             """获取并处理数据，包括重命名列等操作"""
-            logger.info(f"Procession from start_date {start_date.strftime("%Y%m%d")} to end_data {end_date.strftime("%Y%m%d")}")
+            logger.info(f"Procession from start_date {start_date.strftime('%Y%m%d')} to end_data {end_date.strftime('%Y%m%d')}")
             df = ak.stock_zh_a_hist(
                 symbol=symbol,
                 period="daily",
@@ -592,115 +719,7 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
                 logger.warning(
                     f"Warning: Even with extended time range, insufficient data ({len(df)} days)")
 
-        # 计算动量指标
-        df["momentum_1m"] = df["close"].pct_change(periods=20)  # 20个交易日约等于1个月
-        df["momentum_3m"] = df["close"].pct_change(periods=60)  # 60个交易日约等于3个月
-        df["momentum_6m"] = df["close"].pct_change(
-            periods=120)  # 120个交易日约等于6个月
-
-        # 计算成交量动量（相对于20日平均成交量的变化）
-        df["volume_ma20"] = df["volume"].rolling(window=20).mean()
-        df["volume_momentum"] = df["volume"] / df["volume_ma20"]
-
-        # 计算波动率指标
-        # 1. 历史波动率 (20日)
-        returns = df["close"].pct_change()
-        df["historical_volatility"] = returns.rolling(
-            window=20).std() * np.sqrt(252)  # 年化
-
-        # 2. 波动率区间 (相对于过去120天的波动率的位置)
-        volatility_120d = returns.rolling(window=120).std() * np.sqrt(252)
-        vol_min = volatility_120d.rolling(window=120).min()
-        vol_max = volatility_120d.rolling(window=120).max()
-        vol_range = vol_max - vol_min
-        df["volatility_regime"] = np.where(
-            vol_range > 0,
-            (df["historical_volatility"] - vol_min) / vol_range,
-            0  # 当范围为0时返回0
-        )
-
-        # 3. 波动率Z分数
-        vol_mean = df["historical_volatility"].rolling(window=120).mean()
-        vol_std = df["historical_volatility"].rolling(window=120).std()
-        df["volatility_z_score"] = (
-            df["historical_volatility"] - vol_mean) / vol_std
-
-        # 4. ATR比率
-        tr = pd.DataFrame()
-        tr["h-l"] = df["high"] - df["low"]
-        tr["h-pc"] = abs(df["high"] - df["close"].shift(1))
-        tr["l-pc"] = abs(df["low"] - df["close"].shift(1))
-        tr["tr"] = tr[["h-l", "h-pc", "l-pc"]].max(axis=1)
-        df["atr"] = tr["tr"].rolling(window=14).mean()
-        df["atr_ratio"] = df["atr"] / df["close"]
-
-        # 计算统计套利指标
-        # 1. 赫斯特指数 (使用过去120天的数据)
-        def calculate_hurst(series):
-            """
-            计算Hurst指数。
-
-            Args:
-                series: 价格序列
-
-            Returns:
-                float: Hurst指数，或在计算失败时返回np.nan
-            """
-            try:
-                series = series.dropna()
-                if len(series) < 30:  # 降低最小数据点要求
-                    return np.nan
-
-                # 使用对数收益率
-                log_returns = np.log(series / series.shift(1)).dropna()
-                if len(log_returns) < 30:  # 降低最小数据点要求
-                    return np.nan
-
-                # 使用更小的lag范围
-                # 减少lag范围到2-10天
-                lags = range(2, min(11, len(log_returns) // 4))
-
-                # 计算每个lag的标准差
-                tau = []
-                for lag in lags:
-                    # 计算滚动标准差
-                    std = log_returns.rolling(window=lag).std().dropna()
-                    if len(std) > 0:
-                        tau.append(np.mean(std))
-
-                # 基本的数值检查
-                if len(tau) < 3:  # 进一步降低最小要求
-                    return np.nan
-
-                # 使用对数回归
-                lags_log = np.log(list(lags))
-                tau_log = np.log(tau)
-
-                # 计算回归系数
-                reg = np.polyfit(lags_log, tau_log, 1)
-                hurst = reg[0] / 2.0
-
-                # 只保留基本的数值检查
-                if np.isnan(hurst) or np.isinf(hurst):
-                    return np.nan
-
-                return hurst
-
-            except Exception as e:
-                return np.nan
-
-        # 使用对数收益率计算Hurst指数
-        log_returns = np.log(df["close"] / df["close"].shift(1))
-        df["hurst_exponent"] = log_returns.rolling(
-            window=120,
-            min_periods=60  # 要求至少60个数据点
-        ).apply(calculate_hurst)
-
-        # 2. 偏度 (20日)
-        df["skewness"] = returns.rolling(window=20).skew()
-
-        # 3. 峰度 (20日)
-        df["kurtosis"] = returns.rolling(window=20).kurt()
+        df = add_price_indicators(df)
 
         # 按日期升序排序
         df = df.sort_values("date")
@@ -826,7 +845,7 @@ def get_short_term_data(market, ticker, period="1", adjust="qfq"):
 
 def get_long_term_data(market, ticker):
     logger.info("正在获取长线数据...")
-    today = datetime.now().strftime('%Y%m%d')
+    today = replay.now().strftime('%Y%m%d')
     # 获取现金流
     cashflow = None
     try:
@@ -873,9 +892,11 @@ def get_long_term_data(market, ticker):
         search = TavilySearch(max_results=3, topic="general")
         extract = TavilyExtract(extract_depth="basic",include_images=False)
         company_name = ak.stock_individual_info_em(ticker).iloc[2].get('value')
-        results = search.run(f"{company_name} 战略方向")
+        with timed("tavily", "search"):
+            results = replay.call("tavily", "search", search.run, f"{company_name} 战略方向")
         url = results["results"][0]['url']
-        page_text = extract.invoke({"urls": [url]})["results"][0]["raw_content"]
+        with timed("tavily", "extract"):
+            page_text = replay.call("tavily", "extract", extract.invoke, {"urls": [url]})["results"][0]["raw_content"]
         system_message = {
         "role": "system",
         "content": """你是一个专业的公司战略分析师，通过用户给你的某家公司的战略信息，并结合当下社会发展趋势和发展热点，总结概括出该公司的战略方向和发展前景，切记在分析发展前景时保持批判性思维，从多方面考虑。
@@ -0,0 +1,23 @@
+import os
+
+import pymysql
+from dotenv import load_dotenv
+
+
+def get_connection():
+    """根据环境变量创建 MySQL 连接
+
+    连接参数来自 HOST、USER、MYSQL_PW、DB_NAME、PORT 环境变量。
+
+    Returns:
+        pymysql 连接对象，使用完毕后由调用方关闭
+    """
+    load_dotenv(override=True)
+    return pymysql.connect(
+        host=os.getenv('HOST'),
+        user=os.getenv('USER'),
+        passwd=os.getenv('MYSQL_PW'),
+        db=os.getenv('DB_NAME'),
+        port=int(os.getenv('PORT')),
+        charset='utf8'
+    )
@@ -0,0 +1,299 @@
+import ast
+import datetime
+import decimal
+import hashlib
+import os
+import threading
+import types
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+import matplotlib
+# 只在导入时切换一次后端，不再在每次绘图时来回修改全局 backend
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from utils.logging_config import setup_logger
+
+logger = setup_logger('figure_renderer')
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 图片输出目录及返回给前端的相对路径前缀
+FIG_OUTPUT_DIR = os.getenv("FIG_OUTPUT_DIR", os.path.join(project_root, "images"))
+FIG_URL_PREFIX = os.getenv("FIG_URL_PREFIX", "images")
+FIG_RENDER_TIMEOUT = float(os.getenv("FIG_RENDER_TIMEOUT", "120"))
+FIG_DPI = int(os.getenv("FIG_DPI", "100"))
+# 单条折线超过该点数时降采样
+FIG_MAX_POINTS = int(os.getenv("FIG_MAX_POINTS", "5000"))
+# 散点等集合超过该点数时栅格化输出
+FIG_RASTERIZE_THRESHOLD = int(os.getenv("FIG_RASTERIZE_THRESHOLD", "10000"))
+
+# pyplot 的全局状态不是线程安全的，绘图代码必须串行执行，多个渲染线程也只会在锁上排队；
+# 渲染线程只负责把绘图和保存移出调用线程，因此固定为一个
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fig-render")
+_pyplot_lock = threading.Lock()
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def downsample(data, max_points: int = FIG_MAX_POINTS):
+    """按固定步长对 DataFrame/Series/数组降采样，供绘图代码在绘图前调用
+
+    Args:
+        data: DataFrame、Series、ndarray 或 list
+        max_points: 最多保留的点数
+
+    Returns:
+        与输入同类型的降采样结果
+    """
+    n = len(data)
+    if n <= max_points:
+        return data
+    step = int(np.ceil(n / max_points))
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        return data.iloc[::step]
+    return data[::step]
+
+
+class _Unfingerprintable(Exception):
+    """变量的内容无法计算指纹"""
+
+
+# repr 能完整表示内容的标量类型
+_SCALARS = (int, float, complex, str, bytes, bool, type(None), np.generic, datetime.date, datetime.time,
+            datetime.timedelta, decimal.Decimal)
+# 这些对象不影响图片内容
+_IGNORED = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, type)
+# 绘图模块，由它们派生出的对象（fig、ax 等）只与图片有关
+_PLOT_ROOTS = {"plt", "sns", "matplotlib", "mpl"}
+# 原地修改容器或表格的方法
+_MUTATORS = {"append", "extend", "insert", "pop", "popitem", "remove", "clear", "update", "sort", "reverse",
+             "setdefault", "add", "discard"}
+
+
+def _sha1(*parts: str) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _fingerprint(value, depth: int = 0) -> Optional[str]:
+    """计算绘图代码引用的变量的内容指纹，数据变化时图片哈希随之变化
+
+    容器递归计算每个元素的指纹后再取 sha1，不截断、不依赖 repr 的省略显示。
+
+    Returns:
+        指纹；模块、函数等不影响图片内容的对象返回 None
+
+    Raises:
+        _Unfingerprintable: 内容无法计算指纹，此时不应缓存图片
+    """
+    if depth > 50:
+        raise _Unfingerprintable("嵌套层数过深")
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        try:
+            hashed = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        except TypeError as e:
+            # 单元格为 list 等不可哈希对象
+            raise _Unfingerprintable(str(e)) from e
+        columns = _fingerprint(list(value.columns), depth + 1) if isinstance(value, pd.DataFrame) else str(value.name)
+        return _sha1(type(value).__name__, str(value.shape), columns, hashlib.sha1(hashed.tobytes()).hexdigest())
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return _sha1("ndarray", str(value.shape), _fingerprint(value.ravel().tolist(), depth + 1))
+        return _sha1("ndarray", str(value.shape), str(value.dtype),
+                     hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, _SCALARS):
+        return f"{type(value).__name__}:{value!r}"
+    if isinstance(value, (list, tuple)):
+        return _sha1(type(value).__name__, *(str(_fingerprint(item, depth + 1)) for item in value))
+    if isinstance(value, (set, frozenset)):
+        return _sha1(type(value).__name__, *sorted(str(_fingerprint(item, depth + 1)) for item in value))
+    if isinstance(value, dict):
+        return _sha1("dict", *(f"{_fingerprint(k, depth + 1)}={_fingerprint(v, depth + 1)}" for k, v in value.items()))
+    if isinstance(value, _IGNORED):
+        return None
+    raise _Unfingerprintable(f"不支持的类型 {type(value).__name__}")
+
+
+def figure_key(py_code: str, fname: str, namespace: dict) -> str:
+    """根据绘图代码及其引用数据的内容生成图片哈希
+
+    引用的变量中有无法计算指纹的内容时返回随机哈希，即不复用已渲染的图片。
+    """
+    h = hashlib.sha256()
+    h.update(fname.encode("utf-8"))
+    h.update(b"\0")
+    h.update(py_code.encode("utf-8"))
+    try:
+        nodes = [node for node in ast.walk(ast.parse(py_code)) if isinstance(node, ast.Name)]
+    except SyntaxError:
+        nodes = []
+    # 只对代码读取的外部变量取指纹，代码自身赋值的变量（如 fig）不参与
+    assigned = {node.id for node in nodes if isinstance(node.ctx, ast.Store)}
+    names = sorted({node.id for node in nodes} - assigned)
+    try:
+        for name in names:
+            fingerprint = _fingerprint(namespace[name]) if name in namespace else None
+            if fingerprint is not None:
+                h.update(f"\0{name}={fingerprint}".encode("utf-8"))
+    except Exception as e:
+        logger.info(f"绘图数据无法计算指纹，不复用图片: {e}")
+        return uuid.uuid4().hex[:16]
+    return h.hexdigest()[:16]
+
+
+def _root(node) -> Optional[str]:
+    """表达式最左侧的变量名，如 df["a"].plot() -> df"""
+    while True:
+        if isinstance(node, ast.Call):
+            node = node.func
+        elif isinstance(node, (ast.Attribute, ast.Subscript)):
+            node = node.value
+        elif isinstance(node, ast.Name):
+            return node.id
+        else:
+            return None
+
+
+def _needs_exec_on_reuse(py_code: str, fname: str, namespace: dict) -> bool:
+    """复用已渲染图片时是否仍需执行绘图代码
+
+    代码只创建和修改图像对象（fname 以及由 plt、sns、图像对象派生出的 ax 等变量）时，
+    执行结果只有图片本身，可以跳过。给其他变量赋值、修改已有数据（下标或属性赋值、
+    inplace=True、append 等）、定义函数、导入命名空间中没有的名称时仍需执行，
+    使这些结果对之后的 python_inter 调用可见。
+    """
+    try:
+        tree = ast.parse(py_code)
+    except SyntaxError:
+        return True
+    nodes = list(ast.walk(tree))
+    allowed = _PLOT_ROOTS | {fname}
+    # 循环和推导式的迭代变量
+    for node in nodes:
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.comprehension)):
+            allowed |= {n.id for n in ast.walk(node.target) if isinstance(n, ast.Name)}
+    assigns = [node for node in nodes if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign))]
+    changed = True
+    while changed:
+        changed = False
+        for node in assigns:
+            if node.value is None or _root(node.value) not in allowed:
+                continue
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = {n.id for target in targets for n in ast.walk(target) if isinstance(n, ast.Name)}
+            if not names <= allowed:
+                allowed |= names
+                changed = True
+
+    for node in nodes:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Global, ast.Nonlocal)):
+            return True
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if any((alias.asname or alias.name.split(".")[0]) not in namespace for alias in node.names):
+                return True
+        elif isinstance(node, ast.Name):
+            if isinstance(node.ctx, (ast.Store, ast.Del)) and node.id not in allowed:
+                return True
+        elif isinstance(node, (ast.Attribute, ast.Subscript)):
+            if isinstance(node.ctx, (ast.Store, ast.Del)) and _root(node) not in allowed:
+                return True
+        elif isinstance(node, ast.Call):
+            if any(keyword.arg == "inplace" for keyword in node.keywords):
+                return True
+            if isinstance(node.func, ast.Attribute) and node.func.attr in _MUTATORS and _root(node.func) not in allowed:
+                return True
+    return False
+
+
+def _optimize_figure(fig) -> None:
+    """对大数据量的折线降采样，对大散点集合栅格化，控制保存耗时"""
+    for ax in fig.axes:
+        for line in ax.get_lines():
+            xdata, ydata = line.get_xdata(orig=True), line.get_ydata(orig=True)
+            if len(xdata) > FIG_MAX_POINTS:
+                line.set_data(downsample(np.asarray(xdata)), downsample(np.asarray(ydata)))
+        for collection in ax.collections:
+            offsets = collection.get_offsets()
+            if offsets is not None and len(offsets) > FIG_RASTERIZE_THRESHOLD:
+                collection.set_rasterized(True)
+
+
+def _render(py_code: str, fname: str, namespace: dict, local_vars: dict, abs_path: Optional[str]) -> bool:
+    """执行绘图代码并保存图片；abs_path 为 None 时只执行代码、不保存"""
+    with _pyplot_lock:
+        try:
+            exec(py_code, namespace, local_vars)
+            namespace.update(local_vars)
+
+            fig = local_vars.get(fname, None)
+            if not fig:
+                return False
+            # plt.subplots() 返回 (fig, ax)
+            if isinstance(fig, tuple):
+                fig = fig[0]
+            if abs_path is None:
+                return True
+            _optimize_figure(fig)
+
+            # 先写临时文件再原子替换，避免并发读取到半截图片
+            tmp_path = f"{abs_path}.{threading.get_ident()}.tmp"
+            fig.savefig(tmp_path, bbox_inches='tight', dpi=FIG_DPI, format="png")
+            os.replace(tmp_path, abs_path)
+            return True
+        finally:
+            plt.close('all')
+
+
+def render_figure(py_code: str, fname: str, namespace: dict, local_vars: dict) -> Optional[str]:
+    """在渲染线程池中执行绘图代码并保存图片
+
+    图片文件名由绘图代码及其引用数据的内容哈希决定，相同图像已存在时复用，不再重复保存。
+    复用时如果代码只创建和修改图像对象，则不再执行；否则仍执行一遍（只跳过降采样和 savefig），
+    使代码中赋值的变量和对数据的修改对之后的 python_inter 调用保持可见。
+
+    Args:
+        py_code: 绘图代码
+        fname: 图像对象的变量名
+        namespace: 绘图代码执行的全局命名空间
+        local_vars: 绘图代码执行的局部命名空间
+
+    Returns:
+        图片相对路径；未找到图像对象时返回 None
+    """
+    local_vars.setdefault("downsample", downsample)
+    key = figure_key(py_code, fname, namespace)
+    image_filename = f"{fname}_{key}.png"
+    abs_path = os.path.join(FIG_OUTPUT_DIR, image_filename)
+    rel_path = f"{FIG_URL_PREFIX}/{image_filename}"
+
+    os.makedirs(FIG_OUTPUT_DIR, exist_ok=True)
+    with _inflight_lock:
+        pending = _inflight.get(key)
+        if pending is None and not os.path.exists(abs_path):
+            future = _executor.submit(_render, py_code, fname, namespace, local_vars, abs_path)
+            _inflight[key] = future
+            future.add_done_callback(lambda _: _inflight.pop(key, None))
+        else:
+            future = None
+
+    if future is None:
+        # 同一图片正在渲染时等待其完成，之后只执行代码、不再保存
+        if pending is not None and not pending.result(timeout=FIG_RENDER_TIMEOUT):
+            return None
+        if not _needs_exec_on_reuse(py_code, fname, {**namespace, **local_vars}):
+            logger.info(f"复用已渲染图片，跳过执行: {image_filename}")
+            return rel_path
+        logger.info(f"复用已渲染图片: {image_filename}")
+        future = _executor.submit(_render, py_code, fname, namespace, local_vars, None)
+
+    if not future.result(timeout=FIG_RENDER_TIMEOUT):
+        return None
+    return rel_path
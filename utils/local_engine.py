@@ -0,0 +1,134 @@
+import glob
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set
+
+import duckdb
+import pandas as pd
+
+from utils.logging_config import setup_logger
+
+logger = setup_logger('local_engine')
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 自动注册为视图的本地 CSV 所在目录
+LOCAL_DATA_DIR = os.getenv("LOCAL_DATA_DIR", project_root)
+# DuckDB 执行线程数，默认使用全部 CPU
+LOCAL_ENGINE_THREADS = int(os.getenv("LOCAL_ENGINE_THREADS", str(os.cpu_count() or 1)))
+
+
+def _table_name(path: str) -> str:
+    """把文件名转换为合法的 SQL 标识符，如 telco_data.csv -> telco_data"""
+    name = re.sub(r"\W", "_", os.path.splitext(os.path.basename(path))[0])
+    return f"t_{name}" if name[0].isdigit() else name
+
+
+def _referenced_names(sql_query: str) -> Set[str]:
+    """SQL 中出现的标识符（小写），用于只注册查询实际引用的 DataFrame；多匹配到的关键字、字符串无害"""
+    return {token.lower() for token in re.findall(r"\w+", sql_query)}
+
+
+class LocalEngine:
+    """进程内的 DuckDB 列式查询引擎
+
+    会话中的 pandas DataFrame 以零拷贝方式注册为同名表，本地 CSV 注册为视图，
+    DataFrame 与 CSV 视图同名时优先查询 DataFrame，
+    聚合、分组等分析可直接用 SQL 在本地向量化、多线程执行，无需回到 MySQL。
+    """
+
+    def __init__(self, data_dir: str = LOCAL_DATA_DIR, threads: int = LOCAL_ENGINE_THREADS):
+        self._con = duckdb.connect(database=":memory:")
+        self._con.execute(f"SET threads = {int(threads)}")
+        # DuckDB 连接不支持多线程并发使用
+        self._lock = threading.Lock()
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._csv_views = {}
+        self._conflicts: List[str] = []
+        self._register_csv_files(data_dir)
+
+    def _register_csv_files(self, data_dir: str) -> None:
+        for path in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+            name = _table_name(path)
+            escaped = path.replace("'", "''")
+            self._con.execute(f'CREATE OR REPLACE VIEW "{name}" AS SELECT * FROM read_csv_auto(\'{escaped}\')')
+            self._csv_views[name] = path
+            logger.info(f"已注册本地 CSV 视图: {name} -> {path}")
+
+    def sync(self, namespace: dict, sql_query: Optional[str] = None) -> List[str]:
+        """把命名空间中被 sql_query 引用的 DataFrame 注册为同名表
+
+        注册是零拷贝的，只涉及查询引用的表，因此每次查询前都重新注册，
+        原地修改过的 DataFrame 也能查到最新内容，无需对数据做哈希比较。
+        与本地 CSV 视图同名的 DataFrame 会遮蔽该视图，从命名空间中删除后视图恢复可见。
+
+        Args:
+            namespace: 提供 DataFrame 的命名空间
+            sql_query: 即将执行的 SQL，为 None 时注册全部 DataFrame
+
+        Returns:
+            遮蔽了同名 CSV 视图的 DataFrame 名称
+        """
+        current = {
+            name: value for name, value in namespace.items()
+            if isinstance(value, pd.DataFrame) and not name.startswith("_")
+        }
+        for name in list(self._frames):
+            if name not in current:
+                self._con.unregister(name)
+                del self._frames[name]
+
+        referenced = _referenced_names(sql_query) if sql_query is not None else None
+        registered = []
+        for name, df in current.items():
+            if referenced is None or name.lower() in referenced:
+                self._con.register(name, df)
+                self._frames[name] = df
+                registered.append(name)
+
+        conflicts = sorted(name for name in registered if name in self._csv_views)
+        for name in conflicts:
+            if name not in self._conflicts:
+                logger.warning(f"DataFrame {name} 与本地 CSV 视图同名，查询该名称时读取的是 DataFrame")
+        self._conflicts = conflicts
+        return conflicts
+
+    def conflicts(self) -> List[str]:
+        """返回最近一次同步时遮蔽了同名 CSV 视图的 DataFrame"""
+        with self._lock:
+            return list(self._conflicts)
+
+    def tables(self) -> Dict[str, str]:
+        """返回当前可查询的表及其来源"""
+        with self._lock:
+            result = dict(self._csv_views)
+            result.update({name: "DataFrame" for name in self._frames})
+            return result
+
+    def query(self, sql_query: str, namespace: dict) -> pd.DataFrame:
+        """在本地引擎中执行 SQL 并返回 DataFrame
+
+        Args:
+            sql_query: DuckDB SQL
+            namespace: 提供 DataFrame 的命名空间
+
+        Returns:
+            查询结果
+        """
+        with self._lock:
+            self.sync(namespace, sql_query)
+            return self._con.execute(sql_query).df()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_local_engine() -> LocalEngine:
+    """返回进程内共享的本地查询引擎，首次调用时创建"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = LocalEngine()
+        return _engine
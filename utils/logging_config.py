@@ -1,12 +1,171 @@
 import os
 import time
+import queue
+import atexit
 import logging
-from typing import Optional
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Tuple
+
+# logger 记录的最低级别，调高后低于该级别的日志在调用处直接跳过
+LOG_LEVEL = getattr(logging, os.getenv("LOG_LEVEL", "DEBUG").upper(), logging.DEBUG)
+# 是否使用异步日志，设为 0 时退回到同步写文件（便于调试）
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") != "0"
+# 单个日志文件的最大字节数及保留的历史文件数
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# 批量刷盘：累计多少条记录或间隔多少秒刷新一次文件缓冲
+LOG_FLUSH_RECORDS = int(os.getenv("LOG_FLUSH_RECORDS", "100"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+# 异步队列长度上限，队列满时丢弃新记录而不是阻塞调用线程，0 表示不限
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_FORMATTER = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def _default_log_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__)))), 'logs')
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """按大小轮转、批量刷盘的文件处理器
+
+    写入只进入文件缓冲区，累计 flush_records 条或距上次刷盘超过 flush_interval 秒时才刷新；
+    ERROR 及以上级别的记录立即刷新，避免崩溃前的关键日志丢失。
+    """
+
+    def __init__(self, filename: str, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                 flush_records: int = LOG_FLUSH_RECORDS, flush_interval: float = LOG_FLUSH_INTERVAL):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._urgent = False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._urgent = record.levelno >= logging.ERROR
+        super().emit(record)
+
+    def flush(self) -> None:
+        # StreamHandler.emit 每写一条都会调用 flush，这里只在达到批量条件时真正刷盘
+        self._pending += 1
+        if (self._urgent or self._pending >= self.flush_records
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.force_flush()
+
+    def force_flush(self) -> None:
+        self.acquire()
+        try:
+            if self.stream and hasattr(self.stream, "flush"):
+                self.stream.flush()
+        finally:
+            self.release()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+
+class _RoutingHandler(logging.Handler):
+    """在后台线程中把记录分发到控制台和各 logger 对应的日志文件"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.console = logging.StreamHandler()
+        self.console.setLevel(logging.INFO)  # 控制台只显示INFO及以上级别
+        self.console.setFormatter(_FORMATTER)
+        self._files: Dict[str, BufferedRotatingFileHandler] = {}
+        self._routes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add_route(self, name: str, log_file: str) -> None:
+        with self._lock:
+            self._routes[name] = log_file
+            if log_file not in self._files:
+                handler = BufferedRotatingFileHandler(log_file)
+                handler.setLevel(logging.DEBUG)  # 文件记录DEBUG级别及以上的日志
+                handler.setFormatter(_FORMATTER)
+                self._files[log_file] = handler
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.levelno >= self.console.level:
+            self.console.handle(record)
+        handler = self._files.get(self._routes.get(record.name, ""))
+        if handler is not None:
+            handler.handle(record)
+
+    def flush_all(self) -> None:
+        for handler in list(self._files.values()):
+            if handler._pending:
+                handler.force_flush()
+        self.console.flush()
+
+    def close(self) -> None:
+        for handler in list(self._files.values()):
+            handler.close()
+        super().close()
+
+
+class _FlushingQueueListener(QueueListener):
+    """队列空闲时定期刷新文件缓冲，保证日志在 LOG_FLUSH_INTERVAL 内落盘"""
+
+    def dequeue(self, block: bool):
+        while True:
+            try:
+                return self.queue.get(block=block, timeout=LOG_FLUSH_INTERVAL)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush_all()
+
+
+class _DropWhenFullQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+_pipeline: Optional[Tuple[QueueHandler, _RoutingHandler, QueueListener]] = None
+_pipeline_lock = threading.Lock()
+
+
+def _get_pipeline() -> Tuple[QueueHandler, _RoutingHandler]:
+    """创建进程内共享的异步日志队列和后台写入线程"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+            router = _RoutingHandler()
+            listener = _FlushingQueueListener(log_queue, router)
+            listener.start()
+            _pipeline = (_DropWhenFullQueueHandler(log_queue), router, listener)
+            atexit.register(shutdown_logging)
+        return _pipeline[0], _pipeline[1]
+
+
+def shutdown_logging() -> None:
+    """停止后台写入线程，写完队列中剩余的日志并关闭文件"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            return
+        _, router, listener = _pipeline
+        _pipeline = None
+    listener.stop()
+    router.flush_all()
+    router.close()
 
 
 def setup_logger(name: str, log_dir: Optional[str] = None) -> logging.Logger:
     """设置统一的日志配置
 
+    日志记录只在调用线程中放入队列，格式化后的输出、写文件和刷盘都由后台线程完成，
+    文件按 LOG_MAX_BYTES 轮转并批量刷盘。
+
     Args:
         name: logger的名称
         log_dir: 日志文件目录，如果为None则使用默认的logs目录
@@ -19,33 +178,34 @@ def setup_logger(name: str, log_dir: Optional[str] = None) -> logging.Logger:
 
     # 获取或创建 logger
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)  # logger本身记录DEBUG级别及以上
+    logger.setLevel(LOG_LEVEL)  # logger本身默认记录DEBUG级别及以上
     logger.propagate = False  # 防止日志消息传播到父级logger
 
     # 如果已经有处理器，不再添加
     if logger.handlers:
         return logger
 
+    if log_dir is None:
+        log_dir = _default_log_dir()
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, f"{name}.log")
+
+    if LOG_ASYNC:
+        queue_handler, router = _get_pipeline()
+        router.add_route(name, log_file)
+        logger.addHandler(queue_handler)
+        return logger
+
     # 创建控制台处理器
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)  # 控制台只显示INFO及以上级别
-
-    # 创建格式化器
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(formatter)
+    console_handler.setFormatter(_FORMATTER)
 
     # 创建文件处理器
-    if log_dir is None:
-        log_dir = os.path.join(os.path.dirname(os.path.dirname(
-            os.path.dirname(os.path.abspath(__file__)))), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
-    log_file = os.path.join(log_dir, f"{name}.log")
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                       encoding='utf-8')
     file_handler.setLevel(logging.DEBUG)  # 文件记录DEBUG级别及以上的日志
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(_FORMATTER)
 
     # 添加处理器到日志记录器
     logger.addHandler(console_handler)
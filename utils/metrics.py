@@ -0,0 +1,277 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.replay import replayable
+from utils.tracing import start_span
+
+# 每个时间序列保留的最近样本数，用于计算分位数
+METRICS_SAMPLE_SIZE = int(os.getenv("METRICS_SAMPLE_SIZE", "1024"))
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class MetricsRegistry:
+    """进程内指标注册表
+
+    计数器记录累计值，耗时等观测值记录次数、总和、最大值以及最近样本的分位数。
+    其他模块已有的统计（如查询缓存命中率）可通过 register_collector 一并导出。
+    """
+
+    def __init__(self, sample_size: int = METRICS_SAMPLE_SIZE):
+        self._lock = threading.Lock()
+        self._sample_size = sample_size
+        self._counters: Dict[_Key, float] = defaultdict(float)
+        self._observations: Dict[_Key, Dict[str, Any]] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def inc(self, metric: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self._counters[_key(metric, labels)] += value
+
+    def observe(self, metric: str, value: float, **labels) -> None:
+        key = _key(metric, labels)
+        with self._lock:
+            series = self._observations.get(key)
+            if series is None:
+                series = self._observations[key] = {
+                    "count": 0, "sum": 0.0, "max": 0.0, "samples": deque(maxlen=self._sample_size)
+                }
+            series["count"] += 1
+            series["sum"] += value
+            series["max"] = max(series["max"], value)
+            series["samples"].append(value)
+
+    def register_collector(self, name: str, collector: Callable[[], Dict[str, Any]]) -> None:
+        """注册在导出时调用的统计函数，返回值原样放入快照"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回所有指标的当前值"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            observations = []
+            for (name, labels), series in sorted(self._observations.items()):
+                samples = list(series["samples"])
+                observations.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": series["count"],
+                    "sum": series["sum"],
+                    "mean": series["sum"] / series["count"],
+                    "max": series["max"],
+                    "p50": _percentile(samples, 0.5),
+                    "p95": _percentile(samples, 0.95),
+                })
+            collectors = dict(self._collectors)
+
+        collected = {}
+        for name, collector in collectors.items():
+            try:
+                collected[name] = collector()
+            except Exception as e:
+                collected[name] = {"error": str(e)}
+        return {"counters": counters, "observations": observations, "collectors": collected}
+
+    def render_prometheus(self) -> str:
+        """以 Prometheus 文本格式导出计数器和观测值"""
+        def labels_text(labels: Dict[str, str], extra: str = "") -> str:
+            parts = [f'{k}="{v}"' for k, v in labels.items()]
+            if extra:
+                parts.append(extra)
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        snapshot = self.snapshot()
+        lines = []
+        for counter in snapshot["counters"]:
+            lines.append(f"{counter['name']}_total{labels_text(counter['labels'])} {counter['value']}")
+        for series in snapshot["observations"]:
+            labels = series["labels"]
+            lines.append(f"{series['name']}_count{labels_text(labels)} {series['count']}")
+            lines.append(f"{series['name']}_sum{labels_text(labels)} {series['sum']}")
+            for q, quantile in (("p50", "0.5"), ("p95", "0.95")):
+                quantile_label = f'quantile="{quantile}"'
+                lines.append(f"{series['name']}{labels_text(labels, quantile_label)} {series[q]}")
+        for name, values in snapshot["collectors"].items():
+            for field, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"{name}_{field} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._observations.clear()
+
+
+# 进程内共享的指标注册表
+metrics = MetricsRegistry()
+
+
+class RunReport:
+    """单次工作流运行的耗时报告，通过 contextvars 关联到当前运行"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+        self.calls: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+        self.counters: Dict[str, float] = defaultdict(float)
+
+    def record(self, kind: str, name: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            entry = self.calls[kind].setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["errors"] += int(error)
+
+    def add(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def finish(self) -> None:
+        self._finished = time.perf_counter()
+
+    def summary(self) -> Dict[str, Any]:
+        """返回可 JSON 序列化的耗时汇总"""
+        with self._lock:
+            end = self._finished if self._finished is not None else time.perf_counter()
+            calls = {
+                kind: {name: {k: round(v, 4) if isinstance(v, float) else v for k, v in entry.items()}
+                       for name, entry in sorted(entries.items(), key=lambda item: -item[1]["seconds"])}
+                for kind, entries in self.calls.items()
+            }
+            return {"total_seconds": round(end - self._started, 4), "calls": calls, "counters": dict(self.counters)}
+
+
+_current_run: contextvars.ContextVar[Optional[RunReport]] = contextvars.ContextVar("current_run", default=None)
+
+
+def current_run() -> Optional[RunReport]:
+    return _current_run.get()
+
+
+@contextmanager
+def track_run():
+    """在上下文中记录一次运行的耗时报告
+
+    Example:
+        with track_run() as report:
+            app.invoke(state)
+        report.summary()
+    """
+    report = RunReport()
+    token = _current_run.set(report)
+    try:
+        yield report
+    finally:
+        report.finish()
+        _current_run.reset(token)
+
+
+def record_call(kind: str, name: str, seconds: float, error: bool = False) -> None:
+    """记录一次调用的耗时到注册表和当前运行报告"""
+    metrics.observe(f"{kind}_seconds", seconds, name=name)
+    metrics.inc(f"{kind}_calls", name=name, status="error" if error else "ok")
+    report = _current_run.get()
+    if report is not None:
+        report.record(kind, name, seconds, error)
+
+
+def count(metric: str, value: float = 1, **labels) -> None:
+    """累加计数器，同时计入当前运行报告"""
+    metrics.inc(metric, value, **labels)
+    report = _current_run.get()
+    if report is not None:
+        suffix = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        report.add(f"{metric}[{suffix}]" if suffix else metric, value)
+
+
+def record_cache(cache: str, hit: bool, value: int = 1) -> None:
+    """记录缓存命中或未命中"""
+    if value:
+        count("cache_requests", value, cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def timed(kind: str, name: str):
+    """记录代码块耗时，异常会计为一次失败调用；处于链路中时同时记录一个 span"""
+    with start_span(name, kind):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            record_call(kind, name, time.perf_counter() - start, error)
+
+
+def instrument(kind: str, name: str, func: Callable) -> Callable:
+    """包装函数，记录每次调用的耗时和是否失败"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with timed(kind, name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def instrument_node(name: str, func: Callable) -> Callable:
+    """包装工作流节点，记录节点的墙钟时间"""
+    return instrument("node", name, func)
+
+
+class InstrumentedModule:
+    """模块代理：访问到的可调用对象会被包装为带耗时统计的版本
+
+    调用同时经过 utils.replay，设置 DATA_AGENT_REPLAY 后可录制或离线回放。
+
+    Example:
+        ak = InstrumentedModule(akshare, "akshare")
+        ak.stock_zh_a_hist(...)  # 记录 akshare_seconds{name="stock_zh_a_hist"}
+    """
+
+    def __init__(self, module, kind: str):
+        self._module = module
+        self._kind = kind
+        self._wrapped: Dict[str, Callable] = {}
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._module, name)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            wrapped = self._wrapped[name] = instrument(self._kind, name, replayable(self._kind, name)(attr))
+        return wrapped
+
+
+def instrument_module(module, kind: str) -> InstrumentedModule:
+    return InstrumentedModule(module, kind)
+
+
+def submit_in_context(executor, func: Callable, *args, **kwargs):
+    """在线程池中执行函数并沿用调用方的上下文，使子线程中的调用计入当前运行报告"""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
@@ -0,0 +1,304 @@
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.logging_config import setup_logger
+
+logger = setup_logger('news_cache')
+
+NEWS_CACHE_DB = os.getenv("NEWS_CACHE_DB", os.path.join("src", "data", "news_cache.db"))
+# 情感分数缓存的有效期（天）及条目上限
+SENTIMENT_CACHE_TTL_DAYS = float(os.getenv("SENTIMENT_CACHE_TTL_DAYS", "30"))
+SENTIMENT_CACHE_MAX_ENTRIES = int(os.getenv("SENTIMENT_CACHE_MAX_ENTRIES", "100000"))
+# 新闻索引中文章的保留天数
+NEWS_ARTICLE_TTL_DAYS = float(os.getenv("NEWS_ARTICLE_TTL_DAYS", "30"))
+# 每写入多少次执行一次淘汰
+_EVICT_EVERY = 200
+
+# 旧版 JSON 新闻缓存位置，首次打开数据库时导入
+LEGACY_NEWS_DIR = os.path.join("src", "data", "stock_news")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sentiment (
+    key TEXT PRIMARY KEY,
+    score REAL NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    text TEXT,
+    source TEXT NOT NULL DEFAULT 'llm'
+);
+CREATE INDEX IF NOT EXISTS idx_sentiment_accessed ON sentiment(accessed_at);
+CREATE TABLE IF NOT EXISTS articles (
+    article_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    publish_time TEXT NOT NULL,
+    source TEXT,
+    url TEXT,
+    keyword TEXT,
+    first_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_first_seen ON articles(first_seen);
+CREATE TABLE IF NOT EXISTS article_tickers (
+    symbol TEXT NOT NULL,
+    article_id TEXT NOT NULL,
+    PRIMARY KEY (symbol, article_id)
+);
+CREATE INDEX IF NOT EXISTS idx_article_tickers_article ON article_tickers(article_id);
+CREATE TABLE IF NOT EXISTS news_fetch (
+    symbol TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def article_id(url: str, title: str) -> str:
+    """文章去重键：优先使用链接，没有链接时使用标题"""
+    return hashlib.sha256((url or title).encode('utf-8')).hexdigest()[:32]
+
+
+class NewsCache:
+    """基于 SQLite 的新闻与情感分数缓存
+
+    按主键索引查询，写入为单行原子 upsert，不再每次重写整个 JSON 文件；
+    WAL 模式下多个线程、进程可以安全地并发读写。过期或超量的条目会被定期淘汰。
+    """
+
+    def __init__(self, path: str = NEWS_CACHE_DB):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SCHEMA)
+            # 旧版数据库的情感表缺少文本和来源列
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sentiment)")}
+            if "text" not in columns:
+                conn.execute("ALTER TABLE sentiment ADD COLUMN text TEXT")
+            if "source" not in columns:
+                conn.execute("ALTER TABLE sentiment ADD COLUMN source TEXT NOT NULL DEFAULT 'llm'")
+        self._import_legacy()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 连接不能跨线程共享，每个线程使用独立连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def put_articles(self, symbol: str, articles: List[dict]) -> int:
+        """把一只股票的新闻写入文章索引
+
+        文章以 article_id 去重，同一篇文章被多只股票抓到时只保存一份，另外记录股票与文章的对应关系。
+
+        Args:
+            symbol: 股票代码
+            articles: 新闻列表，每条需包含 article_id 及标题、内容等字段
+
+        Returns:
+            int: 索引中新增的文章数
+        """
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO articles "
+                "(article_id, title, content, publish_time, source, url, keyword, first_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (a["article_id"], a["title"], a["content"], a["publish_time"],
+                     a.get("source", ""), a.get("url", ""), a.get("keyword", ""), now)
+                    for a in articles
+                ],
+            )
+            added = conn.total_changes - before
+            conn.executemany(
+                "INSERT OR IGNORE INTO article_tickers (symbol, article_id) VALUES (?, ?)",
+                [(symbol, a["article_id"]) for a in articles],
+            )
+            conn.execute(
+                "INSERT INTO news_fetch (symbol, fetched_at) VALUES (?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET fetched_at = excluded.fetched_at",
+                (symbol, now),
+            )
+        self._maybe_evict()
+        return added
+
+    def get_articles(self, symbol: str, limit: int) -> List[dict]:
+        """按发布时间倒序读取一只股票的索引新闻"""
+        rows = self._conn().execute(
+            "SELECT a.title, a.content, a.publish_time, a.source, a.url, a.keyword FROM article_tickers t "
+            "JOIN articles a ON a.article_id = t.article_id WHERE t.symbol = ? "
+            "ORDER BY a.publish_time DESC LIMIT ?",
+            (symbol, limit),
+        ).fetchall()
+        fields = ("title", "content", "publish_time", "source", "url", "keyword")
+        return [dict(zip(fields, row)) for row in rows]
+
+    def last_fetched(self, symbol: str) -> Optional[float]:
+        """返回上次抓取该股票新闻的时间戳，从未抓取时返回 None"""
+        row = self._conn().execute("SELECT fetched_at FROM news_fetch WHERE symbol = ?", (symbol,)).fetchone()
+        return row[0] if row else None
+
+    def get_sentiments(self, keys: List[str]) -> Dict[str, float]:
+        """批量读取情感分数缓存，返回命中且未过期的 {key: score}"""
+        conn = self._conn()
+        now = time.time()
+        cutoff = now - SENTIMENT_CACHE_TTL_DAYS * 86400
+        unique_keys = list(dict.fromkeys(keys))
+        result = {}
+        # SQLite 单条语句的参数个数有上限，分批查询
+        for i in range(0, len(unique_keys), 500):
+            batch = unique_keys[i:i + 500]
+            placeholders = ", ".join(["?"] * len(batch))
+            rows = conn.execute(
+                f"SELECT key, score FROM sentiment WHERE key IN ({placeholders}) AND created_at >= ?",
+                (*batch, cutoff),
+            ).fetchall()
+            result.update(rows)
+        if result:
+            with conn:
+                conn.executemany("UPDATE sentiment SET accessed_at = ? WHERE key = ?", [(now, key) for key in result])
+        return result
+
+    def put_sentiments(self, scores: Dict[str, float], texts: Optional[Dict[str, str]] = None,
+                       source: str = "llm") -> None:
+        """批量写入情感分数，在同一事务中完成
+
+        Args:
+            scores: {key: score}
+            texts: {key: 新闻文本}，保存后可作为本地预打分模型的训练数据
+            source: 分数来源，"llm" 为LLM打分，"local" 为本地预打分
+        """
+        texts = texts or {}
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO sentiment (key, score, created_at, accessed_at, text, source) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET score = excluded.score, created_at = excluded.created_at, "
+                "accessed_at = excluded.accessed_at, text = COALESCE(excluded.text, sentiment.text), "
+                "source = excluded.source",
+                [(key, score, now, now, texts.get(key), source) for key, score in scores.items()],
+            )
+        self._maybe_evict()
+
+    def count_labeled(self) -> int:
+        """带文本的LLM打分条数"""
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sentiment WHERE source = 'llm' AND text IS NOT NULL"
+        ).fetchone()[0]
+
+    def labeled_texts(self, limit: int = 50000) -> List[Tuple[str, float]]:
+        """读取最近的LLM打分样本 [(文本, 分数)]，用于训练本地预打分模型"""
+        return self._conn().execute(
+            "SELECT text, score FROM sentiment WHERE source = 'llm' AND text IS NOT NULL "
+            "ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+
+    def _maybe_evict(self) -> None:
+        with self._writes_lock:
+            self._writes += 1
+            if self._writes % _EVICT_EVERY != 1:
+                return
+        self.evict()
+
+    def evict(self) -> None:
+        """删除过期条目及其股票映射，并把情感缓存裁剪到条目上限以内（按最近访问时间淘汰）"""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sentiment WHERE created_at < ?", (now - SENTIMENT_CACHE_TTL_DAYS * 86400,))
+            conn.execute("DELETE FROM articles WHERE first_seen < ?", (now - NEWS_ARTICLE_TTL_DAYS * 86400,))
+            conn.execute("DELETE FROM article_tickers WHERE article_id NOT IN (SELECT article_id FROM articles)")
+            conn.execute(
+                "DELETE FROM sentiment WHERE key IN ("
+                "SELECT key FROM sentiment ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (SENTIMENT_CACHE_MAX_ENTRIES,),
+            )
+
+    def _import_legacy(self) -> None:
+        """把旧版新闻缓存导入文章索引，只执行一次
+
+        旧版数据有两种：JSON 文件（尚未导入过时才读取）和按 (股票, 日期) 整体保存新闻列表的
+        stock_news 表，后者迁移后删除。旧版情感缓存以拼接的新闻全文为键，与按单条新闻哈希的键不兼容，因此不导入。
+        """
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported_v2'").fetchone():
+            return
+        json_imported = conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone()
+        has_stock_news = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_news'"
+        ).fetchone()
+        now = time.time()
+        with conn:
+            if not json_imported:
+                for news_file in glob.glob(os.path.join(LEGACY_NEWS_DIR, "*_news.json")):
+                    try:
+                        with open(news_file, 'r', encoding='utf-8') as f:
+                            legacy = json.load(f)
+                        symbol = os.path.basename(news_file)[:-len("_news.json")]
+                        self._insert_legacy(conn, symbol, legacy.get("news", []), now)
+                    except Exception as e:
+                        logger.warning(f"导入旧版新闻缓存 {news_file} 失败: {e}")
+            if has_stock_news:
+                migrated = 0
+                for symbol, news, updated_at in conn.execute(
+                    "SELECT symbol, news, updated_at FROM stock_news"
+                ).fetchall():
+                    try:
+                        migrated += self._insert_legacy(conn, symbol, json.loads(news), updated_at or now)
+                    except Exception as e:
+                        logger.warning(f"迁移 {symbol} 的旧版新闻缓存失败: {e}")
+                conn.execute("DROP TABLE stock_news")
+                logger.info(f"已把 stock_news 表中的 {migrated} 条新闻迁移到文章索引")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported_v2', '1')")
+
+    @staticmethod
+    def _insert_legacy(conn: sqlite3.Connection, symbol: str, news_list: List[dict], first_seen: float) -> int:
+        """把旧版格式的新闻列表写入文章索引，返回处理的条数"""
+        for news in news_list:
+            key = article_id(news.get("url", ""), news.get("title", ""))
+            conn.execute(
+                "INSERT OR IGNORE INTO articles "
+                "(article_id, title, content, publish_time, source, url, keyword, first_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, news.get("title", ""), news.get("content", ""), news.get("publish_time", ""),
+                 news.get("source", ""), news.get("url", ""), news.get("keyword", ""), first_seen),
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO article_tickers (symbol, article_id) VALUES (?, ?)", (symbol, key)
+            )
+        return len(news_list)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_news_cache() -> NewsCache:
+    """返回进程内共享的新闻缓存，首次调用时打开数据库"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = NewsCache()
+        return _cache
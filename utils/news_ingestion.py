@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import akshare as ak
+import pandas as pd
+
+from utils.logging_config import setup_logger
+from utils.metrics import instrument_module, record_cache
+from utils.news_cache import NewsCache, article_id, get_news_cache
+
+logger = setup_logger('news_ingestion')
+
+ak = instrument_module(ak, "akshare")
+
+# 同一只股票两次抓取之间的最短间隔（秒），间隔内的读取直接使用本地索引
+NEWS_REFRESH_INTERVAL = float(os.getenv("NEWS_REFRESH_INTERVAL", "1800"))
+# 并发抓取的线程数
+NEWS_INGEST_WORKERS = int(os.getenv("NEWS_INGEST_WORKERS", "4"))
+# 后台定时抓取的股票列表，逗号分隔，如 "000001,600519"
+NEWS_WATCHLIST = [s.strip() for s in os.getenv("NEWS_WATCHLIST", "").split(",") if s.strip()]
+
+
+def normalize_news_frame(news_df: pd.DataFrame) -> pd.DataFrame:
+    """以列运算清洗东方财富个股新闻
+
+    正文为空时以标题代替，去除首尾空白，剔除内容过短、发布时间无法解析的新闻，
+    按链接（无链接时按标题）去重，并按发布时间倒序排列。
+
+    Args:
+        news_df (pd.DataFrame): ak.stock_news_em 返回的原始数据，可以是多只股票拼接后的结果
+
+    Returns:
+        pd.DataFrame: 包含 title、content、publish_time、source、url、keyword 列的新闻表，
+            publish_time 为 "%Y-%m-%d %H:%M:%S" 格式的字符串
+    """
+    def column(name: str) -> pd.Series:
+        if name not in news_df.columns:
+            return pd.Series("", index=news_df.index, dtype=object)
+        return news_df[name].fillna("").astype(str).str.strip()
+
+    title = column("新闻标题")
+    content = column("新闻内容")
+    content = content.where(content != "", title)
+    publish_time = pd.to_datetime(column("发布时间"), errors="coerce")
+
+    news = pd.DataFrame({
+        "title": title,
+        "content": content,
+        "publish_time": publish_time,
+        "source": column("文章来源"),
+        "url": column("新闻链接"),
+        "keyword": column("关键词"),
+    })
+    # 内容太短或时间无法解析的跳过
+    news = news[(news["content"].str.len() >= 10) & news["publish_time"].notna()]
+
+    dedup_key = news["url"].where(news["url"] != "", news["title"])
+    news = news[~dedup_key.duplicated()]
+    news = news.sort_values("publish_time", ascending=False, kind="stable")
+    news["publish_time"] = news["publish_time"].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return news.reset_index(drop=True)
+
+
+class NewsIngestionService:
+    """共享的个股新闻抓取服务
+
+    对关注列表中的股票按固定间隔并发抓取新闻，写入本地 SQLite 文章索引；
+    同一篇文章出现在多只股票的新闻中时只保存一份，并记录股票与文章的对应关系。
+    单只股票的读取先检查上次抓取时间，未超过刷新间隔时直接读取本地索引，
+    同一股票的并发请求只会触发一次抓取。
+    """
+
+    def __init__(self, cache: Optional[NewsCache] = None, fetcher: Optional[Callable] = None,
+                 refresh_interval: float = NEWS_REFRESH_INTERVAL, max_workers: int = NEWS_INGEST_WORKERS):
+        self._cache = cache or get_news_cache()
+        self._fetcher = fetcher
+        self.refresh_interval = refresh_interval
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="news_ingest")
+        self._watchlist = set()
+        self._symbol_locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, symbols: Iterable[str]) -> None:
+        """把股票加入关注列表，后台刷新时一并抓取"""
+        with self._locks_lock:
+            self._watchlist.update(symbols)
+
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._symbol_locks.setdefault(symbol, threading.Lock())
+
+    def _is_fresh(self, symbol: str) -> bool:
+        fetched_at = self._cache.last_fetched(symbol)
+        return fetched_at is not None and time.time() - fetched_at < self.refresh_interval
+
+    def _ingest(self, symbol: str, force: bool = False) -> int:
+        """抓取一只股票的新闻并写入索引，返回新增文章数"""
+        with self._symbol_lock(symbol):
+            # 等锁期间其他线程可能已经完成抓取
+            if not force and self._is_fresh(symbol):
+                return 0
+            fetcher = self._fetcher or ak.stock_news_em
+            news_df = fetcher(symbol=symbol)
+            if news_df is None or len(news_df) == 0:
+                logger.info(f"未获取到{symbol}的新闻数据")
+                articles = []
+            else:
+                articles = normalize_news_frame(news_df).to_dict('records')
+                for article in articles:
+                    article["article_id"] = article_id(article["url"], article["title"])
+            added = self._cache.put_articles(symbol, articles)
+            logger.info(f"{symbol} 抓取到 {len(articles)} 条新闻，新增 {added} 条")
+            return added
+
+    def refresh(self, symbols: Optional[Iterable[str]] = None, force: bool = False) -> Dict[str, int]:
+        """并发刷新多只股票的新闻，跳过仍在刷新间隔内的股票
+
+        Args:
+            symbols: 股票代码列表，为空时刷新整个关注列表
+            force: 是否忽略刷新间隔强制抓取
+
+        Returns:
+            Dict[str, int]: {股票代码: 新增文章数}，抓取失败的股票不包含在内
+        """
+        if symbols is None:
+            with self._locks_lock:
+                symbols = sorted(self._watchlist)
+        stale = [s for s in dict.fromkeys(symbols) if force or not self._is_fresh(s)]
+        futures = {symbol: self._executor.submit(self._ingest, symbol, force) for symbol in stale}
+        result = {}
+        for symbol, future in futures.items():
+            try:
+                result[symbol] = future.result()
+            except Exception as e:
+                logger.warning(f"抓取{symbol}新闻失败: {e}")
+        return result
+
+    def get_news(self, symbol: str, max_news: int = 10) -> List[dict]:
+        """读取一只股票的最新新闻，本地索引过期时先刷新
+
+        Args:
+            symbol: 股票代码
+            max_news: 返回的新闻条数
+
+        Returns:
+            List[dict]: 按发布时间倒序的新闻列表
+        """
+        self.watch([symbol])
+        fresh = self._is_fresh(symbol)
+        record_cache("news_index", fresh)
+        if not fresh:
+            try:
+                self._ingest(symbol)
+            except Exception as e:
+                logger.warning(f"抓取{symbol}新闻失败，使用本地索引中的旧数据: {e}")
+        return self._cache.get_articles(symbol, max_news)
+
+    def start(self, symbols: Optional[Iterable[str]] = None) -> None:
+        """启动后台线程，每个刷新间隔抓取一次关注列表"""
+        if symbols:
+            self.watch(symbols)
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="news_ingest_scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"后台新闻抓取出错: {e}")
+            self._stop.wait(max(1.0, self.refresh_interval - (time.time() - started)))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_news_ingestion() -> NewsIngestionService:
+    """返回进程内共享的新闻抓取服务，配置了 NEWS_WATCHLIST 时自动启动后台刷新"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = NewsIngestionService()
+            if NEWS_WATCHLIST:
+                _service.start(NEWS_WATCHLIST)
+        return _service
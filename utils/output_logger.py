@@ -1,9 +1,25 @@
 import sys
 from datetime import datetime
 import os
+import queue
+import atexit
+import threading
+
+# 后台线程刷盘的时间间隔（秒）
+OUTPUT_LOG_FLUSH_INTERVAL = float(os.getenv("OUTPUT_LOG_FLUSH_INTERVAL", "1.0"))
+# 是否把标准输出同时写入日志文件，设为 0 时 main.py 不替换 sys.stdout
+OUTPUT_LOG_MIRROR = os.getenv("OUTPUT_LOG_MIRROR", "1") != "0"
+
+_STOP = object()
+
 
 class OutputLogger:
-    def __init__(self):
+    """把标准输出同时写入日志文件
+
+    终端输出保持同步；写文件交给后台线程批量完成，调用方线程不会因为刷盘而阻塞。
+    """
+
+    def __init__(self, flush_interval: float = OUTPUT_LOG_FLUSH_INTERVAL):
         self.terminal = sys.stdout
         self.log_dir = "logs"
         os.makedirs(self.log_dir, exist_ok=True)
@@ -12,17 +28,59 @@ class OutputLogger:
             "w",
             encoding="utf-8"
         )
+        self.flush_interval = flush_interval
+        self._closed = False
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name="output_logger", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
     def write(self, message):
         self.terminal.write(message)
-        self.log_file.write(message)
-        self.log_file.flush()
+        if not self._closed:
+            self._queue.put(message)
 
     def flush(self):
+        # 文件由后台线程定期刷新
         self.terminal.flush()
-        self.log_file.flush()
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                message = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.log_file.flush()
+                continue
+            # 一次取完队列中已有的内容，合并写入
+            chunks = []
+            while message is not _STOP:
+                chunks.append(message)
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if chunks:
+                self.log_file.write("".join(chunks))
+            if message is _STOP:
+                self.log_file.flush()
+                return
+
+    def close(self) -> None:
+        """写完队列中剩余的输出并关闭日志文件"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join(timeout=5)
+        self.log_file.close()
+
+    def __getattr__(self, name):
+        # isatty、encoding 等属性沿用原始标准输出
+        if name == "terminal":
+            raise AttributeError(name)
+        return getattr(self.terminal, name)
 
     def __del__(self) -> None:
         """Clean up by closing the log file."""
-        if hasattr(self, 'log_file'):
-            self.log_file.close()
+        if hasattr(self, '_writer'):
+            self.close()
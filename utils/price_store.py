@@ -0,0 +1,203 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+from utils.logging_config import setup_logger
+from utils.metrics import instrument_module, record_cache
+from utils import replay
+
+logger = setup_logger('price_store')
+
+ak = instrument_module(ak, "akshare")
+
+# 本地日线行情的存放目录，每只股票一个文件
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join("src", "data", "prices"))
+# 首次拉取的历史长度（自然日）
+PRICE_STORE_HISTORY_DAYS = int(os.getenv("PRICE_STORE_HISTORY_DAYS", "730"))
+# 批量补齐多只股票时的并发请求数
+PRICE_STORE_WORKERS = int(os.getenv("PRICE_STORE_WORKERS", "8"))
+# 增量更新时与本地最后一天重叠比对的容差，超过则说明前复权价格已调整，需要全量重拉
+ADJUSTMENT_TOLERANCE = 1e-4
+
+# 行情接口的列 -> 本地存储的列名
+BAR_COLUMNS = {"日期": "date", "开盘": "open", "最高": "high", "最低": "low", "收盘": "close", "成交量": "volume"}
+
+
+def _fetch_bars(ticker: str, start: datetime, end: datetime) -> pd.DataFrame:
+    """拉取前复权日线，返回以日期为索引的 open/high/low/close/volume"""
+    df = ak.stock_zh_a_hist(symbol=ticker, period="daily", start_date=start.strftime("%Y%m%d"),
+                            end_date=end.strftime("%Y%m%d"), adjust="qfq")
+    if df is None or df.empty:
+        return _empty_bars()
+    df = df[list(BAR_COLUMNS)].rename(columns=BAR_COLUMNS)
+    df["date"] = pd.to_datetime(df["date"])
+    bars = df.set_index("date").apply(pd.to_numeric, errors="coerce").dropna(subset=["close"])
+    # 记录请求的起始日期，用于判断本地历史是否覆盖更长的回看需求（新股的首个交易日可能晚于该日期）
+    bars.attrs["history_start"] = start.strftime("%Y-%m-%d")
+    return bars
+
+
+def _empty_bars() -> pd.DataFrame:
+    return pd.DataFrame(columns=[c for c in BAR_COLUMNS.values() if c != "date"],
+                        index=pd.DatetimeIndex([], name="date"), dtype=float)
+
+
+class PriceStore:
+    """本地日线行情存储，按股票增量更新
+
+    每只股票的日线（开高低收、成交量）保存为一个 pickle 文件。读取时只补拉本地最后一天之后的数据；
+    若重叠日的收盘价与本地不一致（前复权因分红送转而整体调整），则重新拉取完整历史。
+    """
+
+    def __init__(self, directory: str = PRICE_STORE_DIR, history_days: int = PRICE_STORE_HISTORY_DAYS):
+        self._dir = directory
+        self._history_days = history_days
+        self._bars: Dict[str, pd.DataFrame] = {}
+        self._updated: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self._dir, f"{ticker}.pkl")
+
+    def _load(self, ticker: str) -> Optional[pd.DataFrame]:
+        if ticker in self._bars:
+            return self._bars[ticker]
+        path = self._path(ticker)
+        if os.path.exists(path):
+            try:
+                bars = pd.read_pickle(path)
+                if isinstance(bars, pd.DataFrame) and "close" in bars:
+                    return bars
+            except Exception as e:
+                logger.warning(f"读取 {ticker} 本地行情失败: {e}")
+        return None
+
+    def _save(self, ticker: str, bars: pd.DataFrame) -> None:
+        try:
+            os.makedirs(self._dir, exist_ok=True)
+            bars.to_pickle(self._path(ticker))
+        except Exception as e:
+            logger.warning(f"保存 {ticker} 本地行情失败: {e}")
+
+    def put(self, ticker: str, bars: pd.DataFrame, history_start: Optional[str] = None) -> None:
+        """写入已获取的前复权日线（以日期为索引，如 market_data_agent 拉取的当前股票），避免重复请求
+
+        与本地数据在重叠的最后一天收盘价不一致时（前复权已调整）以新数据替换，否则合并。
+        不标记为当天已更新，当天首次读取时仍会补拉最后一天之后的数据。
+
+        Args:
+            ticker: 股票代码
+            bars: 日线
+            history_start: 拉取这些日线时请求的起始日期（YYYY-MM-DD）
+        """
+        bars = bars[[c for c in BAR_COLUMNS.values() if c in bars]].copy()
+        bars.index = pd.to_datetime(bars.index)
+        bars = bars.apply(pd.to_numeric, errors="coerce").dropna(subset=["close"]).sort_index()
+        if bars.empty:
+            return
+        starts = [history_start] if history_start else []
+        with self._lock:
+            cached = self._load(ticker)
+            if cached is not None and not cached.empty:
+                overlap = bars.index.intersection(cached.index)
+                if len(overlap) and abs(bars.at[overlap[-1], "close"] / cached.at[overlap[-1], "close"] - 1) \
+                        > ADJUSTMENT_TOLERANCE:
+                    logger.info(f"{ticker} 前复权价格已调整，以新获取的日线替换本地数据")
+                else:
+                    bars = bars.combine_first(cached)
+                    starts += [cached.attrs["history_start"]] if cached.attrs.get("history_start") else []
+            if starts:
+                bars.attrs["history_start"] = min(starts)
+            self._bars[ticker] = bars
+        self._save(ticker, bars)
+
+    def bars(self, ticker: str, history_days: Optional[int] = None) -> pd.DataFrame:
+        """返回单只股票的日线，当天首次读取时补齐到昨天
+
+        Args:
+            ticker: 股票代码
+            history_days: 需要的历史长度（自然日），默认使用构造时的设置；本地历史不够长时全量重拉
+        """
+        current = replay.now()
+        today = current.strftime("%Y-%m-%d")
+        end = current - timedelta(days=1)
+        start = end - timedelta(days=history_days or self._history_days)
+        with self._lock:
+            cached = self._load(ticker)
+            if cached is not None and cached.attrs.get("history_start", today) > start.strftime("%Y-%m-%d"):
+                cached = None
+            if cached is not None and self._updated.get(ticker) == today:
+                record_cache("price_store", True)
+                return cached
+
+        bars = cached
+        try:
+            if cached is None or cached.empty:
+                bars = _fetch_bars(ticker, start, end)
+            elif cached.index[-1] < pd.Timestamp(end.date()):
+                last = cached.index[-1]
+                recent = _fetch_bars(ticker, last.to_pydatetime(), end)
+                overlap = recent["close"].get(last)
+                if overlap is not None and abs(overlap / cached["close"].iloc[-1] - 1) > ADJUSTMENT_TOLERANCE:
+                    logger.info(f"{ticker} 前复权价格已调整，重新拉取完整历史")
+                    bars = _fetch_bars(ticker, start, end)
+                else:
+                    bars = pd.concat([cached, recent[recent.index > last]])
+                    bars.attrs["history_start"] = cached.attrs.get("history_start", today)
+        except Exception as e:
+            logger.warning(f"更新 {ticker} 行情失败，使用本地数据: {e}")
+            bars = cached if cached is not None else _empty_bars()
+
+        record_cache("price_store", bars is cached)
+        with self._lock:
+            self._bars[ticker] = bars
+            self._updated[ticker] = today
+        if bars is not cached:
+            self._save(ticker, bars)
+        return bars
+
+    def get(self, ticker: str) -> pd.Series:
+        """返回单只股票的收盘价"""
+        return self.bars(ticker)["close"].rename(ticker)
+
+    def load(self, tickers: Iterable[str], history_days: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+        """并发补齐多只股票的日线，返回 {代码: 日线}"""
+        tickers = list(dict.fromkeys(tickers))
+        workers = max(1, min(PRICE_STORE_WORKERS, len(tickers)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(tickers, pool.map(lambda t: self.bars(t, history_days), tickers)))
+
+    def closes(self, tickers: Iterable[str], days: Optional[int] = None,
+               history_days: Optional[int] = None) -> pd.DataFrame:
+        """多只股票的收盘价宽表（日期 × 股票）
+
+        Args:
+            tickers: 股票代码
+            days: 只保留最近 days 个交易日
+            history_days: 需要的历史长度（自然日），默认使用构造时的设置
+        """
+        tickers = list(dict.fromkeys(tickers))
+        bars = self.load(tickers, history_days)
+        frame = pd.DataFrame({ticker: bars[ticker]["close"] for ticker in tickers}, columns=tickers).sort_index()
+        if days:
+            frame = frame.iloc[-days:]
+        return frame.astype(np.float64)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_price_store() -> PriceStore:
+    """返回进程内共享的本地价格存储，首次调用时创建"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceStore()
+        return _store
@@ -0,0 +1,106 @@
+import ast
+import os
+
+import numpy as np
+import pandas as pd
+
+# 单个变量摘要的最大字符数，避免把大对象整段塞进 LLM 上下文
+MAX_SUMMARY_CHARS = int(os.getenv("PY_INTER_MAX_SUMMARY_CHARS", "2000"))
+# DataFrame/Series/ndarray 预览的行数
+HEAD_ROWS = int(os.getenv("PY_INTER_HEAD_ROWS", "5"))
+# dtypes 列表最多展示的列数
+MAX_DTYPE_COLUMNS = 50
+
+
+def _truncate(text: str, limit: int = MAX_SUMMARY_CHARS) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...（已截断，共 {len(text)} 字符）"
+
+
+def summarize_value(value) -> str:
+    """生成对象的有界摘要
+
+    DataFrame 返回 shape、dtypes、head 和内存占用，而不是整表字符串化；
+    其余对象使用截断后的 repr。
+
+    Args:
+        value: 任意 Python 对象
+
+    Returns:
+        长度受 MAX_SUMMARY_CHARS 限制的摘要字符串
+    """
+    if isinstance(value, pd.DataFrame):
+        dtypes = value.dtypes
+        dtype_text = dtypes.head(MAX_DTYPE_COLUMNS).to_string()
+        if len(dtypes) > MAX_DTYPE_COLUMNS:
+            dtype_text += f"\n...（共 {len(dtypes)} 列）"
+        # deep=False 不逐个扫描 object 列中的字符串，保证摘要开销与行数无关
+        memory = int(value.memory_usage(index=True, deep=False).sum())
+        text = (
+            f"DataFrame shape={value.shape}\n"
+            f"dtypes:\n{dtype_text}\n"
+            f"head:\n{value.head(HEAD_ROWS).to_string()}\n"
+            f"memory_usage={memory} bytes"
+        )
+    elif isinstance(value, pd.Series):
+        memory = int(value.memory_usage(index=True, deep=False))
+        text = (
+            f"Series name={value.name!r} length={len(value)} dtype={value.dtype}\n"
+            f"head:\n{value.head(HEAD_ROWS).to_string()}\n"
+            f"memory_usage={memory} bytes"
+        )
+    elif isinstance(value, np.ndarray):
+        preview = np.array2string(value.ravel()[:HEAD_ROWS * 4], threshold=HEAD_ROWS * 4)
+        text = f"ndarray shape={value.shape} dtype={value.dtype} nbytes={value.nbytes}\npreview: {preview}"
+    else:
+        text = repr(value)
+    return _truncate(text)
+
+
+def run_python_code(py_code: str, namespace: dict) -> str:
+    """在给定命名空间中执行一段 Python 代码并返回结果摘要
+
+    代码只解析、编译一次：若最后一条语句是表达式，则先 exec 前面的语句，
+    再 eval 该表达式取值，避免原先 eval 失败后整段代码再被 exec 一遍导致副作用执行两次。
+
+    Args:
+        py_code: Python 代码字符串
+        namespace: 执行所用的全局命名空间（会被就地修改）
+
+    Returns:
+        表达式结果及新建/重新绑定变量的摘要；出错时返回错误信息
+    """
+    try:
+        tree = ast.parse(py_code, mode="exec")
+    except SyntaxError as e:
+        return f"代码执行时报错{e}"
+
+    last_expr = None
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        last_expr = ast.Expression(body=tree.body.pop().value)
+
+    # 浅拷贝只保存引用，用 is 比较即可识别新建或重新绑定的变量
+    before = dict(namespace)
+    try:
+        if tree.body:
+            exec(compile(tree, "<python_inter>", "exec"), namespace)
+        result = None
+        if last_expr is not None:
+            result = eval(compile(last_expr, "<python_inter>", "eval"), namespace)
+    except Exception as e:
+        return f"代码执行时报错{e}"
+
+    changed = [
+        name for name, value in namespace.items()
+        if not name.startswith("__")
+        and (name not in before or before[name] is not value)
+    ]
+
+    sections = [f"{name}: {summarize_value(namespace[name])}" for name in changed]
+    if result is not None:
+        sections.append(summarize_value(result))
+
+    if not sections:
+        return "已经顺利执行代码"
+    return "\n\n".join(sections)
@@ -0,0 +1,249 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.logging_config import setup_logger
+from utils.metrics import metrics, record_cache
+
+logger = setup_logger('query_cache')
+
+# 缓存结果占用的字节上限，超过后按 LRU 淘汰
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 只缓存只读查询
+_CACHEABLE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+# 含有非确定性函数或加锁语义的查询不缓存
+_NON_DETERMINISTIC = re.compile(
+    r"\b(now|rand|uuid|sysdate|curdate|curtime|current_date|current_time|current_timestamp|"
+    r"unix_timestamp|last_insert_id|connection_id|found_rows)\b\s*\(?|\bfor\s+update\b|\block\s+in\s+share\s+mode\b|"
+    r"\binto\s+(outfile|dumpfile|@)",
+    re.IGNORECASE,
+)
+_IDENT = r"(?:`[^`]+`|\w+)"
+_FROM = re.compile(r"\bfrom\b", re.IGNORECASE)
+# FROM 子句中每一项开头的表名（可带库名）
+_TABLE_NAME = re.compile(rf"\s*({_IDENT}(?:\s*\.\s*{_IDENT})?)")
+_FROM_TOKEN = re.compile(r"`[^`]*`|[(),]|\w+")
+# FROM 子句中分隔各表的关键字，以及结束 FROM 子句的关键字
+_JOIN_KEYWORDS = {"join", "straight_join"}
+_CLAUSE_END = {
+    "where", "group", "order", "limit", "having", "union", "window", "for", "lock", "into", "except", "intersect",
+}
+# WITH 子句定义的公用表表达式名称，不是真实的表
+_CTE_NAME = re.compile(rf"(?:\bwith(?:\s+recursive)?|,)\s*({_IDENT})\s*(?:\([^()]*\))?\s+as\s*\(", re.IGNORECASE)
+# 参数中含 FROM 关键字的函数，如 EXTRACT(YEAR FROM date)
+_FUNCTION_FROM = re.compile(r"\b(?:extract|trim|substring|substr|position)\s*\([^()]*\)", re.IGNORECASE)
+# 字符串字面量或空白
+_TOKEN = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\")|\s+")
+
+
+def normalize_sql(sql_query: str) -> str:
+    """规范化 SQL 文本作为缓存键：合并字符串字面量以外的空白并去掉末尾分号"""
+    def _replace(match):
+        return match.group(1) if match.group(1) else " "
+    return _TOKEN.sub(_replace, sql_query).strip().rstrip(";").strip()
+
+
+def referenced_tables(sql_query: str) -> Tuple[str, ...]:
+    """提取查询引用的表名
+
+    包括 FROM / JOIN 之后的全部表（含 "FROM a, b" 中逗号分隔的每个表），带库名的保留为 "库.表"。
+    字符串字面量、WITH 子句定义的名称和 EXTRACT(... FROM ...) 等函数参数不计入。
+    """
+    sql_query = _TOKEN.sub(lambda m: "''" if m.group(1) else " ", sql_query)
+    sql_query = _FUNCTION_FROM.sub(" ", sql_query)
+    ctes = {name.replace("`", "").lower() for name in _CTE_NAME.findall(sql_query)}
+    tables = set()
+    for keyword in _FROM.finditer(sql_query):
+        for item in _from_items(sql_query, keyword.end()):
+            ref = _TABLE_NAME.match(item)
+            # 子查询 "FROM (SELECT ...)" 中的表由内层的 FROM 提取
+            if ref is None:
+                continue
+            name = ref.group(1).replace("`", "").replace(" ", "")
+            if name.lower() not in ctes:
+                tables.add(name)
+    return tuple(sorted(tables))
+
+
+def _from_items(sql_query: str, start: int):
+    """把从 start 开始的 FROM 子句按最外层的逗号和 JOIN 拆分，每一项以表名或子查询开头"""
+    depth = 0
+    item_start = start
+    for match in _FROM_TOKEN.finditer(sql_query, start):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif depth == 0:
+            lowered = token.lower()
+            if token == "," or lowered in _JOIN_KEYWORDS:
+                yield sql_query[item_start:match.start()]
+                item_start = match.end()
+            elif lowered in _CLAUSE_END:
+                yield sql_query[item_start:match.start()]
+                return
+    else:
+        yield sql_query[item_start:]
+        return
+    yield sql_query[item_start:match.start()]
+
+
+def is_cacheable(sql_query: str) -> bool:
+    return bool(_CACHEABLE.match(sql_query)) and not _NON_DETERMINISTIC.search(sql_query)
+
+
+def table_versions(connection, tables: Tuple[str, ...]) -> Optional[Tuple]:
+    """从 information_schema 读取表的版本信息
+
+    版本由 UPDATE_TIME、CHECKSUM、TABLE_ROWS、DATA_LENGTH 组成，任一变化都会使相关缓存失效。
+    不带库名的表按当前库查找。
+
+    Args:
+        connection: pymysql 连接
+        tables: referenced_tables 返回的表名元组
+
+    Returns:
+        可比较的版本元组；没有引用任何表，或有表在 information_schema 中找不到（视图别名、
+        临时表、无法识别的写法等）时返回 None，表示无法判断失效，不应缓存
+    """
+    if not tables:
+        return None
+    refs = [tuple(name.split(".", 1)) if "." in name else (None, name) for name in tables]
+    with connection.cursor() as cursor:
+        try:
+            # MySQL 8 默认缓存 information_schema 统计信息，关闭后 UPDATE_TIME 才能及时反映写入
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except Exception:
+            pass
+        conditions = " OR ".join(["(TABLE_SCHEMA = COALESCE(%s, DATABASE()) AND TABLE_NAME = %s)"] * len(refs))
+        cursor.execute(
+            "SELECT TABLE_SCHEMA, TABLE_NAME, UPDATE_TIME, CHECKSUM, TABLE_ROWS, DATA_LENGTH, "
+            "TABLE_SCHEMA = DATABASE() FROM information_schema.TABLES "
+            f"WHERE {conditions} ORDER BY TABLE_SCHEMA, TABLE_NAME",
+            [value for ref in refs for value in ref],
+        )
+        rows = cursor.fetchall()
+    found = {(row[0].lower(), row[1].lower()) for row in rows}
+    found.update((None, row[1].lower()) for row in rows if row[6])
+    if any((schema.lower() if schema else None, name.lower()) not in found for schema, name in refs):
+        return None
+    return tuple((row[0], row[1], str(row[2]), row[3], row[4], row[5]) for row in rows)
+
+
+class QueryResultCache:
+    """SQL 查询结果的 LRU 缓存
+
+    以规范化后的 SQL 为键，同时记录查询时各引用表的版本；命中时若表版本已变化则视为失效。
+    缓存总大小受字节预算约束，超出时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Tuple, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key: str, versions: Tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            cached_versions, result = entry
+            if cached_versions != versions:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, versions: Tuple, result: str) -> None:
+        size = len(result.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (versions, result)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, result = self._entries.pop(key)
+        self._bytes -= len(result.encode("utf-8"))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率等统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# 进程内共享的查询结果缓存，跨会话复用
+query_cache = QueryResultCache()
+metrics.register_collector("query_cache", query_cache.stats)
+
+
+def cached_query(connection, sql_query: str, run_query) -> str:
+    """带缓存地执行只读查询
+
+    Args:
+        connection: pymysql 连接，用于读取表版本
+        sql_query: SQL 语句
+        run_query: 实际执行查询并返回结果字符串的函数
+
+    Returns:
+        查询结果字符串
+    """
+    if not is_cacheable(sql_query):
+        return run_query()
+
+    key = normalize_sql(sql_query)
+    try:
+        versions = table_versions(connection, referenced_tables(sql_query))
+    except Exception as e:
+        logger.warning(f"读取表版本失败，跳过查询缓存: {e}")
+        return run_query()
+    if versions is None:
+        logger.debug("查询引用的表无法全部确认版本，不缓存")
+        return run_query()
+
+    result = query_cache.get(key, versions)
+    record_cache("sql_query", result is not None)
+    if result is not None:
+        logger.info(f"查询缓存命中，统计: {query_cache.stats()}")
+        return result
+
+    result = run_query()
+    query_cache.put(key, versions, result)
+    logger.debug(f"查询缓存未命中，统计: {query_cache.stats()}")
+    return result
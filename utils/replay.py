@@ -0,0 +1,180 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, List, Optional
+
+from utils.logging_config import setup_logger
+
+logger = setup_logger('replay')
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# off：直接调用；record：调用并保存响应；replay：只读取已保存的响应；auto：有记录时回放，否则调用并记录
+DATA_AGENT_REPLAY = os.getenv("DATA_AGENT_REPLAY", "off").lower()
+DATA_AGENT_FIXTURES = os.getenv("DATA_AGENT_FIXTURES", os.path.join(project_root, "fixtures", "replay"))
+# 固定 now() 返回的时间（ISO 格式，如 2025-03-11T15:00:00）；为空时录制开始的时间会保存到录制目录的 clock.json
+DATA_AGENT_REPLAY_NOW = os.getenv("DATA_AGENT_REPLAY_NOW", "")
+
+_MODES = ("off", "record", "replay", "auto")
+_CLOCK_FILE = "clock.json"
+
+_mode = DATA_AGENT_REPLAY if DATA_AGENT_REPLAY in _MODES else "off"
+_write_lock = threading.Lock()
+_clock: Optional[datetime] = None
+_clock_override: Optional[datetime] = None
+_clock_lock = threading.Lock()
+_misses: List[str] = []
+_misses_lock = threading.Lock()
+
+
+class ReplayMissError(KeyError):
+    """回放模式下找不到对应的录制数据"""
+
+
+def set_mode(mode: str) -> None:
+    """切换录制/回放模式，供测试和基准脚本在运行时设置"""
+    global _mode, _clock
+    if mode not in _MODES:
+        raise ValueError(f"未知的回放模式: {mode}，可选值为 {_MODES}")
+    with _clock_lock:
+        _mode = mode
+        _clock = None
+
+
+def get_mode() -> str:
+    return _mode
+
+
+def set_now(value: Optional[datetime]) -> None:
+    """固定 now() 返回的时间，传入 None 时恢复默认行为"""
+    global _clock_override
+    _clock_override = value
+
+
+def now() -> datetime:
+    """业务代码中代替 datetime.now() 使用的当前时间
+
+    由“今天/昨天”推导的默认日期（行情区间、近期新闻筛选等）会进入外部调用的参数和 LLM 提示词。
+    录制时把开始录制的时间保存到录制目录的 clock.json，回放时读取，使这些参数在之后任何一天回放都与录制时相同；
+    显式传入的绝对日期不受影响，原样参与生成键。off 模式下返回真实时间（设置了 DATA_AGENT_REPLAY_NOW 时除外）。
+
+    Raises:
+        ReplayMissError: replay 模式下录制目录中没有 clock.json
+    """
+    global _clock
+    if _clock_override is not None:
+        return _clock_override
+    if DATA_AGENT_REPLAY_NOW:
+        return datetime.fromisoformat(DATA_AGENT_REPLAY_NOW)
+    if _mode == "off":
+        return datetime.now()
+    with _clock_lock:
+        if _clock is None:
+            path = os.path.join(DATA_AGENT_FIXTURES, _CLOCK_FILE)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    _clock = datetime.fromisoformat(json.load(f)["now"])
+            elif _mode == "replay":
+                raise ReplayMissError(f"没有找到录制时间 {path}，请先以 record 模式录制")
+            else:
+                _clock = datetime.now().replace(microsecond=0)
+                os.makedirs(DATA_AGENT_FIXTURES, exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({"now": _clock.isoformat()}, f)
+                logger.info(f"录制时间固定为 {_clock.isoformat()}，保存在 {path}")
+        return _clock
+
+
+def misses() -> List[str]:
+    """返回进程启动以来回放未命中的调用（"类型.名称: 路径"）"""
+    with _misses_lock:
+        return list(_misses)
+
+
+def call_key(kind: str, name: str, args: tuple, kwargs: dict) -> str:
+    """根据调用类型、名称和参数生成录制文件名
+
+    参数原样参与生成键；由“今天”推导的日期在录制和回放时都取自 now()，因此保持一致。
+    """
+    raw = json.dumps([kind, name, args, kwargs], ensure_ascii=False, sort_keys=True, default=repr)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _fixture_path(kind: str, name: str, key: str) -> str:
+    return os.path.join(DATA_AGENT_FIXTURES, kind, re.sub(r"\W", "_", name), f"{key}.pkl")
+
+
+def _save(path: str, record: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with _write_lock:
+        os.replace(tmp_path, path)
+
+
+def call(kind: str, name: str, func: Callable, *args, **kwargs) -> Any:
+    """按当前模式执行、录制或回放一次外部调用
+
+    异常也会被录制，回放时原样抛出，保证失败路径同样可以离线复现。
+
+    Args:
+        kind: 调用类型，如 "akshare"、"tavily"、"llm"
+        name: 接口名称
+        func: 实际执行调用的函数
+        *args, **kwargs: 调用参数
+
+    Returns:
+        调用结果或录制的结果
+    """
+    mode = _mode
+    if mode == "off":
+        return func(*args, **kwargs)
+
+    key = call_key(kind, name, args, kwargs)
+    path = _fixture_path(kind, name, key)
+    if mode in ("replay", "auto") and os.path.exists(path):
+        with open(path, "rb") as f:
+            record = pickle.load(f)
+        if record.get("error") is not None:
+            raise record["error"]
+        return record["result"]
+    if mode == "replay":
+        with _misses_lock:
+            _misses.append(f"{kind}.{name}: {path}")
+        raise ReplayMissError(f"没有找到 {kind}.{name} 的录制数据: {path}")
+
+    record = {"kind": kind, "name": name, "args": args, "kwargs": kwargs,
+              "recorded_at": time.time(), "result": None, "error": None}
+    try:
+        record["result"] = func(*args, **kwargs)
+        return record["result"]
+    except Exception as e:
+        record["error"] = e
+        raise
+    finally:
+        try:
+            _save(path, record)
+        except Exception as e:
+            logger.warning(f"保存 {kind}.{name} 的录制数据失败: {e}")
+
+
+def replayable(kind: str, name: str) -> Callable:
+    """装饰器形式的 call()
+
+    Example:
+        @replayable("llm", "get_chat_completion")
+        def get_chat_completion(messages, ...): ...
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return call(kind, name, func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.db import get_connection
+from utils.logging_config import setup_logger
+
+logger = setup_logger('schema_catalog')
+
+# 缓存有效期（秒），0 表示只在显式刷新时重新加载
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "0"))
+# 加载失败后的退避时间（秒），期间直接返回上次的错误，不再每步都连接数据库
+SCHEMA_RETRY_BACKOFF = float(os.getenv("SCHEMA_RETRY_BACKOFF", "30"))
+# 每列保留的样例值个数
+SCHEMA_SAMPLE_VALUES = int(os.getenv("SCHEMA_SAMPLE_VALUES", "3"))
+# 注入 prompt 的 schema 文本最大长度
+SCHEMA_PROMPT_MAX_CHARS = int(os.getenv("SCHEMA_PROMPT_MAX_CHARS", "6000"))
+# 样例值的最大字符数
+_SAMPLE_VALUE_CHARS = 30
+
+
+class SchemaCatalog:
+    """MySQL 表结构目录缓存
+
+    从 information_schema 一次性加载当前库中所有表的列名、类型、行数和样例值，
+    之后的查询直接读取内存，避免 Agent 反复执行 SHOW TABLES / DESCRIBE。
+    """
+
+    def __init__(self, connection_factory: Callable = get_connection, ttl: float = SCHEMA_CACHE_TTL):
+        self._connection_factory = connection_factory
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._tables: Optional[Dict[str, Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+        self._failed_at = 0.0
+        self._error: Optional[Exception] = None
+
+    def _expired(self) -> bool:
+        return self._ttl > 0 and time.time() - self._loaded_at > self._ttl
+
+    def load(self, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """返回 schema 目录，必要时从数据库加载
+
+        加载失败后的 SCHEMA_RETRY_BACKOFF 秒内直接抛出上次的错误，强制刷新时除外。
+
+        Args:
+            refresh: 是否强制重新加载
+
+        Returns:
+            {表名: {"rows": 行数, "update_time": 更新时间, "columns": [...]}}
+        """
+        with self._lock:
+            if self._tables is None or refresh or self._expired():
+                if not refresh and self._error is not None and time.time() - self._failed_at < SCHEMA_RETRY_BACKOFF:
+                    raise self._error
+                try:
+                    self._tables = self._fetch()
+                except Exception as e:
+                    self._error, self._failed_at = e, time.time()
+                    raise
+                self._error = None
+                self._loaded_at = time.time()
+            return self._tables
+
+    def _fetch(self) -> Dict[str, Dict[str, Any]]:
+        logger.info("正在从 information_schema 加载表结构...")
+        connection = self._connection_factory()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT TABLE_NAME, TABLE_ROWS, UPDATE_TIME FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME"
+                )
+                tables = {
+                    name: {"rows": rows, "update_time": str(update_time) if update_time else None, "columns": []}
+                    for name, rows, update_time in cursor.fetchall()
+                }
+
+                cursor.execute(
+                    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_KEY FROM information_schema.COLUMNS "
+                    "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, ORDINAL_POSITION"
+                )
+                for table_name, column_name, column_type, column_key in cursor.fetchall():
+                    if table_name in tables:
+                        tables[table_name]["columns"].append({
+                            "name": column_name,
+                            "type": column_type,
+                            "key": column_key or "",
+                            "samples": [],
+                        })
+
+                # 每张表只取少量行作为样例值
+                if SCHEMA_SAMPLE_VALUES > 0:
+                    for table_name, info in tables.items():
+                        cursor.execute(f"SELECT * FROM `{table_name}` LIMIT {SCHEMA_SAMPLE_VALUES * 3}")
+                        rows = cursor.fetchall()
+                        for i, column in enumerate(info["columns"]):
+                            samples: List[str] = []
+                            for row in rows:
+                                value = row[i] if i < len(row) else None
+                                if value is None:
+                                    continue
+                                text = str(value)[:_SAMPLE_VALUE_CHARS]
+                                if text not in samples:
+                                    samples.append(text)
+                                if len(samples) >= SCHEMA_SAMPLE_VALUES:
+                                    break
+                            column["samples"] = samples
+        finally:
+            connection.close()
+
+        logger.info(f"表结构加载完成，共 {len(tables)} 张表")
+        return tables
+
+    def describe(self, table_name: Optional[str] = None, refresh: bool = False) -> str:
+        """生成紧凑的 schema 文本
+
+        Args:
+            table_name: 只描述指定表，为空时描述全部表
+            refresh: 是否强制重新加载
+
+        Returns:
+            每张表一行的 schema 描述
+        """
+        tables = self.load(refresh=refresh)
+        if table_name:
+            if table_name not in tables:
+                return f"未找到表 {table_name}，可用的表有: {', '.join(tables)}"
+            tables = {table_name: tables[table_name]}
+
+        lines = []
+        for name, info in tables.items():
+            columns = []
+            for column in info["columns"]:
+                text = f"{column['name']} {column['type']}"
+                if column["key"] == "PRI":
+                    text += " PK"
+                if column["samples"]:
+                    text += f" e.g. {'/'.join(column['samples'])}"
+                columns.append(text)
+            lines.append(f"{name}(rows≈{info['rows']}): {', '.join(columns)}")
+        return "\n".join(lines)
+
+    def prompt_text(self, max_chars: int = SCHEMA_PROMPT_MAX_CHARS) -> str:
+        """生成注入系统提示词的 schema 文本，加载失败时返回空字符串"""
+        try:
+            text = self.describe()
+        except Exception as e:
+            logger.warning(f"加载表结构失败，提示词中不包含 schema: {e}")
+            return ""
+        if len(text) > max_chars:
+            text = text[:max_chars] + "\n...（更多表结构请调用 get_schema 工具查询）"
+        return text
+
+
+# 进程内共享的 schema 目录
+schema_catalog = SchemaCatalog()
@@ -0,0 +1,291 @@
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.logging_config import setup_logger
+from utils import replay
+
+logger = setup_logger('sentiment_prefilter')
+
+# 是否启用本地预打分
+SENTIMENT_PREFILTER = os.getenv("SENTIMENT_PREFILTER", "1") != "0"
+# 本地打分与LLM打分之间允许的平均绝对误差（在留出集上度量）
+SENTIMENT_PREFILTER_TOLERANCE = float(os.getenv("SENTIMENT_PREFILTER_TOLERANCE", "0.15"))
+# 本地打分的最低置信度，即使留出集误差允许也不会低于该值
+SENTIMENT_PREFILTER_MIN_CONFIDENCE = float(os.getenv("SENTIMENT_PREFILTER_MIN_CONFIDENCE", "0.8"))
+# 训练分类器所需的最少LLM标注条数
+SENTIMENT_PREFILTER_MIN_SAMPLES = int(os.getenv("SENTIMENT_PREFILTER_MIN_SAMPLES", "200"))
+# 用于特征提取的正文长度
+SENTIMENT_PREFILTER_TEXT_CHARS = int(os.getenv("SENTIMENT_PREFILTER_TEXT_CHARS", "300"))
+# 程序性公告中仍交给LLM打分的比例，用于持续积累度量公告规则所需的标注
+SENTIMENT_PREFILTER_BOILERPLATE_SAMPLE = float(os.getenv("SENTIMENT_PREFILTER_BOILERPLATE_SAMPLE", "0.1"))
+# 启用程序性公告规则所需的最少LLM标注条数，不足时视为尚未度量
+SENTIMENT_PREFILTER_BOILERPLATE_MIN_SAMPLES = int(os.getenv("SENTIMENT_PREFILTER_BOILERPLATE_MIN_SAMPLES", "30"))
+# 标注数据增长超过该比例时重新训练
+_RETRAIN_GROWTH = 0.2
+# 两次检查标注数据量之间的最短间隔（秒），避免每次打分都查询缓存
+_RETRAIN_CHECK_SECONDS = 60
+_HOLDOUT_RATIO = 0.2
+
+# 情感分数按阈值划分为 消极 / 中性 / 积极 三类
+_POLARITY_THRESHOLD = 0.3
+_CLASSES = (-1, 0, 1)
+
+# 程序性公告：通常不含利好利空信息，LLM几乎总是给出0分
+_BOILERPLATE_PATTERNS = re.compile(
+    r"(股东大会|董事会|监事会).{0,10}(通知|决议|公告)|提示性公告|法律意见书|核查意见|"
+    r"独立董事.{0,10}意见|持续督导|公司章程|议事规则|工作制度|管理制度|内幕信息知情人|"
+    r"会计师事务所.{0,10}(说明|报告)|募集资金.{0,10}(存放|使用情况)|投资者关系活动记录表"
+)
+# 含有这些词的标题即使形式上是公告也交给LLM判断
+_POLAR_WORDS = re.compile(
+    r"预增|预减|预亏|扭亏|亏损|增长|下滑|中标|签订|重组|并购|收购|减持|增持|回购|处罚|立案|"
+    r"问询|诉讼|冻结|质押|违规|退市|风险警示|终止|分红|送转"
+)
+_NON_TEXT = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+(\.\d+)?")
+
+
+def article_text(news: dict) -> str:
+    """提取用于本地打分的文本：标题加正文开头，以换行分隔"""
+    return f"{news.get('title', '')}\n{str(news.get('content', ''))[:SENTIMENT_PREFILTER_TEXT_CHARS]}"
+
+
+def _features(text: str) -> Counter:
+    """字符二元组特征，数字统一替换为占位符"""
+    text = _DIGITS.sub("0", _NON_TEXT.sub("", text))
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def _polarity(score: float) -> int:
+    if score >= _POLARITY_THRESHOLD:
+        return 1
+    if score <= -_POLARITY_THRESHOLD:
+        return -1
+    return 0
+
+
+def is_boilerplate(news: dict) -> bool:
+    """标题是否为程序性公告且不含明显的利好利空词"""
+    title = str(news.get('title', ''))
+    return bool(_BOILERPLATE_PATTERNS.search(title)) and not _POLAR_WORDS.search(title)
+
+
+def _sampled_for_labeling(news: dict) -> bool:
+    """按文本哈希抽取固定比例的新闻交给LLM，同一条新闻每次的结果相同"""
+    bucket = zlib.crc32(article_text(news).encode("utf-8")) % 10000
+    return bucket < SENTIMENT_PREFILTER_BOILERPLATE_SAMPLE * 10000
+
+
+class NaiveBayesSentiment:
+    """基于字符二元组的多项式朴素贝叶斯三分类器
+
+    预测分数为各类别概率与该类别LLM平均分的加权和，置信度为最大类别概率。
+    """
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self._log_prior: Dict[int, float] = {}
+        self._log_likelihood: Dict[int, Dict[str, float]] = {}
+        self._log_unknown: Dict[int, float] = {}
+        self._class_means: Dict[int, float] = {}
+
+    def fit(self, texts: Sequence[str], scores: Sequence[float]) -> "NaiveBayesSentiment":
+        counts: Dict[int, Counter] = {c: Counter() for c in _CLASSES}
+        docs: Dict[int, int] = defaultdict(int)
+        score_sums: Dict[int, float] = defaultdict(float)
+        for text, score in zip(texts, scores):
+            label = _polarity(score)
+            counts[label].update(_features(text))
+            docs[label] += 1
+            score_sums[label] += score
+
+        vocabulary = set()
+        for counter in counts.values():
+            vocabulary.update(counter)
+        vocab_size = len(vocabulary) + 1
+        total_docs = sum(docs.values())
+
+        for label in _CLASSES:
+            total = sum(counts[label].values()) + self.alpha * vocab_size
+            self._log_prior[label] = math.log((docs[label] + 1) / (total_docs + len(_CLASSES)))
+            self._log_likelihood[label] = {
+                token: math.log((count + self.alpha) / total) for token, count in counts[label].items()
+            }
+            self._log_unknown[label] = math.log(self.alpha / total)
+            self._class_means[label] = score_sums[label] / docs[label] if docs[label] else float(label) * 0.5
+        return self
+
+    def predict(self, text: str) -> Tuple[float, float]:
+        """返回 (预测分数, 置信度)"""
+        features = _features(text)
+        log_probs = {}
+        for label in _CLASSES:
+            likelihood = self._log_likelihood[label]
+            unknown = self._log_unknown[label]
+            log_probs[label] = self._log_prior[label] + sum(
+                count * likelihood.get(token, unknown) for token, count in features.items()
+            )
+        top = max(log_probs.values())
+        weights = {label: math.exp(value - top) for label, value in log_probs.items()}
+        total = sum(weights.values())
+        probs = {label: weight / total for label, weight in weights.items()}
+        score = sum(probs[label] * self._class_means[label] for label in _CLASSES)
+        return score, max(probs.values())
+
+
+class SentimentPrefilter:
+    """LLM 打分前的本地情感预打分
+
+    用情感缓存中积累的LLM标注训练轻量分类器，在CPU上对新闻打分；
+    只有置信度达到阈值的新闻在本地给出分数，其余交给LLM。部署的模型只在训练集上拟合，
+    阈值在留出集上为该模型选取，保证本地打分与LLM打分的平均绝对误差不超过 SENTIMENT_PREFILTER_TOLERANCE。
+    训练在后台线程中进行，打分不等待训练完成，期间沿用旧模型（或全部交给LLM）。
+    程序性公告规则初始停用：公告中按 SENTIMENT_PREFILTER_BOILERPLATE_SAMPLE 抽样的一部分始终交给LLM，
+    积累到 SENTIMENT_PREFILTER_BOILERPLATE_MIN_SAMPLES 条标注且误差在容差内时才启用，误差超出后再次停用。
+    """
+
+    def __init__(self, cache, tolerance: float = SENTIMENT_PREFILTER_TOLERANCE):
+        self._cache = cache
+        self._tolerance = tolerance
+        self._lock = threading.Lock()
+        self._train_lock = threading.Lock()
+        self._model: Optional[NaiveBayesSentiment] = None
+        self._threshold = 1.1
+        self._boilerplate_enabled = False
+        self._trained_samples = 0
+        self._training = False
+        self._checked_at = 0.0
+        self.metrics: Dict[str, float] = {}
+
+    def _maybe_train(self) -> None:
+        """按需启动后台训练；录制/回放模式下同步训练，保证打分结果可复现"""
+        if replay.get_mode() != "off":
+            self._train_if_grown()
+            return
+        now = time.time()
+        with self._lock:
+            if self._training or now - self._checked_at < _RETRAIN_CHECK_SECONDS:
+                return
+            self._training, self._checked_at = True, now
+        threading.Thread(target=self._background_train, name="sentiment_prefilter_train", daemon=True).start()
+
+    def _background_train(self) -> None:
+        try:
+            self._train_if_grown()
+        finally:
+            with self._lock:
+                self._training = False
+
+    def _train_if_grown(self) -> None:
+        """标注数据达到最少条数、且比上次训练时增长超过 _RETRAIN_GROWTH 时重新训练"""
+        with self._train_lock:
+            try:
+                labeled_count = self._cache.count_labeled()
+                if labeled_count < SENTIMENT_PREFILTER_MIN_SAMPLES:
+                    return
+                if self._model is not None and labeled_count < self._trained_samples * (1 + _RETRAIN_GROWTH):
+                    return
+                self.train(self._cache.labeled_texts())
+            except Exception as e:
+                logger.warning(f"训练情感预打分模型失败: {e}")
+
+    def train(self, samples: List[Tuple[str, float]]) -> None:
+        """在 (文本, LLM分数) 样本上训练分类器并选取置信度阈值
+
+        阈值是在留出集上为训练集模型选取的，因此部署的就是这个模型，而不是在全部样本上重新拟合的模型。
+        """
+        samples = list(samples)
+        random.Random(0).shuffle(samples)
+        split = max(1, int(len(samples) * _HOLDOUT_RATIO))
+        holdout, train = samples[:split], samples[split:]
+
+        model = NaiveBayesSentiment().fit([t for t, _ in train], [s for _, s in train])
+        predictions = sorted(
+            ((*model.predict(text), score) for text, score in holdout),
+            key=lambda item: item[1], reverse=True,
+        )
+
+        # 按置信度从高到低累加，取误差仍在容差内的最长前缀
+        threshold, accepted, error_sum, accepted_error = 1.1, 0, 0.0, 0.0
+        for i, (predicted, confidence, score) in enumerate(predictions, 1):
+            error_sum += abs(predicted - score)
+            if confidence < SENTIMENT_PREFILTER_MIN_CONFIDENCE:
+                break
+            if error_sum / i <= self._tolerance:
+                threshold, accepted, accepted_error = confidence, i, error_sum / i
+
+        # 程序性公告规则在全部标注数据上度量，样本不足时视为未度量，保持停用
+        boilerplate_errors = [
+            abs(score) for text, score in samples if is_boilerplate({"title": text.split("\n", 1)[0]})
+        ]
+        boilerplate_mae = (sum(boilerplate_errors) / len(boilerplate_errors)
+                           if len(boilerplate_errors) >= SENTIMENT_PREFILTER_BOILERPLATE_MIN_SAMPLES else None)
+
+        with self._lock:
+            self._model = model
+            self._threshold = threshold
+            self._boilerplate_enabled = boilerplate_mae is not None and boilerplate_mae <= self._tolerance
+            self._trained_samples = len(samples)
+            self.metrics = {
+                "samples": len(samples),
+                "threshold": threshold,
+                "holdout_coverage": accepted / len(holdout),
+                "holdout_mae": accepted_error,
+                "boilerplate_samples": len(boilerplate_errors),
+                "boilerplate_mae": boilerplate_mae,
+                "boilerplate_enabled": self._boilerplate_enabled,
+            }
+        logger.info(f"情感预打分模型训练完成: {self.metrics}")
+
+    def score(self, news_list: list) -> List[Optional[float]]:
+        """对新闻做本地预打分
+
+        Args:
+            news_list (list): 新闻列表
+
+        Returns:
+            List[Optional[float]]: 与输入一一对应的本地分数，None表示需要交给LLM判断
+        """
+        if not SENTIMENT_PREFILTER:
+            return [None] * len(news_list)
+        self._maybe_train()
+        with self._lock:
+            model, threshold, boilerplate_enabled = self._model, self._threshold, self._boilerplate_enabled
+
+        scores: List[Optional[float]] = []
+        for news in news_list:
+            if is_boilerplate(news):
+                # 抽样的公告交给LLM打分，作为度量公告规则的标注
+                if _sampled_for_labeling(news):
+                    scores.append(None)
+                    continue
+                if boilerplate_enabled:
+                    scores.append(0.0)
+                    continue
+            if model is not None:
+                predicted, confidence = model.predict(article_text(news))
+                if confidence >= threshold:
+                    scores.append(max(-1.0, min(1.0, predicted)))
+                    continue
+            scores.append(None)
+        return scores
+
+
+_prefilter = None
+_prefilter_lock = threading.Lock()
+
+
+def get_sentiment_prefilter(cache) -> SentimentPrefilter:
+    """返回进程内共享的预打分器，首次调用时创建"""
+    global _prefilter
+    with _prefilter_lock:
+        if _prefilter is None:
+            _prefilter = SentimentPrefilter(cache)
+        return _prefilter
@@ -0,0 +1,100 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Mapping, Optional
+
+from utils.logging_config import setup_logger
+
+logger = setup_logger('signal_weights')
+
+# 信号权重配置文件，由 python -m backtest.optimizer 生成；不存在时使用下面的默认权重
+SIGNAL_WEIGHTS_PATH = os.getenv("SIGNAL_WEIGHTS_PATH", os.path.join("src", "data", "signal_weights.json"))
+
+# technical_analyst_agent 组合五个策略信号的权重
+DEFAULT_STRATEGY_WEIGHTS: Dict[str, float] = {
+    "trend": 0.30,
+    "mean_reversion": 0.25,
+    "momentum": 0.25,
+    "volatility": 0.15,
+    "stat_arb": 0.05,
+}
+
+# portfolio_management_agent 提示词中各分析的权重
+DEFAULT_AGENT_WEIGHTS: Dict[str, float] = {
+    "valuation": 0.35,
+    "fundamentals": 0.30,
+    "technical": 0.25,
+    "sentiment": 0.10,
+}
+
+DEFAULTS = {"strategy_weights": DEFAULT_STRATEGY_WEIGHTS, "agent_weights": DEFAULT_AGENT_WEIGHTS}
+
+
+def normalize_weights(weights: Mapping[str, Any], defaults: Mapping[str, float]) -> Dict[str, float]:
+    """校验并归一化一组权重：键必须与默认权重一致、取值非负且和为正
+
+    Raises:
+        ValueError: 权重不合法
+    """
+    if set(weights) != set(defaults):
+        raise ValueError(f"权重的键应为 {sorted(defaults)}，实际为 {sorted(weights)}")
+    values = {name: float(weights[name]) for name in defaults}
+    if any(v < 0 for v in values.values()) or sum(values.values()) <= 0:
+        raise ValueError(f"权重必须非负且和为正: {values}")
+    total = sum(values.values())
+    return {name: round(v / total, 6) for name, v in values.items()}
+
+
+def load_signal_weights(path: str = SIGNAL_WEIGHTS_PATH) -> Dict[str, Dict[str, float]]:
+    """读取信号权重配置，缺失或不合法的部分使用默认权重
+
+    Returns:
+        {"strategy_weights": {...}, "agent_weights": {...}}
+    """
+    result = {key: dict(value) for key, value in DEFAULTS.items()}
+    if not os.path.exists(path):
+        return result
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    except Exception as e:
+        logger.warning(f"读取信号权重配置 {path} 失败，使用默认权重: {e}")
+        return result
+    for key, defaults in DEFAULTS.items():
+        if key in config:
+            try:
+                result[key] = normalize_weights(config[key], defaults)
+            except ValueError as e:
+                logger.warning(f"信号权重配置中的 {key} 不合法，使用默认权重: {e}")
+    logger.info(f"已加载信号权重配置 {path}")
+    return result
+
+
+def save_signal_weights(
+    strategy_weights: Optional[Mapping[str, float]] = None,
+    agent_weights: Optional[Mapping[str, float]] = None,
+    meta: Optional[Dict[str, Any]] = None,
+    path: str = SIGNAL_WEIGHTS_PATH,
+) -> Dict[str, Any]:
+    """写入信号权重配置，未提供的部分保留文件中已有的值
+
+    先写临时文件再替换，避免进程启动时读到写了一半的文件。
+    """
+    current = load_signal_weights(path)
+    config = {
+        "strategy_weights": normalize_weights(strategy_weights, DEFAULT_STRATEGY_WEIGHTS)
+        if strategy_weights else current["strategy_weights"],
+        "agent_weights": normalize_weights(agent_weights, DEFAULT_AGENT_WEIGHTS)
+        if agent_weights else current["agent_weights"],
+        "meta": {"updated_at": datetime.now().isoformat(timespec="seconds"), **(meta or {})},
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return config
+
+
+# 进程启动时加载一次，修改配置文件后重启服务生效
+SIGNAL_WEIGHTS = load_signal_weights()
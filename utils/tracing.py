@@ -0,0 +1,270 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 链路导出方式：memory（默认，保存在内存中）、jsonl（同时追加写入文件）、none（关闭）
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "memory")
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", os.path.join(project_root, "logs", "traces.jsonl"))
+# 内存中保留的最近链路数
+TRACE_MAX_TRACES = int(os.getenv("TRACE_MAX_TRACES", "100"))
+
+
+class Span:
+    """一次调用的时间区间，字段与 OpenTelemetry Span 对应"""
+
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "kind", "attributes",
+                 "start_ns", "end_ns", "status", "status_message", "thread")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_span_id: Optional[str],
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "UNSET"
+        self.status_message = ""
+        self.thread = threading.current_thread().name
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """转换为 OTLP/JSON 格式的 span"""
+        def any_value(value):
+            if isinstance(value, bool):
+                return {"boolValue": value}
+            if isinstance(value, int):
+                return {"intValue": str(value)}
+            if isinstance(value, float):
+                return {"doubleValue": value}
+            return {"stringValue": str(value)}
+
+        attributes = {"span.kind": self.kind, "thread.name": self.thread, **self.attributes}
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": "SPAN_KIND_CLIENT" if self.kind in ("akshare", "llm", "tavily") else "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": k, "value": any_value(v)} for k, v in attributes.items()],
+            "status": {"code": f"STATUS_CODE_{self.status}", "message": self.status_message},
+        }
+
+
+class InMemorySpanExporter:
+    """按 trace_id 在内存中保存最近的链路"""
+
+    def __init__(self, max_traces: int = TRACE_MAX_TRACES):
+        self._max_traces = max_traces
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self._max_traces:
+                    self._traces.popitem(last=False)
+            spans.append(span)
+
+    def get_trace(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def trace_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._traces)
+
+
+class JsonLinesSpanExporter:
+    """把结束的 span 以 OTLP/JSON 格式逐行追加到文件"""
+
+    def __init__(self, path: str = TRACE_JSONL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_otlp(), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+
+memory_exporter = InMemorySpanExporter()
+_exporters: List[Any] = []
+if TRACE_EXPORTER != "none":
+    _exporters.append(memory_exporter)
+if TRACE_EXPORTER == "jsonl":
+    _exporters.append(JsonLinesSpanExporter())
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def set_span_attributes(**attributes) -> None:
+    """给当前 span 添加属性，不在链路中时忽略"""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def _end_span(span: Span, token, error: Optional[BaseException]) -> None:
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.status, span.status_message = "ERROR", f"{type(error).__name__}: {error}"
+    else:
+        span.status = "OK"
+    _current_span.reset(token)
+    for exporter in _exporters:
+        try:
+            exporter.export(span)
+        except Exception:
+            pass
+    if span.parent_span_id is None:
+        for exporter in _exporters:
+            if hasattr(exporter, "flush"):
+                exporter.flush()
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """开始一条新链路，返回根 span
+
+    Example:
+        with start_trace("workflow.run", ticker="000001") as root:
+            app.invoke(state)
+        trace_summary(root.trace_id)
+    """
+    span = Span(name, "root", secrets.token_hex(16), None, attributes)
+    token = _current_span.set(span)
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _end_span(span, token, error)
+
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", **attributes):
+    """在当前链路下创建子 span，不在任何链路中时不记录"""
+    parent = _current_span.get()
+    if parent is None or not _exporters:
+        yield None
+        return
+    span = Span(name, kind, parent.trace_id, parent.span_id, attributes)
+    token = _current_span.set(span)
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _end_span(span, token, error)
+
+
+def _children(spans: List[Span]) -> Dict[Optional[str], List[Span]]:
+    children = defaultdict(list)
+    for span in spans:
+        children[span.parent_span_id].append(span)
+    return children
+
+
+def _critical_chain(siblings: List[Span]) -> List[Span]:
+    """在同级 span 中找出决定结束时间的依赖链
+
+    从最晚结束的 span 开始，反复选取在其开始之前结束得最晚的 span，
+    即并行扇出中拖慢后续节点的那一支。
+    """
+    if not siblings:
+        return []
+    current = max(siblings, key=lambda s: s.end_ns or s.start_ns)
+    chain = [current]
+    while True:
+        before = [s for s in siblings if (s.end_ns or s.start_ns) <= current.start_ns]
+        if not before:
+            break
+        current = max(before, key=lambda s: s.end_ns or s.start_ns)
+        chain.append(current)
+    return list(reversed(chain))
+
+
+def critical_path(spans: List[Span]) -> List[Span]:
+    """计算链路的关键路径，逐层展开关键路径上每个 span 的子调用"""
+    children = _children(spans)
+    roots = children.get(None, [])
+    if not roots:
+        return []
+
+    def expand(span: Span) -> List[Span]:
+        path = [span]
+        for child in _critical_chain(children.get(span.span_id, [])):
+            path.extend(expand(child))
+        return path
+
+    return expand(roots[0])
+
+
+def trace_summary(trace_id: str, spans: Optional[List[Span]] = None) -> Dict[str, Any]:
+    """汇总一条链路：总耗时、关键路径，以及关键路径上各上游调用的耗时占比
+
+    Returns:
+        {"trace_id", "duration_ms", "critical_path": [...], "dominant_upstreams": [...]}
+    """
+    spans = spans if spans is not None else memory_exporter.get_trace(trace_id)
+    path = critical_path(spans)
+    if not path:
+        return {"trace_id": trace_id, "duration_ms": 0.0, "critical_path": [], "dominant_upstreams": []}
+
+    children = _children(spans)
+    upstream = defaultdict(float)
+    for span in path:
+        if span.kind in ("root", "node"):
+            continue
+        # 只统计叶子调用，避免嵌套调用被重复计算
+        if not any(child in path for child in children.get(span.span_id, [])):
+            upstream[f"{span.kind}:{span.name}"] += span.duration_ms
+
+    total = path[0].duration_ms
+    return {
+        "trace_id": trace_id,
+        "duration_ms": round(total, 2),
+        "critical_path": [
+            {"name": s.name, "kind": s.kind, "duration_ms": round(s.duration_ms, 2), "status": s.status}
+            for s in path
+        ],
+        "dominant_upstreams": [
+            {"name": name, "duration_ms": round(ms, 2), "share": round(ms / total, 4) if total else 0.0}
+            for name, ms in sorted(upstream.items(), key=lambda item: -item[1])
+        ],
+    }
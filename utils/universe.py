@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+from utils.logging_config import setup_logger
+from utils.metrics import instrument_module, record_cache
+from utils import replay
+
+logger = setup_logger('universe')
+
+ak = instrument_module(ak, "akshare")
+
+# 全市场基本面快照的缓存文件和有效期（小时）
+UNIVERSE_CACHE_PATH = os.getenv("UNIVERSE_CACHE_PATH", os.path.join("src", "data", "universe.pkl"))
+UNIVERSE_TTL_HOURS = float(os.getenv("UNIVERSE_TTL_HOURS", "24"))
+# 拉取失败后的退避时间（秒），期间继续使用旧快照（没有旧快照时直接返回上次的错误），不再重复拉取
+UNIVERSE_RETRY_BACKOFF = float(os.getenv("UNIVERSE_RETRY_BACKOFF", "300"))
+
+# 实时行情接口的列 -> get_financial_metrics 使用的指标名
+SPOT_COLUMNS = {
+    "代码": "ticker",
+    "名称": "name",
+    "最新价": "price",
+    "总市值": "market_cap",
+    "流通市值": "float_market_cap",
+    "市盈率-动态": "pe_ratio",
+    "市净率": "price_to_book",
+}
+# 业绩报表接口的列 -> 指标名，百分比列在加载时除以100，与 get_financial_metrics 的口径一致
+REPORT_COLUMNS = {
+    "股票代码": "ticker",
+    "营业总收入-营业总收入": "revenue",
+    "营业总收入-同比增长": "revenue_growth",
+    "净利润-净利润": "net_income",
+    "净利润-同比增长": "earnings_growth",
+    "净资产收益率": "return_on_equity",
+    "销售毛利率": "gross_margin",
+    "每股收益": "earnings_per_share",
+    "每股经营现金流量": "free_cash_flow_per_share",
+    "所处行业": "industry",
+}
+PERCENT_COLUMNS = ["revenue_growth", "earnings_growth", "return_on_equity", "gross_margin"]
+NUMERIC_COLUMNS = [
+    "price", "market_cap", "float_market_cap", "pe_ratio", "price_to_book",
+    "revenue", "revenue_growth", "net_income", "earnings_growth", "return_on_equity",
+    "gross_margin", "earnings_per_share", "free_cash_flow_per_share",
+    "net_margin", "price_to_sales", "operating_margin", "book_value_growth", "current_ratio", "debt_to_equity",
+]
+
+
+def _report_periods(today: Optional[datetime] = None, count: int = 4):
+    """最近的若干个报告期（季末日期），从最近一期往前"""
+    today = today or replay.now()
+    quarter_ends = [(3, 31), (6, 30), (9, 30), (12, 31)]
+    periods = []
+    year = today.year
+    while len(periods) < count:
+        for month, day in reversed(quarter_ends):
+            date = datetime(year, month, day)
+            if date < today and len(periods) < count:
+                periods.append(date.strftime("%Y%m%d"))
+        year -= 1
+    return periods
+
+
+def fetch_universe() -> pd.DataFrame:
+    """用两次批量接口拉取全部A股的行情估值和最新一期业绩，合并为一张以代码为索引的表
+
+    bulk 接口一次返回全市场数据，避免按股票逐个请求。业绩报表取最近一个已披露的报告期。
+    单只股票接口才有的指标（营业利润率、流动比率、资产负债率、净资产增长率）在表中为 NaN，
+    筛选时视为不满足条件，与 fundamentals_agent 对缺失值的处理一致。
+    """
+    spot = ak.stock_zh_a_spot_em()
+    spot = spot[[c for c in SPOT_COLUMNS if c in spot.columns]].rename(columns=SPOT_COLUMNS)
+
+    report = pd.DataFrame(columns=list(REPORT_COLUMNS.values()))
+    for period in _report_periods():
+        try:
+            df = ak.stock_yjbb_em(date=period)
+        except Exception as e:
+            logger.warning(f"获取 {period} 业绩报表失败: {e}")
+            continue
+        if df is not None and not df.empty:
+            report = df[[c for c in REPORT_COLUMNS if c in df.columns]].rename(columns=REPORT_COLUMNS)
+            report["report_period"] = period
+            break
+
+    universe = spot.merge(report, on="ticker", how="left")
+    universe["ticker"] = universe["ticker"].astype(str).str.zfill(6)
+    universe = universe.drop_duplicates("ticker").set_index("ticker")
+    for column in NUMERIC_COLUMNS:
+        universe[column] = pd.to_numeric(universe[column], errors="coerce") if column in universe else np.nan
+    universe[PERCENT_COLUMNS] = universe[PERCENT_COLUMNS] / 100
+
+    revenue = universe["revenue"].where(universe["revenue"] > 0)
+    universe["net_margin"] = universe["net_income"] / revenue
+    universe["price_to_sales"] = universe["market_cap"] / revenue
+    universe.attrs["fetched_at"] = time.time()
+    return universe
+
+
+class UniverseStore:
+    """全市场基本面快照，内存和本地文件两级缓存，过期后重新批量拉取
+
+    过期的快照在刷新成功前继续提供；刷新失败后 UNIVERSE_RETRY_BACKOFF 秒内不再重试。
+    wait=False 时刷新放到后台线程，调用方立即拿到当前快照（可能已过期），
+    供 Agent 在请求路径上使用。
+    """
+
+    def __init__(self, path: str = UNIVERSE_CACHE_PATH, ttl_hours: float = UNIVERSE_TTL_HOURS):
+        self._path = path
+        self._ttl = ttl_hours * 3600
+        self._frame: Optional[pd.DataFrame] = None
+        self._loaded = False
+        self._failed_at = 0.0
+        self._error: Optional[Exception] = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _fresh(self, frame: Optional[pd.DataFrame]) -> bool:
+        return frame is not None and time.time() - frame.attrs.get("fetched_at", 0) < self._ttl
+
+    def _backing_off(self) -> bool:
+        return self._error is not None and time.time() - self._failed_at < UNIVERSE_RETRY_BACKOFF
+
+    def _read_cache(self) -> Optional[pd.DataFrame]:
+        """读取本地文件中的快照，不论是否过期，过期的快照仍可在刷新失败时使用"""
+        if not os.path.exists(self._path):
+            return None
+        try:
+            return pd.read_pickle(self._path)
+        except Exception as e:
+            logger.warning(f"读取全市场快照缓存失败: {e}")
+            return None
+
+    def get(self, refresh: bool = False, wait: bool = True) -> pd.DataFrame:
+        """返回全市场快照
+
+        Args:
+            refresh: 为 True 时忽略缓存和失败退避，重新拉取
+            wait: 为 False 时不在调用线程中拉取，快照过期或缺失时在后台刷新并立即返回当前快照；
+                  没有任何快照时抛出 RuntimeError。录制/回放模式下总是同步拉取，保证结果可复现
+
+        Raises:
+            Exception: 没有可用快照且拉取失败（或处于失败退避期）时抛出拉取的错误
+        """
+        if replay.get_mode() != "off":
+            wait = True
+        with self._lock:
+            if not self._loaded:
+                self._frame = self._read_cache()
+                self._loaded = True
+            frame = self._frame
+            if not refresh and self._fresh(frame):
+                record_cache("universe", True)
+                return frame
+            if not wait and not refresh:
+                self._refresh_in_background()
+                if frame is None:
+                    raise self._error or RuntimeError("全市场快照尚未就绪，正在后台加载")
+                record_cache("universe", True)
+                return frame
+        record_cache("universe", False)
+        return self._refresh(force=refresh)
+
+    def _refresh(self, force: bool = False) -> pd.DataFrame:
+        """拉取新快照；失败时退回旧快照，没有旧快照时抛出错误"""
+        with self._refresh_lock:
+            with self._lock:
+                stale = self._frame
+                if not force and self._fresh(stale):  # 等待期间已被其他线程刷新
+                    return stale
+                if not force and self._backing_off():
+                    if stale is not None:
+                        return stale
+                    raise self._error
+            try:
+                frame = fetch_universe()
+            except Exception as e:
+                with self._lock:
+                    self._error, self._failed_at = e, time.time()
+                if stale is None:
+                    raise
+                age = (time.time() - stale.attrs.get("fetched_at", 0)) / 3600
+                logger.warning(f"刷新全市场快照失败，继续使用 {age:.1f} 小时前的快照: {e}")
+                return stale
+            with self._lock:
+                self._frame, self._error = frame, None
+            try:
+                os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+                frame.to_pickle(self._path)
+            except Exception as e:
+                logger.warning(f"保存全市场快照缓存失败: {e}")
+            logger.info(f"已加载全市场快照: {len(frame)} 只股票")
+            return frame
+
+    def _refresh_in_background(self) -> None:
+        """启动一个后台刷新线程，已有刷新在进行或处于失败退避期时不重复启动，调用方需持有 _lock"""
+        if self._refreshing or self._backing_off():
+            return
+        self._refreshing = True
+        threading.Thread(target=self._background_refresh, name="universe_refresh", daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self._refresh()
+        except Exception as e:
+            logger.warning(f"后台加载全市场快照失败: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_universe_store() -> UniverseStore:
+    """返回进程内共享的全市场快照，首次调用时创建"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UniverseStore()
+        return _store